@@ -0,0 +1,243 @@
+"""
+API HTTP/JSON del agente (make api).
+
+    POST /invoke        {"session_id", "query"}                    turno completo (JSON)
+    POST /disambiguate  {"session_id", "choice", "candidates"?}    respuesta a la repregunta (JSON)
+    POST /stream        {"session_id", "query"} o {"choice"}       Server-Sent Events: node, token, done, error
+    GET  /health
+
+Cualquier turno acepta "tenant" (o "tenants", lista para buscar entre varios
+pools): fija los pools de la sesión, que siguen en los turnos siguientes, y
+"budget_ms": SLO de latencia del turno (default TURN_BUDGET_MS). Con poco
+margen el grafo degrada (sin coref por LLM, menos candidatos, modelo chico,
+respuesta sin LLM) y lo informa en trace.degraded.
+
+Los turnos corren en una pool acotada (API_MAX_CONCURRENCY): si no hay lugar
+en API_QUEUE_WAIT_SECONDS se responde 429, y si el turno tarda más de
+API_TIMEOUT_SECONDS, 504. Una sesión atiende un solo turno a la vez (409).
+
+También puede servirse pre-forkeada: gunicorn -c gunicorn.conf.py api:server
+"""
+import json
+import time
+import uuid
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List
+
+from flask import Flask, Response, request
+
+from src.agent import init_app, stream_turn, turn_payload
+from src.serving import health
+from src.vectorService import tenant_namespace
+from src.config.settings import API_BIND
+from src.config.settings import API_MAX_CONCURRENCY
+from src.config.settings import API_QUEUE_WAIT_SECONDS
+from src.config.settings import API_TIMEOUT_SECONDS
+
+server = Flask(__name__)
+
+# los threads de la pool se crean en el primer submit: es seguro importar antes del fork
+POOL = ThreadPoolExecutor(max_workers=API_MAX_CONCURRENCY, thread_name_prefix="api-turn")
+SLOTS = threading.BoundedSemaphore(API_MAX_CONCURRENCY)
+ACTIVE_SESSIONS: set = set()
+STATS = {"served": 0, "rejected": 0, "conflicts": 0, "timeouts": 0, "errors": 0}
+_lock = threading.Lock()
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def count(key: str) -> None:
+    with _lock:
+        STATS[key] += 1
+
+def json_response(body: Dict[str, Any], status: int = 200, headers: Dict[str, str] | None = None) -> Response:
+    # default=str: el trace puede traer valores que no son JSON nativos
+    return Response(json.dumps(body, ensure_ascii=False, default=str), status=status, mimetype="application/json", headers=headers)
+
+def submit(session_id: str, fn: Callable[[], Any]) -> Future:
+    """
+    Reserva un lugar en la pool y la sesión, y encola el turno. El lugar se
+    libera cuando el turno termina (no cuando vence el timeout del request):
+    un turno lento sigue ocupando capacidad real.
+    """
+    with _lock:
+        if session_id in ACTIVE_SESSIONS:
+            STATS["conflicts"] += 1
+            raise Rejected(409, "session already has a turn in progress")
+        ACTIVE_SESSIONS.add(session_id)
+    if not SLOTS.acquire(timeout=API_QUEUE_WAIT_SECONDS):
+        with _lock:
+            ACTIVE_SESSIONS.discard(session_id)
+            STATS["rejected"] += 1
+        raise Rejected(429, "too many turns in progress, retry later")
+
+    def release(_future: Future) -> None:
+        SLOTS.release()
+        with _lock:
+            ACTIVE_SESSIONS.discard(session_id)
+
+    future = POOL.submit(fn)
+    future.add_done_callback(release)
+    return future
+
+def run_turn(
+    session_id: str,
+    query: str = "",
+    choice: str | None = None,
+    candidates: List[Dict[str, Any]] | None = None,
+    emit: Callable[[str, Dict[str, Any]], None] | None = None,
+    tenants: List[str] | None = None,
+    budget_ms: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Corre un turno (o la continuación de una desambiguación) y arma la respuesta JSON.
+
+    Args:
+        session_id (str): Sesión (thread_id del checkpointer).
+        query (str): Pregunta de un turno nuevo.
+        choice (str | None): Elección del usuario si responde a una repregunta.
+        candidates (list | None): Candidatos que vio el cliente (solo sin checkpointer).
+        emit (Callable | None): Si viene, recibe los eventos node/token a medida que ocurren.
+        tenants (list | None): Pools de la sesión (si no, los del checkpoint o TENANT).
+        budget_ms (int | None): SLO de latencia del turno (si no, TURN_BUDGET_MS).
+
+    Returns:
+        Dict[str, Any]: answer, awaiting_choice, candidates, chunk_ids y el trace
+        del turno con el tiempo de cada nodo.
+    """
+    t0 = time.perf_counter()
+    payload = turn_payload(session_id, query=query, choice=choice, candidates=candidates, tenants=tenants, budget_ms=budget_ms)
+    nodes, state = [], {}
+    for event in stream_turn(session_id, payload, stream_tokens=emit is not None):
+        if event[0] == "node":
+            nodes.append({"node": event[1], "ms": event[2]})
+            if emit:
+                emit("node", nodes[-1])
+        elif event[0] == "token":
+            if emit:
+                emit("token", {"text": event[1]})
+        else:
+            state = event[1]
+
+    trace = state.get("trace") or {}
+    count("served")
+    return {
+        "session_id": session_id,
+        "answer": state.get("answer", ""),
+        "awaiting_choice": bool(trace.get("need_user_input")),
+        "candidates": state.get("candidates") or [],
+        "persona_ids": state.get("persona_ids") or [],
+        "tenants": state.get("tenants") or [],
+        "chunk_ids": [c.chunk_id for c in state.get("chunks") or ()],
+        "trace": {**trace, "nodes": nodes},
+        "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+def parse_turn(require: str) -> tuple:
+    body = request.get_json(silent=True) or {}
+    session_id = str(body.get("session_id") or uuid.uuid4().hex)
+    query = str(body.get("query") or "").strip()
+    choice = body.get("choice")
+    choice = None if choice is None else str(choice).strip()
+    if require == "query" and not query and choice is None:
+        raise Rejected(400, "missing 'query'")
+    if require == "choice" and not choice:
+        raise Rejected(400, "missing 'choice'")
+    tenants = body.get("tenants") or ([body["tenant"]] if body.get("tenant") is not None else None)
+    if tenants is not None:
+        tenants = [str(t) for t in (tenants if isinstance(tenants, list) else [tenants])]
+        try:
+            for tenant in tenants:
+                tenant_namespace(tenant)
+        except ValueError as e:
+            raise Rejected(400, str(e))
+    budget_ms = body.get("budget_ms")
+    if budget_ms is not None:
+        try:
+            budget_ms = int(budget_ms)
+        except (TypeError, ValueError):
+            raise Rejected(400, "'budget_ms' must be an integer")
+        if budget_ms < 0:
+            raise Rejected(400, "'budget_ms' must be >= 0")
+    return session_id, query, choice, body.get("candidates"), tenants, budget_ms
+
+def answer_json(require: str) -> Response:
+    try:
+        session_id, query, choice, candidates, tenants, budget_ms = parse_turn(require)
+        future = submit(session_id, lambda: run_turn(session_id, query, choice, candidates, tenants=tenants, budget_ms=budget_ms))
+    except Rejected as e:
+        retry = {"Retry-After": "1"} if e.status == 429 else None
+        return json_response({"error": str(e)}, e.status, headers=retry)
+
+    try:
+        return json_response(future.result(timeout=API_TIMEOUT_SECONDS))
+    except FutureTimeout:
+        count("timeouts")
+        return json_response({"session_id": session_id, "error": f"turn exceeded {API_TIMEOUT_SECONDS:g}s"}, 504)
+    except Exception as e:
+        count("errors")
+        return json_response({"session_id": session_id, "error": str(e)}, 500)
+
+
+# ================= Endpoints =================
+@server.route("/health")
+def health_check():
+    with _lock:
+        stats = {**STATS, "in_flight": len(ACTIVE_SESSIONS)}
+    return json_response({**health(), "api": stats})
+
+@server.post("/invoke")
+def invoke():
+    return answer_json("query")
+
+@server.post("/disambiguate")
+def disambiguate():
+    return answer_json("choice")
+
+@server.post("/stream")
+def stream():
+    events: queue.Queue = queue.Queue()
+
+    def emit(kind: str, data: Dict[str, Any]) -> None:
+        events.put((kind, data))
+
+    try:
+        session_id, query, choice, candidates, tenants, budget_ms = parse_turn("query")
+
+        def work():
+            try:
+                emit("done", run_turn(session_id, query, choice, candidates, emit=emit, tenants=tenants, budget_ms=budget_ms))
+            except Exception as e:
+                count("errors")
+                emit("error", {"session_id": session_id, "error": str(e)})
+
+        submit(session_id, work)
+    except Rejected as e:
+        retry = {"Retry-After": "1"} if e.status == 429 else None
+        return json_response({"error": str(e)}, e.status, headers=retry)
+
+    def sse():
+        deadline = time.monotonic() + API_TIMEOUT_SECONDS
+        while True:
+            try:
+                kind, data = events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                count("timeouts")
+                kind, data = "error", {"session_id": session_id, "error": f"turn exceeded {API_TIMEOUT_SECONDS:g}s"}
+            yield f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+            if kind in ("done", "error"):
+                return
+
+    return Response(sse(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+if __name__ == "__main__":
+    init_app()
+    host, _, port = API_BIND.rpartition(":")
+    server.run(host=host or "0.0.0.0", port=int(port), threaded=True)
@@ -0,0 +1,67 @@
+import typer
+from pathlib import Path
+from typing import List, Optional
+
+from src.batchService import BatchRunner, grid_items, jsonl_to_parquet, read_items
+from src.config.settings import BATCH_CONCURRENCY, BATCH_REQUESTS_PER_MINUTE
+
+app = typer.Typer()
+
+
+@app.callback()
+def main():
+    """Bulk questions over the loaded CVs (screening reports)."""
+
+
+def run_batch(items: List[dict], output: Path, concurrency: int, rpm: float, parquet: Optional[Path]) -> None:
+    runner = BatchRunner(concurrency=concurrency, requests_per_minute=rpm)
+    typer.echo(f"Running {len(items)} questions (concurrency={concurrency}, rpm={rpm})...")
+
+    with typer.progressbar(length=len(items), label="Answering") as progress:
+        stats = runner.run(items, str(output), on_result=lambda row: progress.update(1))
+
+    typer.echo(f"\nDone: {stats['ok']} answered, {stats['errors']} errors, {stats['skipped']} already in {output}")
+    if parquet:
+        rows = jsonl_to_parquet(str(output), str(parquet))
+        typer.echo(f"Wrote {rows} rows to {parquet}")
+
+
+@app.command()
+def pairs(
+    input: Path = typer.Argument(..., help='JSONL with {"persona": ..., "question": ...} per line'),
+    output: Path = typer.Option(Path("results.jsonl"), help="Results JSONL (appended; existing answers are skipped)"),
+    concurrency: int = typer.Option(BATCH_CONCURRENCY, help="Concurrent LLM calls"),
+    rpm: float = typer.Option(BATCH_REQUESTS_PER_MINUTE, help="Max LLM requests per minute"),
+    parquet: Optional[Path] = typer.Option(None, help="Also export the results to this Parquet file"),
+):
+    """Answer explicit (persona, question) pairs; persona is a person_id or a name."""
+    run_batch(read_items(str(input)), output, concurrency, rpm, parquet)
+
+
+@app.command()
+def grid(
+    question: List[str] = typer.Option([], "--question", "-q", help="Question to ask every persona (repeatable)"),
+    questions_file: Optional[Path] = typer.Option(None, help="Text file with one question per line"),
+    persona: List[str] = typer.Option([], "--persona", "-p", help="Restrict to these personas (default: all loaded)"),
+    output: Path = typer.Option(Path("results.jsonl"), help="Results JSONL (appended; existing answers are skipped)"),
+    concurrency: int = typer.Option(BATCH_CONCURRENCY, help="Concurrent LLM calls"),
+    rpm: float = typer.Option(BATCH_REQUESTS_PER_MINUTE, help="Max LLM requests per minute"),
+    parquet: Optional[Path] = typer.Option(None, help="Also export the results to this Parquet file"),
+):
+    """Ask every question to every persona (question x personas grid)."""
+    questions = list(question)
+    if questions_file:
+        questions += [line.strip() for line in questions_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if not questions:
+        typer.echo("No questions given (use --question or --questions-file)")
+        raise typer.Exit(1)
+
+    items = grid_items(questions, persona or None)
+    if not items:
+        typer.echo("No personas found in the local store (run `make load` first)")
+        raise typer.Exit(1)
+    run_batch(items, output, concurrency, rpm, parquet)
+
+
+if __name__ == "__main__":
+    app()
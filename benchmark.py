@@ -0,0 +1,530 @@
+import re
+import glob
+import time
+import tempfile
+import statistics
+import tracemalloc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List
+
+import httpx
+import numpy as np
+import typer
+
+import src.agent as agent
+import src.localVectorStore as local_store
+from src.embeddingService import HashingEmbeddingProvider
+from src.rerankService import build_reranker, rerank_order
+from src.multiQuery import expand_query, rrf_fuse
+from src.textUtils import fold_text, estimate_tokens
+from src.vectorService import read_and_chunk_sentences, read_sentence_units
+from src.config.settings import CHUNK_SIZE, CHUNK_OVERLAP
+
+app = typer.Typer()
+
+
+@app.callback()
+def main():
+    """Offline benchmarks for the agent graph and its retrieval layer."""
+
+
+# ========= STAND-INS OFFLINE =========
+# Respuestas fijas en lugar de Groq/Pinecone: aíslan el costo propio del grafo.
+PEOPLE = [("p1", "Valentina Rodríguez"), ("p2", "Martín González"), ("p3", "Laura Fernández")]
+CHUNK_TEXT = (
+    "Data & Cloud Engineer – Nubank. Desarrollo de pipelines en Spark y Airflow. "
+    "Modelado de datos en BigQuery y Redshift. Infraestructura con Terraform. "
+) * 2
+
+def fake_search_similar(text: str, top_k: int = 10, index: str = "", metadata_filter: Dict | None = None, **kwargs) -> List[Dict[str, Any]]:
+    if index == agent.PINECONE_PERSONA_INDEX:
+        return [
+            {"_id": pid, "_score": 0.9 - 0.1 * i, "fields": {"canonical_name": name, "name": name, "category": "persona"}}
+            for i, (pid, name) in enumerate(PEOPLE)
+        ]
+    pid = ((metadata_filter or {}).get("person_id") or {}).get("$eq", "p1")
+    return [
+        {
+            "_id": f"cv_chunk_{pid}_{i}",
+            "_score": 1.0 - i / top_k,
+            "fields": {
+                "chunk_text": f"{CHUNK_TEXT} #{i}",
+                "category": "cv",
+                "name": "Valentina",
+                "lastname": "Rodríguez",
+                "profile_type": "desarrollador",
+                "person_id": pid,
+            },
+        }
+        for i in range(top_k)
+    ]
+
+def fake_llm_chat(system: str, user: str, *args, **kwargs) -> str:
+    if system == agent.EXTRACT_NAMES_SYS:
+        return '["Valentina"]'
+    return "Respuesta de prueba con citas [1] [2]. " * 40
+
+def fake_llm_chat_tokens(system: str, user: str, *args, **kwargs) -> Iterator[str]:
+    for word in fake_llm_chat(system, user).split(" "):
+        yield word + " "
+
+def fake_llm_yesno(system: str, user: str, *args, **kwargs) -> bool:
+    return False
+
+def install_stubs() -> None:
+    agent.search_similar = fake_search_similar
+    agent.llm_chat = fake_llm_chat
+    agent.llm_chat_tokens = fake_llm_chat_tokens
+    agent.llm_yesno = fake_llm_yesno
+    # memoria de sesión aparte: con SESSION_STORE=sqlite los turnos del benchmark irían a las sesiones reales
+    agent.MEM = agent.ShortMemory(max_turns=agent.MEM.max_turns)
+    agent.ALIASES = agent.AliasCache()
+    # forzar el camino completo de retrieval (sin CV completo ni fast path)
+    agent.FULLCV_ENABLED = False
+    agent.PROFILE_FASTPATH_ENABLED = False
+
+
+@app.command()
+def state_alloc(
+    turns: int = typer.Option(200, help="Number of single-flow turns to run"),
+    warmup: int = typer.Option(10, help="Warm-up turns excluded from the stats"),
+    checkpointer: str = typer.Option("none", help="Checkpointer to compile the graph with: none | memory | sqlite"),
+):
+    """Per-turn memory allocation (tracemalloc peak) and latency of the graph with offline stand-ins."""
+    install_stubs()
+    agent.app = agent.build_app(checkpointer=agent.build_checkpointer(checkpointer))
+    query = "¿Qué experiencia tiene Valentina con Spark?"
+
+    for _ in range(warmup):
+        agent.invoke_turn("bench", query)
+
+    peaks, retained, latencies = [], [], []
+    tracemalloc.start()
+    for _ in range(turns):
+        tracemalloc.reset_peak()
+        base, _peak = tracemalloc.get_traced_memory()
+        t0 = time.perf_counter()
+        final_state = agent.invoke_turn("bench", query)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+        retained.append(current - base)
+        del final_state
+    tracemalloc.stop()
+
+    typer.echo(f"turns={turns} chunks/turn={agent.TOPK_RETRIEVE}")
+    typer.echo(f"peak alloc per turn: mean={statistics.mean(peaks) / 1024:.1f} KiB  p95={sorted(peaks)[int(0.95 * len(peaks)) - 1] / 1024:.1f} KiB")
+    typer.echo(f"final state size:    mean={statistics.mean(retained) / 1024:.1f} KiB")
+    typer.echo(f"latency per turn:    mean={statistics.mean(latencies):.2f} ms  p95={sorted(latencies)[int(0.95 * len(latencies)) - 1]:.2f} ms")
+
+
+def synthetic_corpus(rows: int, chunks_per_person: int, seed: int = 0) -> tuple[List[str], List[str], List[str]]:
+    """
+    Chunks de CV sintéticos a partir de las oraciones de data/*.txt: cada chunk
+    combina 3 oraciones al azar. Devuelve (textos, person_ids, oraciones fuente).
+    """
+    sentences = []
+    for path in sorted(glob.glob("data/*.txt")):
+        with open(path, "r", encoding="utf-8") as f:
+            sentences += [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", f.read()) if len(s.strip()) > 20]
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(sentences), size=(rows, 3))
+    texts = [" ".join(sentences[i] for i in row) for row in picks]
+    person_ids = [f"s{i // chunks_per_person}" for i in range(rows)]
+    return texts, person_ids, sentences
+def labeled_queries(texts: List[str], person_ids: List[str], queries: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Preguntas etiquetadas sobre el corpus sintético: de un chunk al azar se
+    toman sus dos palabras más específicas (menor frecuencia en el corpus) y se
+    arma "¿Qué experiencia tiene con X y Y?". Relevantes: los chunks de esa
+    misma persona que mencionan ambas palabras.
+    """
+    folded = [fold_text(t) for t in texts]
+    df: Dict[str, int] = {}
+    for text in folded:
+        for word in set(re.findall(r"\w+", text)):
+            df[word] = df.get(word, 0) + 1
+    rows_by_person: Dict[str, List[int]] = {}
+    for row, pid in enumerate(person_ids):
+        rows_by_person.setdefault(pid, []).append(row)
+
+    rng = np.random.default_rng(seed)
+    out = []
+    while len(out) < queries:
+        row = int(rng.integers(0, len(texts)))
+        words = [w for w in re.findall(r"\w+", texts[row]) if len(w) >= 5]
+        if len(set(words)) < 2:
+            continue
+        keywords = sorted(dict.fromkeys(words), key=lambda w: df.get(fold_text(w), 0))[:2]
+        pid = person_ids[row]
+        relevant = {r for r in rows_by_person[pid] if all(fold_text(k) in folded[r] for k in keywords)}
+        out.append({"query": f"¿Qué experiencia tiene con {keywords[0]} y {keywords[1]}?", "person_id": pid, "relevant": relevant})
+    return out
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return sorted(values)[max(0, int(q * len(values)) - 1)]
+
+
+@app.command()
+def ann(
+    rows: int = typer.Option(100_000, help="Synthetic chunks in the corpus"),
+    dim: int = typer.Option(256, help="Embedding dimension (hashing provider)"),
+    queries: int = typer.Option(100, help="Number of queries"),
+    top_k: int = typer.Option(10, help="Neighbours per query"),
+    nprobe: str = typer.Option("1,4,8,16,32,64", help="Comma-separated nprobe values to sweep"),
+    quantization: str = typer.Option("int8", help="Scan codes: float32 | int8 | binary"),
+    chunks_per_person: int = typer.Option(20, help="Chunks per synthetic person"),
+):
+    """Recall@k vs latency of the local IVF index against exact search on a synthetic corpus built from data/ CVs."""
+    texts, person_ids, sentences = synthetic_corpus(rows, chunks_per_person)
+    provider = HashingEmbeddingProvider(dim)
+    t0 = time.perf_counter()
+    vectors = np.vstack([provider.embed(texts[i:i + 4096]) for i in range(0, rows, 4096)])
+    typer.echo(f"corpus: {rows} chunks, dim={dim}, embedded in {time.perf_counter() - t0:.1f}s")
+
+    rng = np.random.default_rng(1)
+    query_texts = []
+    for i in rng.integers(0, len(sentences), size=queries):
+        words = sentences[i].split()
+        # oración de un CV con algunas palabras eliminadas
+        query_texts.append(" ".join(w for w in words if rng.random() > 0.3) or words[0])
+    query_vectors = provider.embed(query_texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ns = local_store._Namespace(dim)
+        ns.upsert([f"c{i}" for i in range(rows)], [{"person_id": p} for p in person_ids], vectors)
+        local_store.LOCAL_IVF_MIN_ROWS = 0
+        t0 = time.perf_counter()
+        ns.write(f"{tmp}/ns")
+        typer.echo(f"index build (k-means + lists + quantization): {time.perf_counter() - t0:.1f}s")
+        del ns, vectors
+
+        exact = local_store._MappedNamespace(f"{tmp}/ns", "float32")
+        index = local_store._MappedNamespace(f"{tmp}/ns", quantization)
+        typer.echo(f"ivf lists: {len(index.centroids)}")
+
+        def run(namespace, probes: int, metadata_filter=None) -> tuple[List[set], List[float]]:
+            results, latencies = [], []
+            for q in query_vectors:
+                t = time.perf_counter()
+                results.append({row for row, _ in namespace.search(q, top_k, metadata_filter, nprobe=probes)})
+                latencies.append((time.perf_counter() - t) * 1000)
+            return results, latencies
+
+        truth, exact_lat = run(exact, 0)
+        typer.echo(f"{'mode':<24}{'recall@' + str(top_k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        typer.echo(f"{'exact float32':<24}{1.0:>10.3f}{statistics.median(exact_lat):>10.2f}{_percentile(exact_lat, 0.95):>10.2f}")
+        sweeps = [(f"{quantization} exhaustive", 0)] + [(f"{quantization} ivf nprobe={p}", int(p)) for p in nprobe.split(",")]
+        for label, probes in sweeps:
+            found, lat = run(index, probes)
+            recall = statistics.mean(len(a & b) / max(1, len(b)) for a, b in zip(found, truth))
+            typer.echo(f"{label:<24}{recall:>10.3f}{statistics.median(lat):>10.2f}{_percentile(lat, 0.95):>10.2f}")
+
+        _, person_lat = run(index, 0, {"person_id": {"$eq": "s7"}})
+        typer.echo(f"{'person_id filter (slice)':<24}{'-':>10}{statistics.median(person_lat):>10.2f}{_percentile(person_lat, 0.95):>10.2f}")
+
+
+@app.command()
+def api_load(
+    requests: int = typer.Option(200, help="Total requests to send"),
+    concurrency: int = typer.Option(16, help="Concurrent clients"),
+    llm_latency_ms: float = typer.Option(50.0, help="Simulated latency of each LLM call"),
+    stream: bool = typer.Option(False, help="Use POST /stream (SSE) instead of POST /invoke"),
+):
+    """Throughput and latency of api.py under concurrent clients, with offline stand-ins for Groq/Pinecone."""
+    from werkzeug.serving import make_server
+
+    import api
+
+    install_stubs()
+    delay = llm_latency_ms / 1000
+
+    def slow_llm_chat(system: str, user: str) -> str:
+        time.sleep(delay)
+        return fake_llm_chat(system, user)
+
+    def slow_llm_chat_tokens(system: str, user: str) -> Iterator[str]:
+        time.sleep(delay)
+        yield from fake_llm_chat_tokens(system, user)
+
+    agent.llm_chat = slow_llm_chat
+    agent.llm_chat_tokens = slow_llm_chat_tokens
+    agent.app = agent.build_app(checkpointer=agent.build_checkpointer("memory"))
+
+    http_server = make_server("127.0.0.1", 0, api.server, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{http_server.server_port}"
+    query = "¿Qué experiencia tiene Valentina con Spark?"
+
+    def one(i: int) -> tuple[int, float, float]:
+        # (status, latencia total ms, latencia al primer token ms)
+        body = {"session_id": f"load-{i}", "query": query}
+        t = time.perf_counter()
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            if not stream:
+                status = client.post("/invoke", json=body).status_code
+                total = (time.perf_counter() - t) * 1000
+                return status, total, total
+            first = 0.0
+            with client.stream("POST", "/stream", json=body) as resp:
+                for line in resp.iter_lines():
+                    if line == "event: token" and not first:
+                        first = (time.perf_counter() - t) * 1000
+            return resp.status_code, (time.perf_counter() - t) * 1000, first
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+    http_server.shutdown()
+
+    ok = [r for r in results if r[0] == 200]
+    typer.echo(f"requests={requests} concurrency={concurrency} api_max_concurrency={api.API_MAX_CONCURRENCY} stream={stream}")
+    typer.echo(f"throughput: {len(ok) / elapsed:.1f} turns/s  ({elapsed:.2f}s total)")
+    typer.echo("status: " + "  ".join(f"{code}={sum(1 for r in results if r[0] == code)}" for code in sorted({r[0] for r in results})))
+    if ok:
+        latencies = [r[1] for r in ok]
+        typer.echo(f"latency:     p50={statistics.median(latencies):.1f} ms  p95={_percentile(latencies, 0.95):.1f} ms")
+        if stream:
+            firsts = [r[2] for r in ok if r[2]]
+            typer.echo(f"first token: p50={statistics.median(firsts):.1f} ms  p95={_percentile(firsts, 0.95):.1f} ms")
+
+
+@app.command()
+def rerank(
+    people: int = typer.Option(200, help="Synthetic people in the corpus"),
+    chunks_per_person: int = typer.Option(50, help="Chunks per person (candidates behind the person_id filter)"),
+    queries: int = typer.Option(300, help="Labeled queries"),
+    top_k: str = typer.Option("4,8,16,32,50", help="Comma-separated retrieval top_k values to compare"),
+    reranker: str = typer.Option("lexical", help="Reranker to evaluate: lexical | cross-encoder"),
+    dim: int = typer.Option(256, help="Embedding dimension (hashing provider)"),
+):
+    """Precision@4 / recall@4 of dense order vs reranked top_k candidates, on labeled synthetic queries."""
+    texts, person_ids, _ = synthetic_corpus(people * chunks_per_person, chunks_per_person)
+    provider = HashingEmbeddingProvider(dim)
+    vectors = np.vstack([provider.embed(texts[i:i + 4096]) for i in range(0, len(texts), 4096)])
+    labeled = labeled_queries(texts, person_ids, queries)
+    query_vectors = provider.embed([q["query"] for q in labeled])
+    scorer = build_reranker(reranker)
+    k_context = agent.TOPK_CONTEXT
+    typer.echo(f"corpus: {len(texts)} chunks, {people} people; {queries} queries; context top {k_context}")
+
+    # filtro por persona como en pinecone_query_cv: filas contiguas de la persona
+    def dense_top(q: Dict[str, Any], qv: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        start = int(q["person_id"][1:]) * chunks_per_person
+        scores = vectors[start:start + chunks_per_person] @ qv
+        top = np.argsort(-scores)[:k]
+        return top + start, scores[top]
+
+    def metrics(found: List[int], relevant: set) -> tuple[float, float]:
+        hits = len(set(found) & relevant)
+        return hits / k_context, hits / min(k_context, len(relevant))
+
+    typer.echo(f"{'mode':<22}{'top_k':>6}{'P@' + str(k_context):>8}{'R@' + str(k_context):>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for k in [int(x) for x in top_k.split(",")]:
+        dense_m, rerank_m, latencies = [], [], []
+        for q, qv in zip(labeled, query_vectors):
+            rows, scores = dense_top(q, qv, k)
+            dense_m.append(metrics(rows[:k_context].tolist(), q["relevant"]))
+            order, info = rerank_order(scorer, q["query"], [texts[r] for r in rows], scores, budget_ms=1e9)
+            rerank_m.append(metrics(rows[order[:k_context]].tolist(), q["relevant"]))
+            latencies.append(info["ms"])
+        for label, m, lat in (("dense", dense_m, None), (f"{reranker} rerank", rerank_m, latencies)):
+            p, r = statistics.mean(x[0] for x in m), statistics.mean(x[1] for x in m)
+            timing = f"{statistics.median(lat):>9.2f}{_percentile(lat, 0.95):>9.2f}" if lat else f"{'-':>9}{'-':>9}"
+            typer.echo(f"{label:<22}{k:>6}{p:>8.3f}{r:>8.3f}{timing}")
+
+
+@app.command()
+def granularity(
+    queries: int = typer.Option(200, help="Labeled queries over data/ CVs"),
+    dim: int = typer.Option(256, help="Embedding dimension (hashing provider)"),
+):
+    """Index size, embedding cost and context redundancy: overlapping chunks vs sentence units + windows, on data/ CVs."""
+    paths = sorted(glob.glob("data/*.txt"))
+    provider = HashingEmbeddingProvider(dim)
+    chunk_texts, chunk_pids, unit_texts, unit_pids, units_by_pid = [], [], [], [], {}
+    doc_tokens = 0
+    for i, path in enumerate(paths):
+        pid = f"p{i}"
+        with open(path, "r", encoding="utf-8") as f:
+            doc_tokens += estimate_tokens(f.read())
+        chunks = read_and_chunk_sentences(path, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+        units = read_sentence_units(path)
+        chunk_texts += chunks
+        chunk_pids += [pid] * len(chunks)
+        unit_texts += units
+        unit_pids += [pid] * len(units)
+        units_by_pid[pid] = units
+
+    typer.echo(f"{len(paths)} CVs, {doc_tokens} tokens")
+    typer.echo(f"{'mode':<10}{'records':>9}{'embedded tokens':>17}{'x doc':>7}")
+    for label, texts in (("chunk", chunk_texts), ("sentence", unit_texts)):
+        embedded = sum(estimate_tokens(t) for t in texts)
+        typer.echo(f"{label:<10}{len(texts):>9}{embedded:>17}{embedded / doc_tokens:>7.2f}")
+
+    labeled = labeled_queries(unit_texts, unit_pids, queries)
+    query_vectors = provider.embed([q["query"] for q in labeled])
+    modes = {
+        "chunk": (chunk_texts, chunk_pids, provider.embed(chunk_texts)),
+        "sentence": (unit_texts, unit_pids, provider.embed(unit_texts)),
+    }
+    k_context = agent.TOPK_CONTEXT
+    typer.echo(f"{'mode':<10}{'context tokens':>16}{'repeated':>10}{'hit rate':>10}")
+    for label, (texts, pids, vectors) in modes.items():
+        tokens, repeated, hits = [], [], []
+        for q, qv in zip(labeled, query_vectors):
+            rows = [r for r, pid in enumerate(pids) if pid == q["person_id"]]
+            order = sorted(rows, key=lambda r: -float(vectors[r] @ qv))
+            if label == "chunk":
+                context = [texts[r] for r in order[:k_context]]
+            else:
+                hits_as_chunks = [
+                    agent.Chunk(f"u{r}", texts[r], float(vectors[r] @ qv), pids[r], position=rows.index(r))
+                    for r in order[:agent.TOPK_RETRIEVE]
+                ]
+                context = [c.text for c in agent.expand_windows(hits_as_chunks, units_by_pid=units_by_pid)[:k_context]]
+            # texto repetido: oraciones que aparecen en más de un fragmento del contexto
+            sentences = [s for text in context for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+            seen: Dict[str, int] = {}
+            for sentence in sentences:
+                seen[sentence] = seen.get(sentence, 0) + 1
+            tokens.append(sum(estimate_tokens(t) for t in context))
+            repeated.append(sum(estimate_tokens(s) * (n - 1) for s, n in seen.items()))
+            joined = fold_text(" ".join(context))
+            keywords = re.findall(r"con (\w+) y (\w+)\?$", q["query"])[0]
+            hits.append(all(fold_text(k) in joined for k in keywords))
+        share = sum(repeated) / max(1, sum(tokens))
+        typer.echo(f"{label:<10}{statistics.mean(tokens):>16.0f}{share:>10.1%}{statistics.mean(hits):>10.3f}")
+
+
+@app.command()
+def shards(
+    small: int = typer.Option(2_000, help="Chunks of the small tenant"),
+    large: int = typer.Option(100_000, help="Chunks of the large tenant"),
+    others: int = typer.Option(4, help="Extra mid-size tenants for the cross-pool search"),
+    others_rows: int = typer.Option(20_000, help="Chunks of each extra tenant"),
+    queries: int = typer.Option(50, help="Number of queries"),
+    dim: int = typer.Option(256, help="Embedding dimension (hashing provider)"),
+    top_k: int = typer.Option(10, help="Neighbours per query"),
+):
+    """Per-tenant shards vs one shared pool filtered by tenant, and sequential vs parallel scatter-gather, on the local index."""
+    sizes = {"small": small, "large": large, **{f"t{i}": others_rows for i in range(others)}}
+    provider = HashingEmbeddingProvider(dim)
+    texts, _, sentences = synthetic_corpus(sum(sizes.values()), 20)
+    vectors = np.vstack([provider.embed(texts[i:i + 4096]) for i in range(0, len(texts), 4096)])
+    rng = np.random.default_rng(1)
+    query_vectors = provider.embed([sentences[i] for i in rng.integers(0, len(sentences), size=queries)])
+    typer.echo(f"tenants: {sizes}")
+
+    def timed(search) -> tuple[float, float]:
+        latencies = []
+        for q in query_vectors:
+            t = time.perf_counter()
+            search(q)
+            latencies.append((time.perf_counter() - t) * 1000)
+        return statistics.median(latencies), _percentile(latencies, 0.95)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = local_store._Namespace(dim)
+        tenant_of = [tenant for tenant, n in sizes.items() for _ in range(n)]
+        shared.upsert([f"c{i}" for i in range(len(texts))], [{"tenant": t} for t in tenant_of], vectors)
+        shared.write(f"{tmp}/shared")
+        start, mapped = 0, {}
+        for tenant, n in sizes.items():
+            ns = local_store._Namespace(dim)
+            ns.upsert([f"c{i}" for i in range(start, start + n)], [{"tenant": tenant}] * n, vectors[start:start + n])
+            ns.write(f"{tmp}/{tenant}")
+            mapped[tenant] = local_store._MappedNamespace(f"{tmp}/{tenant}", local_store.LOCAL_VECTOR_QUANTIZATION)
+            start += n
+        shared = local_store._MappedNamespace(f"{tmp}/shared", local_store.LOCAL_VECTOR_QUANTIZATION)
+
+        typer.echo(f"{'search':<38}{'p50 ms':>10}{'p95 ms':>10}")
+        rows = [
+            ("small tenant, own shard", lambda q: mapped["small"].search(q, top_k)),
+            ("small tenant, shared pool + filter", lambda q: shared.search(q, top_k, {"tenant": {"$eq": "small"}})),
+            ("large tenant, own shard", lambda q: mapped["large"].search(q, top_k)),
+            ("all tenants, sequential", lambda q: [mapped[t].search(q, top_k) for t in mapped]),
+        ]
+        with ThreadPoolExecutor(max_workers=len(mapped)) as pool:
+            rows.append(("all tenants, scatter-gather", lambda q: [f.result() for f in [pool.submit(m.search, q, top_k) for m in mapped.values()]]))
+            for label, search in rows:
+                p50, p95 = timed(search)
+                typer.echo(f"{label:<38}{p50:>10.2f}{p95:>10.2f}")
+
+
+
+@app.command()
+def multi_query(
+    people: int = typer.Option(200, help="Synthetic people in the corpus"),
+    chunks_per_person: int = typer.Option(50, help="Chunks per person (candidates behind the person_id filter)"),
+    queries: int = typer.Option(300, help="Labeled queries"),
+    reranker: str = typer.Option("lexical", help="Reranker applied after retrieval: none | lexical | cross-encoder"),
+    dim: int = typer.Option(256, help="Embedding dimension (hashing provider)"),
+    search_ms: float = typer.Option(40.0, help="Simulated round trip of each vector search (Pinecone)"),
+    latency_turns: int = typer.Option(50, help="Turns timed for the latency comparison"),
+):
+    """Recall@TOPK_CONTEXT of one query vs rule-based multi-query + RRF, and turn latency with concurrent sub-queries."""
+    texts, person_ids, _ = synthetic_corpus(people * chunks_per_person, chunks_per_person)
+    provider = HashingEmbeddingProvider(dim)
+    vectors = np.vstack([provider.embed(texts[i:i + 4096]) for i in range(0, len(texts), 4096)])
+    labeled = labeled_queries(texts, person_ids, queries)
+    expanded = [expand_query(q["query"]) for q in labeled]
+    sub_vectors = dict(zip(
+        [s for subs in expanded for s in subs],
+        provider.embed([s for subs in expanded for s in subs]),
+    ))
+    scorer = build_reranker(reranker)
+    k_ret, k_context = agent.TOPK_RETRIEVE, agent.TOPK_CONTEXT
+    typer.echo(
+        f"corpus: {len(texts)} chunks, {people} people; {queries} queries, "
+        f"{statistics.mean(len(s) for s in expanded):.1f} sub-queries/turn; top_k {k_ret}, context top {k_context}"
+    )
+
+    # filtro por persona como en pinecone_query_cv: filas contiguas de la persona
+    def dense_top(q: Dict[str, Any], text: str) -> List[tuple[int, float]]:
+        start = int(q["person_id"][1:]) * chunks_per_person
+        scores = vectors[start:start + chunks_per_person] @ sub_vectors[text]
+        top = np.argsort(-scores)[:k_ret]
+        return [(int(r) + start, float(scores[r])) for r in top]
+
+    typer.echo(f"{'mode':<22}{'R@' + str(k_context):>8}{'R@' + str(k_ret):>8}")
+    for label, subs_of in (("single query", lambda i: [labeled[i]["query"]]), ("multi-query + RRF", lambda i: expanded[i])):
+        recall_ctx, recall_ret = [], []
+        for i, q in enumerate(labeled):
+            fused = rrf_fuse([dense_top(q, s) for s in subs_of(i)], key=lambda hit: hit[0])[:k_ret]
+            rows = [hit[0] for hit, _ in fused]
+            order, _info = rerank_order(scorer, q["query"], [texts[r] for r in rows], [score for _, score in fused], budget_ms=1e9)
+            relevant = q["relevant"]
+            recall_ctx.append(len({rows[j] for j in order[:k_context]} & relevant) / min(k_context, len(relevant)))
+            recall_ret.append(len(set(rows) & relevant) / len(relevant))
+        typer.echo(f"{label:<22}{statistics.mean(recall_ctx):>8.3f}{statistics.mean(recall_ret):>8.3f}")
+
+    # latencia por turno con un round trip simulado por búsqueda
+    def remote(q: Dict[str, Any], text: str) -> List[tuple[int, float]]:
+        time.sleep(search_ms / 1000)
+        return dense_top(q, text)
+
+    def timed(run) -> List[float]:
+        out = []
+        for i, q in enumerate(labeled[:latency_turns]):
+            t = time.perf_counter()
+            rrf_fuse(run(i, q), key=lambda hit: hit[0])
+            out.append((time.perf_counter() - t) * 1000)
+        return out
+
+    typer.echo(f"\n{'turn latency':<34}{'p50 ms':>10}{'p95 ms':>10}")
+    rows = [
+        ("single query", lambda i, q: [remote(q, q["query"])]),
+        ("multi-query, sequential", lambda i, q: [remote(q, s) for s in expanded[i]]),
+        ("multi-query, concurrent", lambda i, q: list(agent.MULTI_QUERY_POOL.map(lambda s: remote(q, s), expanded[i]))),
+    ]
+    for label, run in rows:
+        lat = timed(run)
+        typer.echo(f"{label:<34}{statistics.median(lat):>10.2f}{_percentile(lat, 0.95):>10.2f}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,58 @@
+"""
+Modo serve: gunicorn con workers pre-forkeados (make serve).
+
+El master importa ui.py (preload_app), construye el grafo y calienta las
+cachés una sola vez; los workers las heredan por fork y solo re-crean sus
+clientes HTTP y conexiones. La memoria por sesión vive en SQLite para que
+cualquier worker pueda atender cualquier turno.
+
+kill -HUP $(cat store/gunicorn.pid) renueva los workers sin cortar conexiones,
+pero con preload_app los vuelve a forkear del mismo master: no recarga el
+código ni las cachés. Para desplegar código nuevo sin cortar conexiones:
+kill -USR2 $(cat store/gunicorn.pid) levanta un master nuevo con el código
+nuevo y, cuando responde, kill -TERM $(cat store/gunicorn.pid.oldbin) apaga
+el viejo. Si no, reiniciar make serve.
+"""
+import os
+
+# antes de importar la app: memoria compartida y turnos inline en cada worker
+# (la cola de jobs de la UI es por proceso y el polling puede caer en otro worker);
+# la cuota de Groq también se comparte entre workers
+os.environ.setdefault("SESSION_STORE", "sqlite")
+os.environ.setdefault("UI_JOB_QUEUE", "0")
+os.environ.setdefault("RATE_LIMIT_STORE", "sqlite")
+
+from src.config.settings import (  # noqa: E402
+    LOCAL_STORE_DIR,
+    SERVE_BIND,
+    SERVE_WORKERS,
+    SERVE_THREADS,
+    SERVE_TIMEOUT,
+    SERVE_MAX_REQUESTS,
+)
+
+bind = SERVE_BIND
+workers = SERVE_WORKERS
+threads = SERVE_THREADS
+worker_class = "gthread"
+preload_app = True
+timeout = SERVE_TIMEOUT
+graceful_timeout = 30
+max_requests = SERVE_MAX_REQUESTS
+max_requests_jitter = SERVE_MAX_REQUESTS // 10
+pidfile = os.path.join(LOCAL_STORE_DIR, "gunicorn.pid")
+accesslog = "-"
+
+
+def when_ready(server):
+    from src.serving import warm_up
+
+    info = warm_up()
+    server.log.info(f"warm-up done: {info}")
+
+
+def post_fork(server, worker):
+    from src.serving import reset_after_fork
+
+    reset_after_fork()
+    server.log.info(f"worker {worker.pid} ready")
@@ -2,92 +2,137 @@ import typer
 import json
 import uuid
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from src.vectorService import load_data_into_vectordb, load_persona_into_vectordb
+from src.vectorService import delete_person_chunks, compact_vectordb, tenant_namespace
+from src.localStore import load_document_into_store, load_profile_into_store, compact_summary
+from src.localStore import find_person_by_source
 from src.config.settings import DATASET
+from src.config.settings import INDEX_GRANULARITY
+from src.config.settings import PROFILE_EXTRACTION_MAX_TOKENS
+from src.config.settings import TENANT
 from src.groqService import GroqLLMWrapper
 
 app = typer.Typer()
 
 
 
+IDENTITY_PROMPT = """
+Analiza el siguiente CV y extrae:
+
+- nombre: El nombre de la persona
+- apellido: El apellido de la persona
+- tipo_perfil: Determina si es "desarrollador" o "soporte_tecnico" basándote en las habilidades y experiencia
+
+Responde con un objeto JSON que contenga estas claves: nombre, apellido, tipo_perfil
+
+CV a analizar:
+{cv_content}
+"""
+
+PROFILE_PROMPT = """
+Analiza el siguiente CV y extrae la siguiente información:
+
+- contacto: objeto con email, telefono, linkedin, ubicacion, fecha_nacimiento, dni (cadena vacía si no figura)
+- experiencia: lista de objetos {{rol, empresa, ubicacion, desde, hasta}} en el orden del CV (más reciente primero)
+- empresas: lista de empresas en las que trabajó
+- skills: lista de tecnologías, herramientas y metodologías
+- educacion: lista de objetos {{titulo, institucion, periodo}}
+- certificaciones: lista de cadenas "Nombre – Emisor (año)"
+- idiomas: lista de cadenas "Idioma: nivel"
+- resumen: resumen compacto del perfil en una línea (máximo 60 palabras): rol actual,
+  años de experiencia, tecnologías principales, educación y certificaciones clave
+
+Usa SOLO datos presentes en el CV, sin inventar.
+Responde con un objeto JSON que contenga estas claves: contacto, experiencia, empresas,
+skills, educacion, certificaciones, idiomas, resumen
+
+CV a analizar:
+{cv_content}
+"""
+
+
+def _ask_json(llm: GroqLLMWrapper, prompt: str, cv_path: str, max_completion_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Send a JSON-mode prompt and parse the answer; {} (with a warning) if it fails or gets cut off."""
+    content = ""
+    try:
+        response = llm.send_prompt_json(prompt, max_completion_tokens=max_completion_tokens)
+        if hasattr(response, 'choices') and response.choices:
+            choice = response.choices[0]
+            content = (choice.message.content or "").strip()
+            if getattr(choice, "finish_reason", None) == "length":
+                typer.echo(f"Warning: LLM response for {cv_path} was truncated at the token cap")
+            # Parse JSON response (should be valid JSON due to json_object mode)
+            parsed = json.loads(content)
+            return parsed if isinstance(parsed, dict) else {}
+    except json.JSONDecodeError as e:
+        typer.echo(f"Warning: Could not parse LLM response for {cv_path}: {e}")
+        if content:
+            typer.echo(f"Raw response: {content}")
+    except Exception as e:
+        typer.echo(f"Error extracting info from {cv_path}: {e}")
+    return {}
+
+
 def extract_cv_info(cv_path: str, llm: GroqLLMWrapper) -> Dict[str, Any]:
     """
     Extract information from CV using LLM
     
+    Two calls: the identity (name, lastname, profile type) with a small
+    answer, and the structured profile with PROFILE_EXTRACTION_MAX_TOKENS.
+    If the profile can't be parsed the identity is kept and the fields stay empty.
+
     Args:
         cv_path (str): Path to the CV file
         llm: GroqLLMWrapper instance
     
     Returns:
-        Dict containing name, lastname, profile_type, and person_id
+        Dict containing name, lastname, profile_type, person_id and the
+        structured fields (contact, roles, companies, skills, education)
+        plus a compact profile summary
     """
     try:
         # Read CV content
         with open(cv_path, 'r', encoding='utf-8') as file:
             cv_content = file.read()
-        
-        # Create prompt for LLM to extract information
-        extraction_prompt = f"""
-        Analiza el siguiente CV y extrae la siguiente información:
-        
-        - nombre: El nombre de la persona
-        - apellido: El apellido de la persona  
-        - tipo_perfil: Determina si es "desarrollador" o "soporte_tecnico" basándote en las habilidades y experiencia
-        
-        Responde con un objeto JSON que contenga estas claves: nombre, apellido, tipo_perfil
-        
-        CV a analizar:
-        {cv_content[:500]}
-        """
-        
-        # Send prompt to LLM with JSON mode
-        response = llm.send_prompt_json(extraction_prompt)
-        
-        # Extract content from response
-        if hasattr(response, 'choices') and response.choices:
-            content = response.choices[0].message.content.strip()
-            # typer.echo(f"LLM Response: {content}")
-            
-            # Parse JSON response (should be valid JSON due to json_object mode)
-            cv_info = json.loads(content)
-            
-            # Generate unique ID
-            person_id = str(uuid.uuid4())
-            
-            # Validate and return data
-            return {
-                "name": cv_info.get("nombre", "Unknown"),
-                "lastname": cv_info.get("apellido", "Unknown"), 
-                "profile_type": cv_info.get("tipo_perfil", "desarrollador"),
-                "person_id": person_id
-            }
-                
-    except json.JSONDecodeError as e:
-        typer.echo(f"Warning: Could not parse LLM response for {cv_path}: {e}")
-        if 'content' in locals():
-            typer.echo(f"Raw response: {content}")
-    except Exception as e:
-        typer.echo(f"Error extracting info from {cv_path}: {e}")
-    
-    # Fallback values for any error
+    except OSError as e:
+        typer.echo(f"Error reading {cv_path}: {e}")
+        cv_content = ""
+
+    identity = _ask_json(llm, IDENTITY_PROMPT.format(cv_content=cv_content), cv_path) if cv_content else {}
+    profile = _ask_json(
+        llm, PROFILE_PROMPT.format(cv_content=cv_content), cv_path, PROFILE_EXTRACTION_MAX_TOKENS
+    ) if cv_content else {}
+
     return {
-        "name": "Unknown",
-        "lastname": "Unknown",
-        "profile_type": "desarrollador", 
-        "person_id": str(uuid.uuid4())
+        "name": identity.get("nombre") or "Unknown",
+        "lastname": identity.get("apellido") or "Unknown",
+        "profile_type": identity.get("tipo_perfil") or "desarrollador",
+        "person_id": str(uuid.uuid4()),
+        "fields": {
+            "contacto": profile.get("contacto") or {},
+            "experiencia": profile.get("experiencia") or [],
+            "empresas": profile.get("empresas") or [],
+            "skills": profile.get("skills") or [],
+            "educacion": profile.get("educacion") or [],
+            "certificaciones": profile.get("certificaciones") or [],
+            "idiomas": profile.get("idiomas") or [],
+            "resumen": profile.get("resumen") or "",
+        } if profile else {},
     }
 
 @app.command()
 def load_data(
-    category: str = typer.Option("cv", help="Category for the CV data (default: 'cv')")
+    category: str = typer.Option("cv", help="Category for the CV data (default: 'cv')"),
+    tenant: str = typer.Option(TENANT, help="Client company whose pool receives the CVs (default: TENANT, '' = shared pool)"),
 ):
     """Load CV data into the vector database"""
     try:
+        namespace = tenant_namespace(tenant)
+        typer.echo(f"Loading CV data into vector database (namespace: {namespace})...")
         
-        typer.echo("Loading CV data into vector database...")
-        
-        llm = GroqLLMWrapper()     
+        # prioridad "ingestion": una recarga no le quita cuota a los turnos en vivo
+        llm = GroqLLMWrapper(priority="ingestion")
         
         # Construct full paths for dataset files
         data_dir = Path("data")
@@ -109,29 +154,63 @@ def load_data(
             for cv_path in progress:
                 # Extract CV information using LLM
                 cv_info = extract_cv_info(cv_path, llm)
+
+                # Re-ingesting a CV keeps its person_id and replaces its chunks
+                previous_id = find_person_by_source(cv_path, tenant)
+                if previous_id:
+                    cv_info['person_id'] = previous_id
                 
                 typer.echo(f"\nProcessing CV: {Path(cv_path).name}")
                 typer.echo(f"  Name: {cv_info['name']} {cv_info['lastname']}")
                 typer.echo(f"  Profile: {cv_info['profile_type']}")
                 typer.echo(f"  ID: {cv_info['person_id']}")
+                if previous_id:
+                    deleted = delete_person_chunks(previous_id, namespace=namespace)
+                    typer.echo(f"  Re-ingesting: removed {deleted} previous chunks")
                 
                 # Load persona into vector database
                 load_persona_into_vectordb(
                     name=cv_info['name'],
                     lastname=cv_info['lastname'],
                     person_id=cv_info['person_id'],
+                    summary=compact_summary(cv_info['fields'].get('resumen', '')),
+                    namespace=namespace,
                 )
                 
                 # Load data into vector database with extracted info
-                load_data_into_vectordb(
+                indexed = load_data_into_vectordb(
                     [cv_path],
                     name=cv_info['name'],
                     lastname=cv_info['lastname'],
                     person_id=cv_info['person_id'],
                     profile_type=cv_info['profile_type'],
                     category=category,
+                    namespace=namespace,
+                )
+
+                # Keep the full normalized CV for direct-context answers
+                load_document_into_store(
+                    cv_path,
+                    name=cv_info['name'],
+                    lastname=cv_info['lastname'],
+                    profile_type=cv_info['profile_type'],
+                    person_id=cv_info['person_id'],
+                    units=indexed if INDEX_GRANULARITY == "sentence" else None,
+                    tenant=tenant,
+                )
+
+                # Structured fields for instant factual answers
+                load_profile_into_store(
+                    cv_path,
+                    person_id=cv_info['person_id'],
+                    name=cv_info['name'],
+                    lastname=cv_info['lastname'],
+                    profile_type=cv_info['profile_type'],
+                    fields=cv_info['fields'],
+                    tenant=tenant,
                 )
         
+        compact_vectordb()
         typer.echo("Successfully loaded all CV data into vector database!")
         
     except ImportError as e:
@@ -0,0 +1,291 @@
+"""
+Replay offline de tráfico grabado con TRAFFIC_RECORD=1 (src/trafficRecorder.py).
+
+Cada turno grabado se vuelve a correr con el grafo real (init_app) y las llamadas
+a Groq y al índice vectorial se sirven desde la grabación, con su latencia
+original escalada por --speed (0 = sin esperas: solo el costo propio del grafo).
+Las sesiones corren en paralelo y los turnos de cada sesión en orden.
+
+Para reproducir un turno hay que correrlo con los mismos settings y el mismo
+store local (perfiles, documentos) que en producción: si el grafo hace otra
+llamada que la grabada, se sirve la siguiente de esa función en orden ("order")
+o un valor vacío ("miss"), y el reporte lo cuenta. La memoria corta y los alias de
+sesión van en memoria durante el replay: el store de sesiones no se lee ni se escribe.
+"""
+import os
+import json
+import time
+import cProfile
+import statistics
+import threading
+from contextvars import ContextVar
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import typer
+
+# offline: los clientes se crean al importar el agente pero nunca se usan
+os.environ.setdefault("GROQ_API_KEY", "replay")
+os.environ.setdefault("PINECONE_API_KEY", "replay")
+
+import src.agent as agent  # noqa: E402
+from src.trafficRecorder import call_request, get_traffic_recorder, read_traffic, redact, request_key  # noqa: E402
+from langgraph.types import Command  # noqa: E402
+
+app = typer.Typer()
+
+# Funciones grabadas y lo que devuelven si el replay no encuentra la llamada
+FALLBACKS: Dict[str, Any] = {
+    "llm_chat": "",
+    "llm_chat_tokens": [],
+    "llm_yesno": False,
+    "search_similar": [],
+    "search_similar_many": None,  # una lista vacía por texto
+    "search_shards": [],
+}
+
+
+@app.callback()
+def main():
+    """Replay recorded production traffic offline against the agent graph."""
+
+
+# ========= REPLAY DE UN TURNO =========
+class TurnReplay:
+    """Llamadas de un turno grabado, servidas por (función, request) y si no en el orden grabado."""
+    def __init__(self, record: Dict[str, Any], speed: float):
+        self.record = record
+        self.speed = speed
+        self.pending: Dict[str, List[Dict[str, Any]]] = {}
+        for call in record.get("calls", []):
+            self.pending.setdefault(call["fn"], []).append(call)
+        self.served = {"exact": 0, "order": 0, "miss": 0}
+        self.waited_ms = 0.0
+        self._lock = threading.Lock()
+
+    def take(self, fn_name: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            calls = self.pending.get(fn_name) or []
+            for i, call in enumerate(calls):
+                if call["key"] == key:
+                    self.served["exact"] += 1
+                    return calls.pop(i)
+            if calls:
+                self.served["order"] += 1
+                return calls.pop(0)
+            self.served["miss"] += 1
+            return None
+
+    def wait(self, ms: float) -> None:
+        if self.speed > 0 and ms > 0:
+            time.sleep(ms / 1000 / self.speed)
+            with self._lock:
+                self.waited_ms += ms / self.speed
+
+_current: ContextVar[Optional[TurnReplay]] = ContextVar("replay_turn", default=None)
+
+def _fallback(fn_name: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    if fn_name == "search_similar_many":
+        texts = kwargs.get("texts", args[0] if args else [])
+        return [[] for _ in texts]
+    return FALLBACKS[fn_name]
+
+def _stub(fn_name: str, original: Callable) -> Callable:
+    def stub(*args, **kwargs):
+        replay = _current.get()
+        call = replay.take(fn_name, request_key(fn_name, call_request(original, args, kwargs))) if replay else None
+        if call is None:
+            return _fallback(fn_name, args, kwargs)
+        replay.wait(call["ms"])
+        if call.get("error"):
+            raise RuntimeError(f"replayed error: {call['error']}")
+        return call["result"]
+    return stub
+
+def _stub_tokens(original: Callable) -> Callable:
+    def stub(*args, **kwargs) -> Iterator[str]:
+        replay = _current.get()
+        call = replay.take("llm_chat_tokens", request_key("llm_chat_tokens", call_request(original, args, kwargs))) if replay else None
+        if call is None:
+            return
+        last = 0.0
+        for delta, at in zip(call["result"], call.get("delta_ms") or [0.0] * len(call["result"])):
+            replay.wait(at - last)
+            last = at
+            yield delta
+        if call.get("error"):
+            raise RuntimeError(f"replayed error: {call['error']}")
+    return stub
+
+def install_replay() -> None:
+    """Reemplaza las funciones grabadas del módulo agent por stubs que sirven la grabación."""
+    get_traffic_recorder().enabled = False  # no volver a grabar lo que se reproduce
+    for fn_name in FALLBACKS:
+        original = getattr(agent, fn_name)
+        stub = _stub_tokens(original) if fn_name == "llm_chat_tokens" else _stub(fn_name, original)
+        setattr(agent, fn_name, stub)
+
+@contextmanager
+def isolated_session_store() -> Iterator[None]:
+    """
+    Memoria corta y alias en memoria durante el replay: con SESSION_STORE=sqlite
+    el agente leería y escribiría las sesiones reales (SESSION_DB_PATH).
+    """
+    saved = agent.MEM, agent.ALIASES
+    agent.MEM, agent.ALIASES = agent.ShortMemory(max_turns=saved[0].max_turns), agent.AliasCache()
+    try:
+        yield
+    finally:
+        agent.MEM, agent.ALIASES = saved
+
+def replay_turn(record: Dict[str, Any], speed: float) -> Dict[str, Any]:
+    """Corre un turno grabado por el grafo; devuelve sus tiempos y cómo se sirvieron sus llamadas."""
+    replay = TurnReplay(record, speed)
+    token = _current.set(replay)
+    session_id = record["session_id"]
+    payload = Command(resume=record["payload"]) if record.get("resume") else record["payload"]
+    if isinstance(payload, dict) and payload.get("deadline"):
+        # el plazo grabado ya venció: el presupuesto corre desde ahora, escalado como las latencias
+        payload = {**payload, "deadline": agent.turn_deadline(payload["budget_ms"] / (speed or 1))}
+    t0 = time.perf_counter()
+    error, state = None, {}
+    try:
+        if record.get("entry") == "stream":
+            for event in agent.stream_turn(session_id, payload, stream_tokens=bool(record.get("stream_tokens"))):
+                if event[0] == "state":
+                    state = event[1]
+        else:
+            state = agent.init_app().invoke(payload, config=agent.session_config(session_id))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        _current.reset(token)
+    ms = (time.perf_counter() - t0) * 1000
+
+    unused = sum(len(calls) for calls in replay.pending.values())
+    return {
+        "turn_id": record["turn_id"],
+        "session_id": session_id,
+        "recorded_ms": record.get("ms"),
+        "replay_ms": round(ms, 2),
+        "own_ms": round(ms - replay.waited_ms, 2),
+        "calls": len(record.get("calls", [])),
+        **replay.served,
+        "unused": unused,
+        "answer_match": (redact(state.get("answer", "")) == record["answer"]) if "answer" in record and not error else None,
+        "error": error,
+    }
+
+
+# ========= COMANDOS =========
+def _percentile(values: List[float], q: float) -> float:
+    return sorted(values)[max(0, int(q * len(values)) - 1)]
+
+def _select(path: str, session: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    turns = [t for t in read_traffic(path) if not session or t["session_id"] == session]
+    return turns[:limit] if limit else turns
+
+
+@app.command()
+def run(
+    path: str = typer.Argument(..., help="Traffic log (.jsonl or .sqlite) written with TRAFFIC_RECORD=1"),
+    speed: float = typer.Option(1.0, help="1 = original timing, 10 = ten times faster, 0 = no waits (graph cost only)"),
+    workers: int = typer.Option(8, help="Sessions replayed concurrently"),
+    session: Optional[str] = typer.Option(None, help="Replay a single session"),
+    limit: int = typer.Option(0, help="Replay only the first N turns (0 = all)"),
+    checkpointer: str = typer.Option("memory", help="Checkpointer for the replay graph: memory | sqlite | none"),
+    output: Optional[str] = typer.Option(None, help="Write one JSON line per replayed turn here"),
+    profile: Optional[str] = typer.Option(None, help="cProfile the replay (single worker) and dump the stats here"),
+):
+    """Replay recorded turns through init_app() with recorded Groq/Pinecone responses."""
+    turns = _select(path, session, limit)
+    if not turns:
+        typer.echo("no turns to replay")
+        raise typer.Exit(1)
+
+    install_replay()
+    agent.app = agent.build_app(checkpointer=agent.build_checkpointer(checkpointer))
+    agent.init_app()
+
+    by_session: Dict[str, List[Dict[str, Any]]] = {}
+    for t in turns:
+        by_session.setdefault(t["session_id"], []).append(t)
+    first = turns[0]["t"]
+    started = time.perf_counter()
+
+    def replay_session(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        out = []
+        for record in records:
+            if speed > 0:
+                # respeta la separación original entre turnos (escalada)
+                delay = (record["t"] - first) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            out.append(replay_turn(record, speed))
+        return out
+
+    typer.echo(f"replaying {len(turns)} turns from {len(by_session)} sessions (speed={speed:g})")
+    with isolated_session_store():
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            results = [r for records in by_session.values() for r in replay_session(records)]
+            profiler.disable()
+            profiler.dump_stats(profile)
+            typer.echo(f"profile -> {profile} (python -m pstats {profile})")
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = [r for rs in pool.map(replay_session, by_session.values()) for r in rs]
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    ok = [r for r in results if not r["error"]]
+    typer.echo(f"{'':<14}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, key in (("recorded", "recorded_ms"), ("replayed", "replay_ms"), ("graph only", "own_ms")):
+        values = [r[key] for r in ok if r[key] is not None]
+        if values:
+            typer.echo(f"{label:<14}{statistics.median(values):>10.2f}{_percentile(values, 0.95):>10.2f}")
+    served = {k: sum(r[k] for r in results) for k in ("exact", "order", "miss", "unused")}
+    typer.echo(
+        f"calls: {served['exact']} matched, {served['order']} served in order (request changed), "
+        f"{served['miss']} missing, {served['unused']} recorded but not made"
+    )
+    differing = [r for r in results if r["answer_match"] is False]
+    errors = [r for r in results if r["error"]]
+    typer.echo(f"answers: {len(ok) - len(differing)}/{len(ok)} identical; errors: {len(errors)}")
+    for r in errors[:5]:
+        typer.echo(f"  {r['session_id']} {r['turn_id']}: {r['error']}")
+
+
+@app.command()
+def stats(
+    path: str = typer.Argument(..., help="Traffic log (.jsonl or .sqlite)"),
+    slowest: int = typer.Option(5, help="Slowest turns to break down"),
+):
+    """Latency summary of a traffic log: per turn, per recorded function and the slowest turns."""
+    turns = read_traffic(path)
+    if not turns:
+        typer.echo("empty log")
+        raise typer.Exit(1)
+    typer.echo(f"{len(turns)} turns, {len({t['session_id'] for t in turns})} sessions")
+
+    rows: Dict[str, List[float]] = {"turn": [t["ms"] for t in turns if "ms" in t]}
+    for t in turns:
+        for call in t.get("calls", []):
+            rows.setdefault(call["fn"], []).append(call["ms"])
+    typer.echo(f"{'':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, values in rows.items():
+        typer.echo(f"{label:<22}{len(values):>8}{statistics.median(values):>10.2f}{_percentile(values, 0.95):>10.2f}{max(values):>10.2f}")
+
+    typer.echo(f"\nslowest {slowest} turns")
+    for t in sorted(turns, key=lambda t: -t.get("ms", 0))[:slowest]:
+        calls = ", ".join(f"{c['fn']}@{c['t_ms']:.0f}+{c['ms']:.0f}" for c in t.get("calls", []))
+        typer.echo(f"  {t.get('ms', 0):>9.1f} ms  {t['session_id']}  {calls}")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,4 +1,4 @@
-from src.agent import build_app, init_app
+from src.agent import init_app, invoke_turn, continue_disambiguation
 from src.vectorService import search_similar
 
 app = init_app()
@@ -16,10 +16,7 @@ while True:
             break
 
         # Primer invoke
-        s = app.invoke({
-            "session_id": session_id,
-            "query": q
-        })
+        s = invoke_turn(session_id, q)
 
         answer = s.get("answer", "")
         trace = s.get("trace", {})
@@ -31,12 +28,8 @@ while True:
             candidates = s.get("candidates", [])   
             choice = input("\nElige persona (número, nombre o ID): ").strip()
             
-            s2 = app.invoke({
-                "session_id": session_id,
-                "query": choice,
-                "disambiguation_choice": choice,
-                "candidates": candidates, 
-            })
+            # Reanuda el grafo pausado (o re-invoca con candidatos si no hay checkpointer)
+            s2 = continue_disambiguation(session_id, choice, candidates)
             
             print("\nAsistente:", s2.get("answer", ""))
 
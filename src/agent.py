@@ -1,79 +1,347 @@
 """
 RAG sobre CVs con LangGraph + memoria corta por persona + Groq LLM.
 """
+import os
+import re
+import math
 import json
-from typing import TypedDict, List, Dict, Any, Literal
+import time
+import sqlite3
+import threading
+from contextvars import copy_context
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TypedDict, List, Dict, Any, Literal, NamedTuple, Tuple, Annotated, Iterator, Sequence, TYPE_CHECKING
 
 from langgraph.graph import StateGraph, END
+from langgraph.types import Command, interrupt
+from langgraph.config import get_config, get_stream_writer
+from langgraph.checkpoint.memory import InMemorySaver
 
-from groq import Groq
+from groq import Groq, APITimeoutError
+from groq.types.chat import ChatCompletionMessageParam
 
 from src.config.settings import GROQ_API_KEY
 from src.config.settings import GROQ_LLM_MODEL
-from src.config.settings import PINECONE_NAMESPACE
+from src.config.settings import TENANT
 from src.config.settings import PINECONE_INDEX
 from src.config.settings import PINECONE_PERSONA_INDEX
-
-from src.vectorService import search_similar
+from src.config.settings import FULLCV_ENABLED
+from src.config.settings import FULLCV_TOKEN_BUDGET
+from src.config.settings import PROFILE_FASTPATH_ENABLED
+from src.config.settings import MULTI_CONTEXT_TOKEN_BUDGET
+from src.config.settings import MULTI_CHUNKS_PER_PERSON
+from src.config.settings import CHECKPOINTER
+from src.config.settings import CHECKPOINT_DB_PATH
+from src.config.settings import SESSION_STORE
+from src.config.settings import ROSTER_ENABLED
+from src.config.settings import DEFAULT_PERSONA
+from src.config.settings import SPECULATIVE_COREF
+from src.config.settings import MULTI_QUERY
+from src.config.settings import MULTI_QUERY_MAX
+from src.config.settings import MULTI_QUERY_WORKERS
+from src.config.settings import TURN_BUDGET_MS
+from src.config.settings import DEGRADE_SKIP_LLM_MS
+from src.config.settings import DEGRADE_RETRIEVAL_MS
+from src.config.settings import DEGRADED_TOPK_RETRIEVE
+from src.config.settings import DEGRADE_FAST_MODEL_MS
+from src.config.settings import DEGRADE_NO_LLM_MS
+from src.config.settings import GROQ_FAST_MODEL
+from src.config.settings import RERANK_BUDGET_MS
+from src.config.settings import WINDOW_RADIUS
+from src.config.settings import WINDOW_MAX_UNITS
+from src.config.settings import MEMORY_MODE
+from src.config.settings import MEMORY_RECENT_TURNS
+from src.config.settings import MEMORY_TOKEN_BUDGET
+from src.config.settings import MEMORY_SUMMARY_MAX_WORDS
+
+from src.vectorService import search_similar, search_similar_many, search_shards, tenant_namespace
+from src.localStore import get_document_store, get_profile_store
+from src.nameResolver import get_roster
+from src.rerankService import get_reranker, rerank_order
+from src.multiQuery import expand_query, rrf_fuse
+from src.rateLimiter import RateLimitTimeout, get_rate_limiter, request_tokens
+from src.trafficRecorder import get_traffic_recorder, recorded
+from src.textUtils import fold_text, estimate_tokens, truncate_to_tokens
+
+if TYPE_CHECKING:
+    from src.sessionStore import SQLiteShortMemory, SQLiteAliasCache
 
 
 # Umbrales
 AMBIG_DELTA = 0.04
 MIN_SCORE = 0.05
-TOPK_RETRIEVE = 50
+TOPK_RETRIEVE = 20   # con reranker, recall@4 ~0.99 (make bench ARGS=rerank)
 TOPK_CONTEXT = 4
 
 
 # ========= CLIENTES =========
-groq_client = Groq(api_key=GROQ_API_KEY)
+groq_client = Groq(api_key=GROQ_API_KEY, max_retries=0)  # los reintentos los hace el rate limiter
 
 # ========= MEMORIA CORTA =========
 class ShortMemory:
-    """Memoria corta por (session_id, persona_id). Resetea si cambia la persona."""
-    def __init__(self, max_turns: int = 4):
+    """
+    Memoria corta por (session_id, persona_id). Resetea si cambia la persona.
+    En modo "summary" los turnos viejos se pliegan en un resumen (fold) y
+    max_turns=None: solo fold los saca del buffer, así no se pierde un turno
+    que el resumidor todavía no plegó.
+    """
+    def __init__(self, max_turns: int | None = 4):
         self.max_turns = max_turns
         self.buffers: Dict[tuple, List[Dict[str, str]]] = {}
+        self.summaries: Dict[tuple, str] = {}
         self.last_persona_by_session: Dict[str, str] = {}
+        # el resumidor corre en otro thread
+        self._lock = threading.Lock()
 
     def get(self, session_id: str, persona_id: str) -> List[Dict[str, str]]:
-        return self.buffers.get((session_id, persona_id), [])
+        return list(self.buffers.get((session_id, persona_id), []))
+
+    def get_summary(self, session_id: str, persona_id: str) -> str:
+        return self.summaries.get((session_id, persona_id), "")
+
+    def fold(self, session_id: str, persona_id: str, folded: List[Dict[str, str]], summary: str) -> bool:
+        """Reemplaza los mensajes `folded` (prefijo del buffer) por el resumen; False si el buffer cambió."""
+        with self._lock:
+            buf = self.buffers.get((session_id, persona_id), [])
+            if not folded or buf[:len(folded)] != folded:
+                return False
+            del buf[:len(folded)]
+            self.summaries[(session_id, persona_id)] = summary
+            return True
+
+    def last_persona(self, session_id: str) -> str | None:
+        return self.last_persona_by_session.get(session_id)
 
     def append(self, session_id: str, persona_id: str, user_msg: str, assistant_msg: str):
-        buf = self.buffers.setdefault((session_id, persona_id), [])
-        
-        buf.append({"role": "user", "content": user_msg})
-        buf.append({"role": "assistant", "content": assistant_msg})
+        with self._lock:
+            buf = self.buffers.setdefault((session_id, persona_id), [])
 
-        # recortar a los últimos max_turns*2 (porque cada turno son 2 mensajes)
-        if len(buf) > self.max_turns * 2:
-            buf[:] = buf[-self.max_turns * 2:]
+            buf.append({"role": "user", "content": user_msg})
+            buf.append({"role": "assistant", "content": assistant_msg})
 
-        self.last_persona_by_session[session_id] = persona_id
+            # recortar a los últimos max_turns*2 (porque cada turno son 2 mensajes)
+            if self.max_turns is not None and len(buf) > self.max_turns * 2:
+                buf[:] = buf[-self.max_turns * 2:]
+
+            self.last_persona_by_session[session_id] = persona_id
 
     def reset_if_person_changed(self, session_id: str, new_persona_id: str):
         last = self.last_persona_by_session.get(session_id)
         if last is not None and last != new_persona_id:
-            # limpiar todas las memorias de esa sesión
-            for key in list(self.buffers.keys()):
-                if key[0] == session_id:
-                    del self.buffers[key]
+            # limpiar todas las memorias (y resúmenes) de esa sesión
+            with self._lock:
+                for store in (self.buffers, self.summaries):
+                    for key in list(store.keys()):
+                        if key[0] == session_id:
+                            del store[key]
+
+
 
+# ========= ALIAS POR SESIÓN =========
+class AliasCache:
+    """
+    Cache por sesión: mención de nombre (normalizada) -> persona_id.
+    Se alimenta de las decisiones de decide_disambiguation (clear_top1 y
+    user_selected) para no volver a consultar el índice ni repreguntar.
+    """
+    def __init__(self):
+        self.aliases: Dict[str, Dict[str, str]] = {}
+        # menciones que quedaron esperando la elección del usuario
+        self.pending: Dict[str, List[str]] = {}
+
+    def get(self, session_id: str, mention: str) -> str | None:
+        return self.aliases.get(session_id, {}).get(fold_text(mention))
+
+    def remember(self, session_id: str, mentions: List[str], persona_id: str):
+        by_mention = self.aliases.setdefault(session_id, {})
+        for mention in mentions:
+            if fold_text(mention):
+                by_mention[fold_text(mention)] = persona_id
+
+    def set_pending(self, session_id: str, mentions: List[str]):
+        self.pending[session_id] = list(mentions)
+
+    def pop_pending(self, session_id: str) -> List[str]:
+        return self.pending.pop(session_id, [])
+
+
+# "memory": en proceso; "sqlite": compartida entre workers del modo serve
+MEM: "ShortMemory | SQLiteShortMemory"
+ALIASES: "AliasCache | SQLiteAliasCache"
+# en modo "summary" el buffer no se recorta: los turnos viejos salen al plegarse en el resumen
+_MEM_MAX_TURNS = None if MEMORY_MODE == "summary" else 4
+if SESSION_STORE == "sqlite":
+    from src.sessionStore import SQLiteSessionDB, SQLiteShortMemory, SQLiteAliasCache
+    _session_db = SQLiteSessionDB()
+    MEM = SQLiteShortMemory(_session_db, max_turns=_MEM_MAX_TURNS)
+    ALIASES = SQLiteAliasCache(_session_db)
+else:
+    MEM = ShortMemory(max_turns=_MEM_MAX_TURNS)
+    ALIASES = AliasCache()
+
+# ========= MEMORIA RESUMIDA =========
+MEMORY_SUMMARY_SYS = (
+    "Resumes conversaciones sobre CVs. Integra el resumen previo con los turnos nuevos en un solo "
+    f"párrafo de hasta {MEMORY_SUMMARY_MAX_WORDS} palabras, en español: qué preguntó el usuario y qué "
+    "datos concretos se respondieron (empresas, tecnologías, fechas). Sin saludos ni citas [#]."
+)
 
-MEM = ShortMemory(max_turns=4)
+class MemorySummarizer:
+    """
+    Pliega en el resumen de la memoria los turnos que salen de la ventana
+    reciente (MEMORY_RECENT_TURNS). Corre en un thread aparte, encolado por
+    save_memory: el turno no espera la llamada al LLM del resumen.
+    """
+    def __init__(self, recent_turns: int = MEMORY_RECENT_TURNS):
+        self.recent_turns = recent_turns
+        self.stats = {"folds": 0, "skipped": 0, "errors": 0}
+        # un solo worker: los resúmenes de una misma memoria no compiten entre sí
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self._scheduled: set = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, session_id: str, persona_id: str) -> None:
+        key = (session_id, str(persona_id))
+        with self._lock:
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+        self._pool.submit(self._run, key)
+
+    def _run(self, key: tuple) -> None:
+        with self._lock:
+            self._scheduled.discard(key)
+        try:
+            self.summarize(*key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[memory_summary] {key}: {e}")
+
+    def summarize(self, session_id: str, persona_id: str) -> bool:
+        buf = MEM.get(session_id, persona_id)
+        overflow = buf[:max(0, len(buf) - self.recent_turns * 2)]
+        if not overflow:
+            return False
+        previous = MEM.get_summary(session_id, persona_id)
+        prompt = f"Resumen previo:\n{previous or '(vacío)'}\n\nTurnos nuevos:\n{render_history(overflow)}"
+        summary = truncate_to_tokens(llm_chat(MEMORY_SUMMARY_SYS, prompt, priority="batch"), MEMORY_TOKEN_BUDGET // 3)
+        folded = MEM.fold(session_id, persona_id, overflow, summary)
+        self.stats["folds" if folded else "skipped"] += 1
+        return folded
+
+    def wait(self) -> None:
+        """Bloquea hasta que terminen los resúmenes encolados."""
+        self._pool.submit(lambda: None).result()
+
+SUMMARIZER = MemorySummarizer()
+
+def fit_history(summary: str, messages: List[Dict[str, str]], budget: int = MEMORY_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """
+    Historia para el prompt dentro de `budget` tokens: el resumen (hasta un
+    tercio del presupuesto) y los turnos más recientes enteros; si ni el
+    último turno entra, se recortan sus mensajes.
+    """
+    summary = truncate_to_tokens(summary, budget // 3) if summary else ""
+    remaining = budget - estimate_tokens(summary)
+    kept: List[Dict[str, str]] = []
+    pairs = [messages[i:i + 2] for i in range(0, len(messages), 2)]
+    for pair in reversed(pairs):
+        cost = sum(estimate_tokens(m["content"]) for m in pair)
+        if cost > remaining:
+            if not kept:
+                share = max(1, remaining // len(pair))
+                kept = [{**m, "content": truncate_to_tokens(m["content"], share)} for m in pair]
+            break
+        kept = pair + kept
+        remaining -= cost
+    return ([{"role": "summary", "content": summary}] if summary else []) + kept
 
 # ========= STATE =========
+class Chunk(NamedTuple):
+    """Chunk de CV compacto (tupla): sin el dict de metadata que duplicaba el texto."""
+    chunk_id: str
+    text: str
+    score: float
+    person_id: str
+    section: str = ""
+    company: str = ""
+    position: int = -1                      # índice de la unidad (INDEX_GRANULARITY="sentence")
+
+    @classmethod
+    def from_hit(cls, hit: Dict[str, Any]) -> "Chunk":
+        """Construye el chunk desde un hit de search_similar o un dict {chunk_id, text, meta, score}."""
+        fields = hit.get("fields") or hit.get("meta") or {}
+        return cls(
+            chunk_id=str(fields.get("chunk_id") or hit.get("chunk_id") or hit.get("_id")),
+            text=fields.get("chunk_text") or hit.get("text", ""),
+            score=float(hit.get("_score", hit.get("score", 0.0))),
+            person_id=str(fields.get("person_id", "")),
+            section=fields.get("section") or "",
+            company=fields.get("company") or "",
+            position=int(fields.get("position", -1)),
+        )
+
+# Marca en el input de un turno nuevo: descarta el trace del turno anterior (checkpointer)
+NEW_TURN = "__new_turn__"
+
+def merge_trace(left: Dict[str, Any] | None, right: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Reducer de trace: cada nodo devuelve solo sus claves nuevas."""
+    if not right:
+        return left or {}
+    if right.get(NEW_TURN):
+        return {k: v for k, v in right.items() if k != NEW_TURN}
+    if not left:
+        return right
+    return {**left, **right}
+
+def replace_chunks(left: Tuple[Chunk, ...] | None, right: Any) -> Tuple[Chunk, ...]:
+    """Reducer de chunks: reemplaza (no acumula) y normaliza a tuplas Chunk."""
+    return tuple(c if isinstance(c, Chunk) else Chunk.from_hit(c) for c in (right or ()))
+
 class AgentState(TypedDict, total=False):
     session_id: str
     query: str
     candidates: List[Dict[str, Any]]        # {persona_id, name, score, source_name}
     persona_ids: List[str]
-    chunks: List[Dict[str, Any]]
+    chunks: Annotated[Sequence[Chunk], replace_chunks]  # los nodos devuelven listas; el reducer las pasa a tupla
     history: List[Dict[str, str]]
     answer: str
-    trace: Dict[str, Any]
+    trace: Annotated[Dict[str, Any], merge_trace]
     disambiguation_choice: str              # NUEVO: "1" / "2" / persona_id / nombre
     reuse_last_persona: bool
     mode: Literal["multi","single"] 
+    speculation: Dict[str, Any]             # resultados especulativos que ganaron (SPECULATIVE_COREF)
+    tenants: List[str]                      # pools (empresas cliente) de la sesión; queda en el checkpoint
+    budget_ms: int                          # SLO de latencia del turno (0 = sin límite)
+    deadline: float                         # time.time() en que vence el presupuesto (0 = sin límite)
+
+def session_tenants(state: AgentState) -> List[str]:
+    """Tenants de la sesión: los del input, si no TENANT ("" = pool compartido)."""
+    return list(state.get("tenants") or [TENANT])
+
+def session_namespaces(state: AgentState) -> List[str]:
+    """Shards (namespaces) a consultar para la sesión; más de uno = búsqueda entre pools."""
+    return [tenant_namespace(t) for t in session_tenants(state)]
+
+# ========= PRESUPUESTO DE LATENCIA POR TURNO =========
+def turn_deadline(budget_ms: int) -> float:
+    """Instante (time.time()) en que vence un presupuesto que arranca ahora; 0 = sin límite."""
+    return time.time() + budget_ms / 1000 if budget_ms and budget_ms > 0 else 0.0
+
+def budget_left_ms(state: AgentState) -> float:
+    """Milisegundos que le quedan al turno (inf sin presupuesto; negativo si ya venció)."""
+    deadline = state.get("deadline") or 0.0
+    return (deadline - time.time()) * 1000 if deadline else math.inf
+
+def llm_timeout(state: AgentState, reserve_ms: float = 0.0) -> float | None:
+    """Timeout (s) para una llamada al LLM que debe dejar reserve_ms para el resto del turno."""
+    left = budget_left_ms(state)
+    return None if left == math.inf else max(0.1, (left - reserve_ms) / 1000)
+
+def degrade(state: AgentState, *steps: str) -> Dict[str, Any]:
+    """Claves de trace de una degradación: se suman a las ya aplicadas en el turno."""
+    applied = list(state.get("trace", {}).get("degraded", []))
+    return {"degraded": applied + [s for s in steps if s not in applied], "budget_left_ms": round(budget_left_ms(state))}
 
 # ========= LLAMADAS A PINECONE =========
 def _ensure_hits(obj):
@@ -86,62 +354,106 @@ def _ensure_hits(obj):
         return [obj]
     return []
 
-def pinecone_query_people(queries: List[str]) -> List[Dict[str, Any]]:
-    """
-    Busca personas por texto usando tu search_similar() en el namespace de personas.
-    Devuelve candidatos deduplicados por persona_id, ordenados por score desc.
-    Estructura de salida (por item):
-    {
-        "persona_id": str,
-        "name": str,
-        "score": float,
-        "source_name": str
-    }
-    """
-    out: List[Dict[str, Any]] = []
-
-    for query_text in queries:
-        hits = _ensure_hits(
+def _search(
+    text: str,
+    namespaces: List[str],
+    top_k: int,
+    index: str,
+    metadata_filter: dict | None = None,
+) -> List[Dict[str, Any]]:
+    """Un shard: search_similar directo; varios: scatter-gather en paralelo, mezclado por score."""
+    if len(namespaces) == 1:
+        return _ensure_hits(
             search_similar(
-                text=query_text,
-                top_k=5,
-                namespace=PINECONE_NAMESPACE,
+                text=text,
+                top_k=top_k,
+                namespace=namespaces[0],
                 debug=False,
-                index=PINECONE_PERSONA_INDEX,
                 ui=False,  # importante: así devuelve dicts con _id, _score, fields
+                index=index,
+                metadata_filter=metadata_filter,
             )
         )
-        for m in hits:
-            fields = m.get("fields", {}) or {}
-            person_id = fields.get("person_id") or m.get("_id")
-            # arma nombre completo si viene separado
-            name = fields.get("canonical_name") or fields.get("name") or ""
-            lastname = fields.get("lastname") or ""
-            full_name = name if not lastname else f"{name} {lastname}"
-
-            out.append({
-                "persona_id": str(person_id) if person_id is not None else None,
-                "name": full_name.strip(),
-                "score": float(m.get("_score", 0.0)),
-                "source_name": query_text,
-            })
+    return [hit for _, hit in search_shards(text, namespaces, top_k, metadata_filter, index)]
+
+def _people_from_hits(hits: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
+    """Hits del índice de personas -> candidatos {persona_id, name, score, source_name}."""
+    out: List[Dict[str, Any]] = []
+    for m in hits:
+        fields = m.get("fields", {}) or {}
+        person_id = fields.get("person_id") or m.get("_id")
+        # arma nombre completo si viene separado
+        name = fields.get("canonical_name") or fields.get("name") or ""
+        lastname = fields.get("lastname") or ""
+        full_name = name if not lastname else f"{name} {lastname}"
 
+        out.append({
+            "persona_id": str(person_id) if person_id is not None else None,
+            "name": full_name.strip(),
+            "score": float(m.get("_score", 0.0)),
+            "source_name": query_text,
+        })
+    return out
+
+def _dedupe_people(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # deduplicación por persona_id quedándote con el mejor score
     best: Dict[str, Dict[str, Any]] = {}
-    for c in out:
+    for c in candidates:
         k = c["persona_id"]
         if not k:
             continue
         if k not in best or c["score"] > best[k]["score"]:
             best[k] = c
-            
     return sorted(best.values(), key=lambda x: x["score"], reverse=True)
 
-def pinecone_query_cv(query_text: str, persona_ids: List[str]) -> List[Dict[str, Any]]:
+def pinecone_query_people(queries: List[str], namespaces: List[str] | None = None) -> List[Dict[str, Any]]:
+    """
+    Busca personas por texto usando tu search_similar() en el índice de personas,
+    en los shards de namespaces (por defecto el de TENANT).
+    Devuelve candidatos deduplicados por persona_id, ordenados por score desc.
+    Estructura de salida (por item):
+    {
+        "persona_id": str,
+        "name": str,
+        "score": float,
+        "source_name": str
+    }
+    """
+    out: List[Dict[str, Any]] = []
+    namespaces = namespaces or [tenant_namespace()]
+
+    for query_text in queries:
+        hits = _search(query_text, namespaces, top_k=5, index=PINECONE_PERSONA_INDEX)
+        out += _people_from_hits(hits, query_text)
+            
+    return _dedupe_people(out)
+
+def pinecone_query_people_each(names: List[str], namespaces: List[str] | None = None) -> List[List[Dict[str, Any]]]:
+    """
+    Candidatos por nombre (una lista por nombre, en orden): los nombres se
+    embeben juntos en una sola llamada batcheada en lugar de una búsqueda por nombre.
+    Entre varios shards, cada nombre va por scatter-gather.
+    """
+    namespaces = namespaces or [tenant_namespace()]
+    if len(names) < 2 or len(namespaces) > 1:
+        return [pinecone_query_people([n], namespaces) for n in names]
+    hits_per_name = search_similar_many(
+        names, top_k=5, namespace=namespaces[0], index=PINECONE_PERSONA_INDEX
+    )
+    return [_dedupe_people(_people_from_hits(hits, n)) for n, hits in zip(names, hits_per_name)]
+
+def pinecone_query_cv(
+    query_text: str,
+    persona_ids: List[str],
+    namespaces: List[str] | None = None,
+    top_k: int | None = None,
+) -> List[Chunk]:
     """
     Busca chunks de CV usando search_similar() en el índice de CVs,
-    filtrando server-side por person_id.
+    filtrando server-side por person_id, en los shards de namespaces.
+    top_k: candidatos a traer (default TOPK_RETRIEVE; menos con el presupuesto justo).
     """
+    top_k = top_k or TOPK_RETRIEVE
     pid_list = [str(x) for x in (persona_ids or [])]
     if not pid_list:
         return []
@@ -149,30 +461,288 @@ def pinecone_query_cv(query_text: str, persona_ids: List[str]) -> List[Dict[str,
     # Filtro server-side por uno o varios IDs
     where = {"person_id": {"$eq": pid_list[0]}} if len(pid_list) == 1 else {"person_id": {"$in": pid_list}}
 
-    hits = _ensure_hits(
-        search_similar(
-            text=query_text,
-            top_k=TOPK_RETRIEVE,
-            namespace=PINECONE_NAMESPACE,
-            debug=False,
-            ui=False,             # dicts con _id, _score, fields
-            index=PINECONE_INDEX, # índice de CVs
-            metadata_filter=where,
-        )
+    hits = _search(query_text, namespaces or [tenant_namespace()], top_k, PINECONE_INDEX, where)
+
+    out = [Chunk.from_hit(m) for m in hits]
+    out.sort(key=lambda x: x.score, reverse=True)
+    return out[:top_k]
+
+# ========= MULTI-QUERY =========
+# los threads se crean en el primer submit (seguro con el fork del modo serve)
+MULTI_QUERY_POOL = ThreadPoolExecutor(max_workers=MULTI_QUERY_WORKERS, thread_name_prefix="multi-query")
+
+def pinecone_query_cv_multi(
+    queries: List[str],
+    persona_ids: List[str],
+    namespaces: List[str] | None = None,
+    top_k: int | None = None,
+) -> List[Chunk]:
+    """
+    Sub-queries contra el mismo filtro por persona, todas en paralelo (la latencia
+    es la de la más lenta), fusionadas por reciprocal rank fusion. El score de
+    cada chunk pasa a ser el de RRF: el reranker parte del orden fusionado.
+    """
+    if len(queries) < 2:
+        return pinecone_query_cv(queries[0], persona_ids, namespaces, top_k)
+    # cada sub-query con una copia del contexto (turno grabado por TRAFFIC_RECORD)
+    futures = [
+        MULTI_QUERY_POOL.submit(copy_context().run, pinecone_query_cv, q, persona_ids, namespaces, top_k)
+        for q in queries
+    ]
+    rankings = [f.result() for f in futures]
+    fused = rrf_fuse(rankings, key=lambda c: c.chunk_id)
+    return [c._replace(score=round(s, 6)) for c, s in fused[:top_k or TOPK_RETRIEVE]]
+
+def cv_queries(query_text: str, persona_ids: List[str]) -> List[str]:
+    """
+    Queries para el retrieval de CVs: la original y, según MULTI_QUERY, sus
+    reescrituras ("rules" sin LLM; "llm" con fallback a reglas). Si todas las
+    personas se sirven con CV completo no hay retrieval y no se expande.
+    """
+    if MULTI_QUERY == "none" or not persona_ids or all(full_cv_chunk(pid) for pid in persona_ids):
+        return [query_text]
+    if MULTI_QUERY == "llm":
+        rewrites = rewrite_query_with_llm(query_text)
+        if rewrites:
+            return list(dict.fromkeys([query_text] + rewrites))[:MULTI_QUERY_MAX]
+    names = []
+    for pid in persona_ids:
+        record = get_document_store().get(pid) or get_profile_store().get(pid) or {}
+        names.append(f"{record.get('name', '')} {record.get('lastname', '')}")
+    return expand_query(query_text, names)
+
+# ========= CV COMPLETO (sin retrieval) =========
+def full_cv_chunk(persona_id: str) -> Chunk | None:
+    """
+    Devuelve el CV completo de la persona como un único chunk si entra en
+    FULLCV_TOKEN_BUDGET; None si no está en el document store o es muy largo.
+    """
+    if not FULLCV_ENABLED:
+        return None
+    doc = get_document_store().get(persona_id)
+    if not doc or doc.get("tokens", 0) > FULLCV_TOKEN_BUDGET:
+        return None
+    return Chunk(f"cv_full_{persona_id}", doc["text"], 1.0, str(persona_id), "CV completo")
+
+def retrieve_cv_context(
+    query_text: str,
+    persona_ids: List[str],
+    namespaces: List[str] | None = None,
+    queries: List[str] | None = None,
+    top_k: int | None = None,
+) -> tuple[List[Chunk], List[str]]:
+    """
+    Contexto de CV para una o varias personas: CV completo para quienes entran
+    en el presupuesto y búsqueda vectorial solo para el resto (con varias
+    queries, ver cv_queries, se buscan en paralelo y se fusionan).
+    Devuelve (chunks, persona_ids servidos con CV completo).
+    """
+    full_chunks, pending = [], []
+    for pid in persona_ids:
+        chunk = full_cv_chunk(pid)
+        if chunk:
+            full_chunks.append(chunk)
+        else:
+            pending.append(pid)
+    chunks = full_chunks + (pinecone_query_cv_multi(queries or [query_text], pending, namespaces, top_k) if pending else [])
+    return chunks, [c.person_id for c in full_chunks]
+
+# ========= VENTANAS (índice por oraciones) =========
+def expand_windows(
+    chunks: List[Chunk],
+    radius: int = WINDOW_RADIUS,
+    max_units: int = WINDOW_MAX_UNITS,
+    units_by_pid: Dict[str, List[str]] | None = None,
+) -> List[Chunk]:
+    """
+    Hits de unidades con posición → ventanas de ±radius unidades del CV (desde
+    el document store, o units_by_pid), fusionadas por persona y sin solaparse.
+    El orden de salida es el del mejor hit de cada ventana; lo que no tiene
+    posición o unidades guardadas pasa igual.
+    """
+    ranked: List[tuple] = []
+    hits_by_pid: Dict[str, List[tuple]] = {}
+    units_by_pid = dict(units_by_pid or {})
+    for rank, c in enumerate(chunks):
+        if c.position >= 0 and c.person_id not in units_by_pid:
+            units_by_pid[c.person_id] = (get_document_store().get(c.person_id) or {}).get("units") or []
+        if c.position < 0 or c.position >= len(units_by_pid.get(c.person_id, [])):
+            ranked.append((rank, c))
+        else:
+            hits_by_pid.setdefault(c.person_id, []).append((rank, c))
+
+    for pid, hits in hits_by_pid.items():
+        units = units_by_pid[pid]
+        windows: List[List[Any]] = []  # [inicio, fin, mejor rank, mejor score]
+        for rank, c in sorted(hits, key=lambda h: h[1].position):
+            start, end = max(0, c.position - radius), min(len(units) - 1, c.position + radius)
+            last = windows[-1] if windows else None
+            if last and start <= last[1] + 1 and end - last[0] < max_units:
+                last[1], last[2], last[3] = max(last[1], end), min(last[2], rank), max(last[3], c.score)
+                continue
+            if last and c.position <= last[1]:
+                # ya cubierto por una ventana llena
+                last[2], last[3] = min(last[2], rank), max(last[3], c.score)
+                continue
+            start = max(start, last[1] + 1) if last else start
+            windows.append([start, end, rank, c.score])
+        for start, end, rank, score in windows:
+            text = " ".join(units[start:end + 1])
+            ranked.append((rank, Chunk(f"cv_win_{pid}_{start}_{end}", text, score, pid, position=start)))
+
+    return [c for _, c in sorted(ranked, key=lambda r: r[0])]
+
+# ========= RESÚMENES DE PERFIL (multi-persona) =========
+SUMMARY_SECTION = "Resumen de perfil"
+
+def profile_summary_chunk(persona_id: str) -> Chunk | None:
+    """Resumen precomputado en load.py como chunk de contexto (None si no existe)."""
+    profile = get_profile_store().get(persona_id)
+    if not profile or not profile.get("summary"):
+        return None
+    full_name = f"{profile.get('name', '')} {profile.get('lastname', '')}".strip()
+    return Chunk(
+        f"profile_summary_{persona_id}",
+        f"{full_name}: {profile['summary']}",
+        1.0,
+        str(persona_id),
+        SUMMARY_SECTION,
     )
 
-    out: List[Dict[str, Any]] = []
-    for m in hits:
-        fields = m.get("fields", {}) or {}
-        out.append({
-            "chunk_id": fields.get("chunk_id") or m.get("_id"),
-            "text": fields.get("chunk_text", ""),
-            "meta": fields,
-            "score": float(m.get("_score", 0.0)),
-        })
+def retrieve_multi_context(
+    query_text: str,
+    persona_ids: List[str],
+    namespaces: List[str] | None = None,
+    top_k: int | None = None,
+) -> tuple[List[Chunk], List[str]]:
+    """
+    Contexto acotado para comparaciones:
+    - si los CVs completos de todos entran en MULTI_CONTEXT_TOKEN_BUDGET, se usan enteros;
+    - si no, resumen precomputado + chunks específicos de la query por persona.
+    Devuelve (chunks, persona_ids servidos con CV completo).
+    """
+    full = [c for c in (full_cv_chunk(pid) for pid in persona_ids) if c]
+    if len(full) == len(persona_ids) and sum(estimate_tokens(c.text) for c in full) <= MULTI_CONTEXT_TOKEN_BUDGET:
+        return full, list(persona_ids)
+
+    summaries = [c for c in (profile_summary_chunk(pid) for pid in persona_ids) if c]
+    if not summaries:
+        return retrieve_cv_context(query_text, persona_ids, namespaces, top_k=top_k)
+    return summaries + pinecone_query_cv(query_text, persona_ids, namespaces, top_k), []
+
+# ========= PERFIL ESTRUCTURADO (fast path sin RAG ni LLM) =========
+# Intenciones factuales que se responden directo desde el ProfileStore.
+# Los patrones se aplican sobre la query sin tildes y en minúsculas.
+PROFILE_INTENTS = {
+    "contacto": r"datos personales|contacto|e-?mail|correo|telefono|celular|linkedin|donde vive|residencia|nacimiento|\bdni\b",
+    "experiencia": r"experiencias? laboral(?:es)?|empleos|puestos|roles",
+    "empresas": r"empresas|companias|donde trabajo",
+    "educacion": r"educacion|donde estudio|estudios|titulos?\b|universidad|formacion",
+    "skills": r"tecnologias|skills|habilidades|conocimientos tecnicos|stack",
+    "certificaciones": r"certificacion|certificaciones|certificad",
+    "idiomas": r"idiomas?\b|ingles",
+}
+# Preguntas analíticas/comparativas: van por RAG + LLM aunque mencionen un campo
+PROFILE_EXCLUDE = r"por que|\bcomo\b|cuantos anos|compar|mejor|peor|describ|resum|explic|opin|recomend"
+# Lo único que puede acompañar al campo en una pregunta de listado ("¿en qué empresas trabajó Ana?").
+# Cualquier otra palabra la califica ("¿usó tecnologías cloud en Globant?") y va por RAG + LLM.
+PROFILE_LIST_FILLER = (
+    r"que|cual(?:es)?|quien|donde|en|de|del|la|las|el|los|lo|y|e|o|a|al|su|sus|son|es|fue|ha|han|"
+    r"tiene|tuvo|hizo|maneja|usa|uso|conoce|domina|habla|trabajo|estudio|vive|nacio|obtuvo|sabe|"
+    r"dame|decime|dime|mostrame|lista|listar|listado|todas?|todos?|ultim[oa]s?|primer[oa]s?|"
+    r"recientes?|fecha|numero|perfil|\d+"
+)
 
-    out.sort(key=lambda x: x["score"], reverse=True)
-    return out[:TOPK_RETRIEVE]
+PROFILE_SECTIONS = {
+    "contacto": "Datos Personales",
+    "experiencia": "Experiencia Laboral",
+    "empresas": "Experiencia Laboral",
+    "educacion": "Educación",
+    "skills": "Conocimientos Técnicos",
+    "certificaciones": "Certificaciones",
+    "idiomas": "Idiomas",
+}
+
+CONTACT_LABELS = {
+    "email": "Correo",
+    "telefono": "Teléfono",
+    "linkedin": "LinkedIn",
+    "ubicacion": "Residencia",
+    "fecha_nacimiento": "Fecha de nacimiento",
+    "dni": "DNI",
+}
+
+def match_profile_intents(query: str, names: Sequence[str] = ()) -> List[str]:
+    """
+    Intenciones factuales de una pregunta de listado: vacío si es analítica, no
+    matchea o trae palabras que la califican (fuera de PROFILE_LIST_FILLER y names).
+    """
+    q = fold_text(query)
+    if re.search(PROFILE_EXCLUDE, q):
+        return []
+    intents = [intent for intent, pattern in PROFILE_INTENTS.items() if re.search(pattern, q)]
+    rest = q
+    for pattern in PROFILE_INTENTS.values():
+        rest = re.sub(pattern, " ", rest)
+    name_words = {w for n in names for w in re.findall(r"\w+", fold_text(n))}
+    if any(w not in name_words and not re.fullmatch(PROFILE_LIST_FILLER, w) for w in re.findall(r"\w+", rest)):
+        return []
+    return intents
+
+def profile_fastpath_intents(state: AgentState, partial: bool = False) -> List[str]:
+    """
+    Intenciones que el perfil de la persona elegida puede responder por completo;
+    con partial (presupuesto agotado), las que puede responder aunque falte alguna.
+    """
+    persona_ids = state.get("persona_ids", [])
+    if not PROFILE_FASTPATH_ENABLED or len(persona_ids) != 1:
+        return []
+    profile = get_profile_store().get(persona_ids[0])
+    if not profile:
+        return []
+    intents = match_profile_intents(state.get("query", ""), [f"{profile.get('name', '')} {profile.get('lastname', '')}"])
+    if partial:
+        return [i for i in intents if profile.get(i)]
+    return intents if all(profile.get(i) for i in intents) else []
+
+def _format_profile_item(item: Any) -> str:
+    if not isinstance(item, dict):
+        return str(item).strip()
+    values = {k: str(v).strip() for k, v in item.items() if v and str(v).strip()}
+    # rol/empresa o título/institución con el período entre paréntesis
+    period = " – ".join(x for x in [values.pop("desde", ""), values.pop("hasta", "")] if x)
+    period = period or values.pop("periodo", "")
+    text = " – ".join(values.values())
+    return f"{text} ({period})" if period else text
+
+def render_profile_answer(profile: Dict[str, Any], intents: List[str], query: str) -> str:
+    """Respuesta templada con citas [#] al documento/sección de origen."""
+    full_name = f"{profile.get('name', '')} {profile.get('lastname', '')}".strip()
+    m = re.search(r"(?:ultim[oa]s?|primer[oa]s?)\s+(\d+)", fold_text(query))
+    limit = int(m.group(1)) if m else None
+
+    lines = [f"**{full_name}**", ""]
+    sources = []
+    for i, intent in enumerate(intents, 1):
+        section = PROFILE_SECTIONS[intent]
+        lines.append(f"**{section}** [{i}]")
+        value = profile[intent]
+        if intent == "contacto":
+            for key, label in CONTACT_LABELS.items():
+                if value.get(key):
+                    lines.append(f"- {label}: {value[key]}")
+        elif intent == "skills":
+            lines.append("- " + ", ".join(_format_profile_item(x) for x in value))
+        elif intent == "empresas":
+            lines.append("- " + ", ".join(_format_profile_item(x) for x in (value[:limit] if limit else value)))
+        else:
+            items = value[:limit] if (limit and intent == "experiencia") else value
+            lines += [f"- {_format_profile_item(x)}" for x in items]
+        lines.append("")
+        sources.append(
+            f"[{i}] (id=cv_full_{profile['person_id']} | {section} | {profile.get('source', '')})"
+        )
+    return "\n".join(lines + ["Fuentes:"] + sources)
 
 # ========= SYSTEM PROMPTS PARA DISTINTAS TAREAS =========
 SYSTEM = (
@@ -192,6 +762,13 @@ COREF_SYS = (
     "- Si no hay persona previa, responde 'no'."
 )
 
+MULTI_QUERY_SYS = f"""
+Reescribe la pregunta del usuario sobre un CV en hasta {MULTI_QUERY_MAX - 1} consultas de búsqueda
+cortas y distintas: sub-preguntas (una por tema si pregunta por varios) o sinónimos de los términos clave.
+Omite el nombre de la persona. Responde SOLO un JSON array de strings, sin texto adicional.
+Ejemplo: ["experiencia con Spark", "experiencia con Airflow", "pipelines de datos"]
+"""
+
 EXTRACT_NAMES_SYS = """
 Extrae todos los nombres de personas mencionados en el texto del usuario.
 Responde SOLO un JSON array de strings, sin texto adicional.
@@ -199,82 +776,354 @@ Ejemplo: ["Camila", "Valentina Rodríguez"]
 """
 
 # ========= GROQ LLM =========
-def llm_chat(system: str, user: str) -> str:
-    resp = groq_client.chat.completions.create(
-        model=GROQ_LLM_MODEL,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user}
-        ],
-        temperature=0.2,
-        max_tokens=800
+# Todas las llamadas pasan por el rate limiter global (src/rateLimiter.py), con su clase de prioridad:
+# "interactive" (respuesta del turno), "classification" (coref, nombres), "batch" (resúmenes, batch.py)
+# model/timeout: GROQ_FAST_MODEL y el tiempo que le queda al turno cuando hay presupuesto (budget_ms);
+# el timeout cubre la espera por cupo (RateLimitTimeout) más la llamada (APITimeoutError)
+def time_left(deadline: float | None) -> float | None:
+    """Segundos hasta deadline (mínimo 0.1) para el timeout de la llamada; None sin plazo."""
+    return None if deadline is None else max(0.1, deadline - time.time())
+
+@recorded
+def llm_chat(
+    system: str,
+    user: str,
+    priority: str = "interactive",
+    model: str | None = None,
+    timeout: float | None = None,
+) -> str:
+    messages: List[ChatCompletionMessageParam] = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user}
+    ]
+    deadline = time.time() + timeout if timeout is not None else None
+    resp = get_rate_limiter().call(
+        lambda: groq_client.chat.completions.create(
+            model=model or GROQ_LLM_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=800,
+            timeout=time_left(deadline),
+        ),
+        priority,
+        request_tokens(messages, 800),
+        max_wait=timeout,
     )
     return resp.choices[0].message.content.strip()
 
+@recorded
+def llm_chat_tokens(system: str, user: str, model: str | None = None, timeout: float | None = None) -> Iterator[str]:
+    """Igual que llm_chat pero con stream=True: va devolviendo los deltas de texto."""
+    messages: List[ChatCompletionMessageParam] = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user}
+    ]
+    deadline = time.time() + timeout if timeout is not None else None
+    # sin usage en el stream: queda reservado el máximo de tokens
+    stream = get_rate_limiter().call(
+        lambda: groq_client.chat.completions.create(
+            model=model or GROQ_LLM_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=800,
+            stream=True,
+            timeout=time_left(deadline),
+        ),
+        "interactive",
+        request_tokens(messages, 800),
+        used=None,
+        max_wait=timeout,
+    )
+    for part in stream:
+        delta = part.choices[0].delta.content if part.choices else None
+        if delta:
+            yield delta
+
+def llm_chat_answer(system: str, user: str, model: str | None = None, timeout: float | None = None) -> str:
+    """
+    Respuesta final del turno. Si el turno corre con configurable.stream_tokens
+    (stream_turn), cada delta se emite al stream "custom" del grafo; si no, es llm_chat.
+    """
+    try:
+        streaming = bool(get_config().get("configurable", {}).get("stream_tokens"))
+    except RuntimeError:
+        streaming = False  # fuera de un nodo del grafo
+    if not streaming:
+        return llm_chat(system, user, model=model, timeout=timeout)
+
+    write = get_stream_writer()
+    parts = []
+    for delta in llm_chat_tokens(system, user, model=model, timeout=timeout):
+        parts.append(delta)
+        write({"token": delta})
+    return "".join(parts).strip()
+
 def decide_coref_with_llm_node(state: AgentState) -> AgentState:
     session_id = state.get("session_id", "default")
-    last_persona = MEM.last_persona_by_session.get(session_id)
+    last_persona = MEM.last_persona(session_id)
     q = state["query"]
 
     # Si venimos de segunda vuelta de desambiguación, dejamos que siga el flujo normal:
     if state.get("disambiguation_choice") and state.get("candidates"):
-        return {**state, "reuse_last_persona": False}
+        return {"reuse_last_persona": False}
 
     # Sin persona previa → no hay follow-up
     if not last_persona:
-        return {**state, "reuse_last_persona": False}
+        return {"reuse_last_persona": False}
+
+    # Sin margen para la coref: sigue la persona previa salvo que la pregunta traiga un nombre
+    if budget_left_ms(state) < DEGRADE_SKIP_LLM_MS:
+        reuse = not state.get("trace", {}).get("parsed_names")
+        return {"reuse_last_persona": reuse, "trace": {"coref_reuse": reuse, **degrade(state, "coref_skipped")}}
 
     user_msg = (
         f"Pregunta del usuario: {q}\n"
         f"Hay una persona previa ya seleccionada en contexto.\n"
         f"¿La pregunta parece referirse a esa MISMA persona? (yes/no)"
     )
-    reuse = llm_yesno(COREF_SYS, user_msg)
-    tr = {**state.get("trace", {}), "coref_reuse": reuse}
-    return {**state, "reuse_last_persona": bool(reuse), "trace": tr}
+    if SPECULATIVE_COREF:
+        return speculative_coref(state, last_persona, user_msg)
+    reuse, degraded = coref_llm(state, user_msg)
+    return {"reuse_last_persona": reuse, "trace": {"coref_reuse": reuse, **degraded}}
+
+def coref_llm(state: AgentState, user_msg: str) -> Tuple[bool, Dict[str, Any]]:
+    """Coref por LLM con el tiempo que deja el presupuesto para la respuesta; si no llega, sigue la persona previa."""
+    try:
+        return bool(llm_yesno(COREF_SYS, user_msg, timeout=llm_timeout(state, DEGRADE_FAST_MODEL_MS))), {}
+    except (APITimeoutError, RateLimitTimeout):
+        return True, degrade(state, "coref_timeout")
+
+# los threads se crean en el primer submit (seguro con el fork del modo serve)
+SPECULATION_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculation")
+
+def speculative_coref(state: AgentState, last_persona: str, user_msg: str) -> AgentState:
+    """
+    Coref con ejecución especulativa: la búsqueda de personas (rama "no es la
+    misma persona") y el retrieval del CV de la persona previa (rama "sí")
+    arrancan junto con la llamada al LLM. Según la decisión se guarda el
+    resultado de una rama en state['speculation'] y la otra se descarta sin esperarla.
+    """
+    q = state["query"]
+    session_id = state.get("session_id", "default")
+    names = state.get("trace", {}).get("parsed_names") or []
+
+    namespaces = session_namespaces(state)
+    futures: Dict[str, Future] = {"cv": SPECULATION_POOL.submit(
+        copy_context().run, lambda: retrieve_cv_context(q, [last_persona], namespaces, cv_queries(q, [last_persona]))
+    )}
+    # con alias en caché resolve_people no busca: no hay nada que adelantar
+    if not (len(names) == 1 and ALIASES.get(session_id, names[0])):
+        futures["people"] = SPECULATION_POOL.submit(copy_context().run, pinecone_query_people, [q], namespaces)
+
+    t0 = time.perf_counter()
+    reuse, degraded = coref_llm(state, user_msg)
+    keep = "cv" if reuse else "people"
+    trace: Dict[str, Any] = {
+        **degraded,
+        "coref_reuse": reuse,
+        "spec_launched": sorted(futures),
+        "spec_coref_ms": round((time.perf_counter() - t0) * 1000, 2),
+        "spec_discarded": [name for name in futures if name != keep],
+    }
+    for name in trace["spec_discarded"]:
+        futures[name].cancel()  # si ya arrancó, termina en segundo plano y se ignora
+
+    speculation: Dict[str, Any] = {}
+    if keep in futures:
+        trace["spec_ready_before_coref"] = futures[keep].done()
+        try:
+            if keep == "cv":
+                chunks, full_pids = futures["cv"].result()
+                speculation["cv"] = {"persona_id": last_persona, "chunks": list(chunks), "full_cv": full_pids}
+            else:
+                speculation["people"] = futures["people"].result()
+        except Exception as e:
+            # la rama ganadora falló: el nodo siguiente hace la consulta normal
+            trace["spec_error"] = f"{keep}: {e}"
+    return {"reuse_last_persona": reuse, "speculation": speculation, "trace": trace}
 
 def render_history(history: List[Dict[str, str]]) -> str:
     if not history:
         return "(sin historia)\n"
-    lines = []
-    for h in history[-8:]:
+    lines = [f"Resumen de turnos anteriores: {h['content']}" for h in history if h["role"] == "summary"]
+    for h in [h for h in history if h["role"] != "summary"][-8:]:
         role = "Usuario" if h["role"] == "user" else "Asistente"
         lines.append(f"{role}: {h['content']}")
     return "\n".join(lines) + "\n"
 
-def build_context(chunks: List[Dict[str, Any]]) -> str:
+def build_context(chunks: Sequence[Chunk]) -> str:
     lines = []
     for i, c in enumerate(chunks, 1):
-        meta = c["meta"]
-        src = "/".join([x for x in [meta.get("section"), meta.get("company")] if x])
-        lines.append(f"[{i}] (id={c['chunk_id']} | {src}) {c['text']}")
+        src = "/".join([x for x in [c.section, c.company] if x])
+        lines.append(f"[{i}] (id={c.chunk_id} | {src}) {c.text}")
     return "\n\n".join(lines)
 
-def llm_yesno(system: str, user: str) -> bool:
+def extractive_answer(chunks: Sequence[Chunk], max_tokens: int = 120) -> str:
+    """Respuesta sin LLM (presupuesto agotado): los fragmentos del contexto, citados."""
+    if not chunks:
+        return "No llegué a armar la respuesta a tiempo. Probá de nuevo en unos segundos."
+    lines = ["No llegué a redactar la respuesta a tiempo; estos son los fragmentos más relevantes:", ""]
+    lines += [f"[{i}] {truncate_to_tokens(c.text, max_tokens)}" for i, c in enumerate(chunks, 1)]
+    sources = []
+    for i, c in enumerate(chunks, 1):
+        src = "/".join([x for x in [c.section, c.company] if x])
+        sources.append(f"[{i}] (id={c.chunk_id} | {src})")
+    return "\n".join(lines + ["", "Fuentes:"] + sources)
+
+def budgeted_answer(state: AgentState, prompt: str, chunks: Sequence[Chunk]) -> AgentState:
+    """
+    Respuesta del turno dentro del presupuesto: con poco margen usa GROQ_FAST_MODEL;
+    sin margen, o si el LLM no termina a tiempo, extractos del contexto.
+    """
+    left = budget_left_ms(state)
+    if left < DEGRADE_NO_LLM_MS:
+        return {"answer": extractive_answer(chunks), "trace": degrade(state, "extractive_answer")}
+    steps = ["fast_model"] if left < DEGRADE_FAST_MODEL_MS else []
+    model = GROQ_FAST_MODEL if steps else None
+    try:
+        answer = llm_chat_answer(SYSTEM, prompt, model=model, timeout=llm_timeout(state))
+    except (APITimeoutError, RateLimitTimeout):
+        answer = extractive_answer(chunks)
+        steps.append("answer_timeout")
+    return {"answer": answer, "trace": degrade(state, *steps)} if steps else {"answer": answer}
+
+@recorded
+def llm_yesno(system: str, user: str, timeout: float | None = None) -> bool:
     """Devuelve True/False a partir de una pregunta binaria controlada."""
-    resp = groq_client.chat.completions.create(
-        model=GROQ_LLM_MODEL,
-        messages=[{"role": "system", "content": system},
-                  {"role": "user", "content": user}],
-        temperature=0.0,
-        max_tokens=5,
+    messages: List[ChatCompletionMessageParam] = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user}
+    ]
+    deadline = time.time() + timeout if timeout is not None else None
+    resp = get_rate_limiter().call(
+        lambda: groq_client.chat.completions.create(
+            model=GROQ_LLM_MODEL,
+            messages=messages,
+            temperature=0.0,
+            max_tokens=5,
+            timeout=time_left(deadline),
+        ),
+        "classification",
+        request_tokens(messages, 5),
+        max_wait=timeout,
     )
     text = (resp.choices[0].message.content or "").strip().lower()
     return "yes" in text or "sí" in text or "si" in text
 
 def extract_names_with_llm(q: str) -> list[str]:
-    raw = llm_chat(EXTRACT_NAMES_SYS, q)
+    raw = llm_chat(EXTRACT_NAMES_SYS, q, priority="classification")
     try:
         names = json.loads(raw)
         print(names)
         return [n.strip() for n in names if isinstance(n, str) and n.strip()]
     except Exception:
         return []
+
+def rewrite_query_with_llm(q: str) -> list[str]:
+    """Reescrituras/sub-preguntas del LLM para MULTI_QUERY="llm"; [] si falla (se usan las reglas)."""
+    try:
+        rewrites = json.loads(llm_chat(MULTI_QUERY_SYS, q))
+        return [r.strip() for r in rewrites if isinstance(r, str) and r.strip()][:MULTI_QUERY_MAX - 1]
+    except Exception:
+        return []
     
 # ========= NODOS =========
+def resolve_roster_node(state: AgentState) -> AgentState:
+    """
+    Resolución local, sin LLM ni índice de personas:
+    - nombres del roster en la query → candidatos directos (single) o persona_ids (multi),
+      usando la persona que el usuario ya eligió para esa mención en la sesión (ALIASES);
+    - sin nombres → persona previa de la sesión o DEFAULT_PERSONA;
+    - solo nombres de persona fuera del roster (nombre de pila conocido o en posición de
+      persona: "el candidato X", "conoces a X") → unknown_person, sin LLM;
+    - esos nombres junto a nombres del roster (o roster vacío) → classify_mode (LLM);
+    - otras palabras desconocidas (tecnologías, empresas) no cambian la resolución.
+    """
+    if not ROSTER_ENABLED or state.get("disambiguation_choice"):
+        return {"trace": {"roster": "skipped"}}
+    roster = get_roster(session_tenants(state))
+    if not len(roster):
+        return {"trace": {"roster": "empty"}}
+
+    q = state["query"] or ""
+    session_id = state.get("session_id", "default")
+    mentions = roster.match(q)
+    known_words = [w for m in mentions for w in m["words"]]
+    people = roster.unknown_people(q, known_words=known_words)
+    if people and not mentions:
+        return {"trace": {"roster": "unknown_names", "parsed_names": people}}
+    if people:
+        # puede ser otra persona que no está cargada o un término que no figura en ningún CV
+        return {"trace": {"roster": "llm_names", "roster_suspects": people}}
+    # palabras desconocidas que no parecen personas (tecnologías, empresas): se siguen como sin nombre
+    suspects = roster.unknown_names(q, known_words=known_words)
+    suspect_trace = {"roster_suspects": suspects} if suspects else {}
+
+    # mención ya resuelta antes en esta sesión (p.ej. el usuario eligió entre homónimos)
+    alias_hits = []
+    for m in mentions:
+        cached_pid = ALIASES.get(session_id, m["text"])
+        if cached_pid and any(c["persona_id"] == cached_pid for c in m["candidates"]):
+            m["candidates"] = [{"persona_id": cached_pid, "name": roster.name_of(cached_pid), "score": 1.0, "source_name": "[alias-cache]"}]
+            alias_hits.append(m["text"])
+    alias_trace = {"alias_cache_hit": alias_hits} if alias_hits else {}
+
+    names = [m["text"] for m in mentions]
+    top_pids = list(dict.fromkeys(m["candidates"][0]["persona_id"] for m in mentions))
+    if len(top_pids) >= 2:
+        return {"mode": "multi", "persona_ids": top_pids, "trace": {"roster": "multi", "parsed_names": names, **alias_trace, **suspect_trace}}
+    if mentions:
+        # menciones separadas de la misma persona ("Valentina ... Rodríguez"): se suman
+        scores: Dict[str, float] = {}
+        for m in mentions:
+            for c in m["candidates"]:
+                scores[c["persona_id"]] = min(1.0, scores.get(c["persona_id"], 0.0) + c["score"])
+        source = "[alias-cache]" if alias_hits else "[roster]"
+        cands = [
+            {"persona_id": pid, "name": roster.name_of(pid), "score": round(score, 3), "source_name": source}
+            for pid, score in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        ]
+        return {"mode": "single", "candidates": cands, "trace": {"roster": "match", "parsed_names": names, **alias_trace, **suspect_trace}}
+
+    # pregunta sin nombre: sigue con la persona de la sesión, si no con la persona por defecto
+    last_persona = MEM.last_persona(session_id)
+    if last_persona:
+        cand = {"persona_id": last_persona, "name": roster.name_of(last_persona), "score": 1.0, "source_name": "[session]"}
+        return {"mode": "single", "candidates": [cand], "trace": {"roster": "session_persona", "parsed_names": [], **suspect_trace}}
+    default = roster.lookup(DEFAULT_PERSONA)[:1] if DEFAULT_PERSONA else []
+    if default:
+        cand = {**default[0], "score": 1.0, "source_name": "[default]"}
+        return {"mode": "single", "candidates": [cand], "trace": {"roster": "default_persona", "parsed_names": [], **suspect_trace}}
+    return {"trace": {"roster": "no_names", **suspect_trace}}
+
+def route_after_roster(state: AgentState) -> str:
+    outcome = state.get("trace", {}).get("roster")
+    if outcome == "multi":
+        return "resolve_people_multi"
+    if outcome in ("match", "session_persona", "default_persona"):
+        return "decide_disambiguation"
+    if outcome == "unknown_names":
+        return "unknown_person"
+    return "classify_mode"
+
+def unknown_person_node(state: AgentState) -> AgentState:
+    """Respuesta inmediata cuando los nombres de la pregunta no están en el roster."""
+    names = state.get("trace", {}).get("parsed_names") or []
+    people = sorted(get_roster(session_tenants(state)).people.values())
+    listed = ", ".join(people[:10]) + (f" y {len(people) - 10} más" if len(people) > 10 else "")
+    answer = (
+        f"No encontré a {', '.join(names)} entre los perfiles cargados. "
+        f"Puedo responder sobre: {listed}."
+    )
+    return {"answer": answer, "persona_ids": [], "trace": {"decision": "unknown_person"}}
+
 def classify_mode_node(state: AgentState) -> AgentState:
     q = (state["query"] or "").strip()
 
+    # Sin margen para el LLM y con persona previa: se trata como pregunta de seguimiento
+    if budget_left_ms(state) < DEGRADE_SKIP_LLM_MS and MEM.last_persona(state.get("session_id", "default")):
+        return {"mode": "single", "trace": {"parsed_names": [], **degrade(state, "names_llm_skipped")}}
+
     # Extraer nombres con LLM (o regex si preferís)
     names = extract_names_with_llm(q)
 
@@ -283,53 +1132,72 @@ def classify_mode_node(state: AgentState) -> AgentState:
     else:
         mode = "single"   # fallback por defecto
 
-    trace = {**state.get("trace", {}), "parsed_names": names}
     print("[classify_mode]", {"query": q, "mode": mode, "names": names})
-    return {**state, "mode": mode, "trace": trace}
+    return {"mode": mode, "trace": {"parsed_names": names}}
 
 def route_by_mode(state: AgentState) -> str:
+    names = state.get("trace", {}).get("parsed_names") or []
+    if ROSTER_ENABLED and names and state.get("trace", {}).get("roster") == "llm_names":
+        # ninguno de los nombres que extrajo el LLM está cargado: no hay nada que buscar
+        roster = get_roster(session_tenants(state))
+        if not any(roster.lookup(n) for n in names):
+            print("[route_by_mode]", {"names": names, "next": "unknown_person"})
+            return "unknown_person"
     mode = (state.get("mode") or "single").lower()
     next_node = "resolve_people_multi" if mode == "multi" else "decide_coref_with_llm"
     print("[route_by_mode]", {"mode": mode, "names": state.get("trace", {}).get("parsed_names"), "next": next_node})
     return next_node
 
 def resolve_people_multi_node(state: AgentState) -> AgentState:
-    names = state.get("trace", {}).get("parsed_names") or extract_names_with_llm(state["query"])
+    names = state.get("trace", {}).get("parsed_names") or []
+    if state.get("persona_ids"):
+        # ya resueltos contra el roster
+        return {"trace": {"multi_names_used": names, "multi_pids": state["persona_ids"]}}
+    names = names or extract_names_with_llm(state["query"])
     persona_ids = []
-    for name in names:
-        hits = pinecone_query_people([name])[:1]
+    for hits in pinecone_query_people_each(names, session_namespaces(state)):
         if hits:
             persona_ids.append(hits[0]["persona_id"])
-    trace = {**state.get("trace", {}), "multi_names_used": names, "multi_pids": persona_ids}
-    return {**state, "persona_ids": persona_ids, "trace": trace}
+    return {"persona_ids": persona_ids, "trace": {"multi_names_used": names, "multi_pids": persona_ids}}
 
 def retrieve_cv_chunks_multi_node(state: AgentState) -> AgentState:
     pids = state.get("persona_ids", [])
-    chunks = pinecone_query_cv(state["query"], pids) if pids else []
-    return {**state, "chunks": chunks}
+    if not pids:
+        return {"chunks": [], "trace": {"full_cv": []}}
+    top_k = DEGRADED_TOPK_RETRIEVE if budget_left_ms(state) < DEGRADE_RETRIEVAL_MS else None
+    chunks, full_pids = retrieve_multi_context(state["query"], pids, session_namespaces(state), top_k)
+    # con los CVs completos no hubo búsqueda que achicar
+    trace = degrade(state, "retrieval_shrunk") if top_k and len(full_pids) < len(pids) else {}
+    return {"chunks": chunks, "trace": {**trace, "full_cv": full_pids}}
 
 def generate_answer_multi_node(state: AgentState) -> AgentState:
     # reparto de contexto equitativo por persona
     pids = state.get("persona_ids", [])
     by_pid = {}
-    for c in state.get("chunks", []):
-        pid = str(c["meta"].get("person_id"))
-        by_pid.setdefault(pid, []).append(c)
-    k_each = max(1, TOPK_CONTEXT // max(1, len(pids) or 1))
+    for c in state.get("chunks", ()):
+        by_pid.setdefault(c.person_id, []).append(c)
     chosen = []
-    for pid in pids:
-        chosen += by_pid.get(pid, [])[:k_each]
-    if len(chosen) < TOPK_CONTEXT:
-        remainder = [c for pid in pids for c in by_pid.get(pid, [])[k_each:]]
-        chosen += remainder[:(TOPK_CONTEXT - len(chosen))]
+    if any(c.section == SUMMARY_SECTION for c in state.get("chunks", ())):
+        # resumen por persona + pocos chunks específicos de la query: prompt acotado
+        for pid in pids:
+            group = by_pid.get(pid, [])
+            summary = [c for c in group if c.section == SUMMARY_SECTION]
+            rest = [c for c in group if c.section != SUMMARY_SECTION]
+            chosen += summary[:1] + rest[:MULTI_CHUNKS_PER_PERSON]
+    else:
+        k_each = max(1, TOPK_CONTEXT // max(1, len(pids) or 1))
+        for pid in pids:
+            chosen += by_pid.get(pid, [])[:k_each]
+        if len(chosen) < TOPK_CONTEXT:
+            remainder = [c for pid in pids for c in by_pid.get(pid, [])[k_each:]]
+            chosen += remainder[:(TOPK_CONTEXT - len(chosen))]
     context = build_context(chosen)
     prompt = (
         f"Contexto (múltiples personas):\n{context}\n\n"
         f"Pregunta: {state['query']}\n"
         f"Responde en secciones por persona (## Nombre/ID), con bullets y citas [#]."
     )
-    answer = llm_chat(SYSTEM, prompt)
-    return {**state, "answer": answer}
+    return budgeted_answer(state, prompt, chosen)
 
 # Single
 def resolve_people_node(state: AgentState) -> AgentState:
@@ -342,12 +1210,12 @@ def resolve_people_node(state: AgentState) -> AgentState:
 
     # Si venimos del 2º paso de desambiguación y ya hay candidatos, no re-buscar.
     if choice and state.get("candidates"):
-        return state
+        return {}
 
     # Caso normal: consultar índice de personas con el query actual
     q = state["query"]
     session_id = state.get("session_id", "default")
-    last_persona = MEM.last_persona_by_session.get(session_id)
+    last_persona = MEM.last_persona(session_id)
     
     # Reutilizar persona activa si el LLM lo marcó
     if state.get("reuse_last_persona") and last_persona:
@@ -357,21 +1225,49 @@ def resolve_people_node(state: AgentState) -> AgentState:
             "score": 1.0,
             "source_name": "[coref-llm]"
         }]
-        return {**state, "candidates": cands}
+        return {"candidates": cands}
+
+    # Nombre ya resuelto antes en esta sesión → sin lookup ni repregunta
+    names = state.get("trace", {}).get("parsed_names") or []
+    cached_pid = ALIASES.get(session_id, names[0]) if len(names) == 1 else None
+    if cached_pid:
+        cands = [{
+            "persona_id": cached_pid,
+            "name": names[0],
+            "score": 1.0,
+            "source_name": "[alias-cache]"
+        }]
+        return {"candidates": cands, "trace": {"alias_cache_hit": names[0]}}
+
+    # La búsqueda ya corrió en paralelo con la coref (SPECULATIVE_COREF)
+    speculative = (state.get("speculation") or {}).get("people")
+    if speculative is not None:
+        return {"candidates": speculative, "trace": {"spec_people_used": True}}
 
     # Caso normal: buscar con el query actual
-    candidates = pinecone_query_people([q])
+    candidates = pinecone_query_people([q], session_namespaces(state))
     
-    return {**state, "candidates": candidates}
+    return {"candidates": candidates}
+
+def candidate_decision(cands: List[Dict[str, Any]], ambig_delta: float = AMBIG_DELTA, min_score: float = MIN_SCORE) -> str:
+    """Decisión sobre los candidatos (sin elección del usuario): "no_match" | "ambiguous_top2" | "clear_top1"."""
+    if not cands or cands[0]["score"] < min_score:
+        return "no_match"
+    if len(cands) > 1 and (cands[0]["score"] - cands[1]["score"]) < ambig_delta:
+        return "ambiguous_top2"
+    return "clear_top1"
 
 def decide_disambiguation_node(state: AgentState) -> AgentState:
     cands = state.get("candidates", [])
-    trace = {**state.get("trace", {})}
+    trace: Dict[str, Any] = {}
+    session_id = state.get("session_id", "default")
+    mentions = state.get("trace", {}).get("parsed_names") or []
+    outcome = candidate_decision(cands, AMBIG_DELTA, MIN_SCORE)
 
     # 1) no match confiable
-    if not cands or cands[0]["score"] < MIN_SCORE:
+    if outcome == "no_match":
         trace["decision"] = "no_match"
-        return {**state, "persona_ids": [], "trace": trace}
+        return {"persona_ids": [], "trace": trace}
 
     # 2) si el usuario ya eligió (segunda vuelta)
     choice = (state.get("disambiguation_choice") or "").strip()
@@ -391,23 +1287,28 @@ def decide_disambiguation_node(state: AgentState) -> AgentState:
         decided = by_idx or by_id or by_name
         if decided:
             trace["decision"] = "user_selected"
-            return {**state, "persona_ids": [decided], "trace": trace}
+            ALIASES.remember(session_id, ALIASES.pop_pending(session_id) + mentions, decided)
+            return {"persona_ids": [decided], "trace": trace}
         # Si el choice no matchea, seguimos a repregunta otra vez
         trace["bad_choice"] = choice
 
     # 3) detectar ambigüedad top2
-    if len(cands) > 1 and (cands[0]["score"] - cands[1]["score"]) < AMBIG_DELTA:
+    if outcome == "ambiguous_top2":
         trace["decision"] = "ambiguous_top2"
-        return {**state, "trace": trace}
+        if mentions:
+            ALIASES.set_pending(session_id, mentions)
+        return {"trace": trace}
 
     # 4) caso claro
     trace["decision"] = "clear_top1"
-    return {**state, "persona_ids": [cands[0]["persona_id"]], "trace": trace}
+    if len(mentions) == 1:
+        ALIASES.remember(session_id, mentions, cands[0]["persona_id"])
+    return {"persona_ids": [cands[0]["persona_id"]], "trace": trace}
 
 def ask_user_short_disambiguation_node(state: AgentState) -> AgentState:
     cands = state.get("candidates", [])[:3]  # top 2–3
     if not cands:
-        return {**state, "answer": "No pude identificar a la persona.", "trace": {**state.get("trace", {}), "need_user_input": False}}
+        return {"answer": "No pude identificar a la persona.", "trace": {"need_user_input": False}}
 
     lines = ["Encontré personas con nombres similares. Indicá la opción (1/2/3) o responde con el nombre exacto:"]
     for i, c in enumerate(cands, 1):
@@ -416,8 +1317,29 @@ def ask_user_short_disambiguation_node(state: AgentState) -> AgentState:
     lines.append("Tu elección:")
     question = "\n".join(lines)
 
-    trace = {**state.get("trace", {}), "need_user_input": True, "disambiguation_options": [c["persona_id"] for c in cands]}
-    return {**state, "answer": question, "trace": trace}
+    trace = {"need_user_input": True, "disambiguation_options": [c["persona_id"] for c in cands]}
+    return {"answer": question, "trace": trace}
+
+def route_after_ask(state: AgentState) -> str:
+    # con checkpointer el grafo se pausa esperando la elección; sin opciones, termina
+    return "await_disambiguation_choice" if state.get("trace", {}).get("need_user_input") else END
+
+def await_disambiguation_choice_node(state: AgentState) -> AgentState:
+    """
+    Pausa el grafo (interrupt) hasta que el usuario elige una opción.
+    Al reanudar con Command(resume=choice) se sigue en decide_disambiguation
+    con los candidatos del checkpoint, sin re-clasificar ni re-buscar.
+    """
+    choice = interrupt({
+        "question": state.get("answer", ""),
+        "options": state.get("trace", {}).get("disambiguation_options", []),
+    })
+    # el presupuesto vuelve a correr desde la respuesta del usuario
+    return {
+        "disambiguation_choice": str(choice).strip(),
+        "deadline": turn_deadline(state.get("budget_ms", 0)),
+        "trace": {"need_user_input": False, "resumed": True},
+    }
 
 def route_after_decision(state: AgentState) -> str:
     tr = state.get("trace", {})
@@ -425,28 +1347,86 @@ def route_after_decision(state: AgentState) -> str:
         return "ask_user_short_disambiguation"  # o manejar de otra forma (p.ej. pedir nombre)
     if tr.get("decision") == "ambiguous_top2":
         return "ask_user_short_disambiguation"
-    # user_selected o clear_top1 → seguimos al retriever
+    # user_selected o clear_top1 → fast path factual o retriever
+    if profile_fastpath_intents(state):
+        return "answer_from_profile"
+    # presupuesto agotado: lo que el perfil responda, aunque sea parte de la pregunta
+    if budget_left_ms(state) < DEGRADE_NO_LLM_MS and profile_fastpath_intents(state, partial=True):
+        return "answer_from_profile"
     return "retrieve_cv_chunks"
 
+def answer_from_profile_node(state: AgentState) -> AgentState:
+    """Responde preguntas factuales desde el perfil estructurado, sin RAG ni LLM."""
+    intents = profile_fastpath_intents(state)
+    trace: Dict[str, Any] = {}
+    if not intents:
+        # llegó por presupuesto agotado (route_after_decision)
+        intents = profile_fastpath_intents(state, partial=True)
+        trace = degrade(state, "profile_partial")
+    profile = get_profile_store().get(state["persona_ids"][0]) or {}
+    answer = render_profile_answer(profile, intents, state["query"])
+    return {"answer": answer, "trace": {**trace, "profile_fastpath": intents}}
+
 def retrieve_cv_chunks_node(state: AgentState) -> AgentState:
     persona_ids = state.get("persona_ids", [])
     if not persona_ids:
-        return {**state, "chunks": []}
-    chunks = pinecone_query_cv(state["query"], persona_ids)
-    return {**state, "chunks": chunks}
+        return {"chunks": ()}
+    speculative = (state.get("speculation") or {}).get("cv")
+    if speculative and persona_ids == [speculative["persona_id"]]:
+        # retrieval adelantado durante la coref; se limpia para no duplicar chunks en el checkpoint
+        return {"chunks": speculative["chunks"], "speculation": {}, "trace": {"full_cv": speculative["full_cv"], "spec_cv_used": True}}
+    top_k = None
+    if budget_left_ms(state) < DEGRADE_RETRIEVAL_MS:
+        # poco margen: una sola query y menos candidatos (menos red y menos rerank)
+        queries, top_k = [state["query"]], DEGRADED_TOPK_RETRIEVE
+    else:
+        queries = cv_queries(state["query"], persona_ids)
+    chunks, full_pids = retrieve_cv_context(state["query"], persona_ids, session_namespaces(state), queries, top_k)
+    # con los CVs completos no hubo búsqueda que achicar
+    trace: Dict[str, Any] = degrade(state, "retrieval_shrunk") if top_k and len(full_pids) < len(persona_ids) else {}
+    trace["full_cv"] = full_pids
+    if len(queries) > 1:
+        trace["multi_query"] = queries
+    return {"chunks": chunks, "trace": trace}
+
+def rerank_chunks_node(state: AgentState) -> AgentState:
+    """Reordena los chunks recuperados contra la query (CPU, con presupuesto de latencia)."""
+    chunks = state.get("chunks") or ()
+    if len(chunks) < 2:
+        return {}
+    # el rerank no usa el tiempo que necesita la respuesta
+    budget_ms = min(RERANK_BUDGET_MS, budget_left_ms(state) - DEGRADE_FAST_MODEL_MS)
+    if budget_ms <= 0:
+        return {"trace": degrade(state, "rerank_skipped")}
+    order, info = rerank_order(get_reranker(), state["query"], [c.text for c in chunks], [c.score for c in chunks], budget_ms)
+    # cuántos chunks del top de contexto cambiaron respecto del orden denso
+    info["changed_in_top"] = len(set(order[:TOPK_CONTEXT].tolist()) - set(range(TOPK_CONTEXT)))
+    trace: Dict[str, Any] = degrade(state, "rerank_cut") if budget_ms < RERANK_BUDGET_MS else {}
+    return {"chunks": [chunks[i] for i in order], "trace": {**trace, "rerank": info}}
+
+def expand_windows_node(state: AgentState) -> AgentState:
+    """Con índice por oraciones, cada hit se expande a su ventana de contexto."""
+    chunks = list(state.get("chunks") or ())
+    if not any(c.position >= 0 for c in chunks):
+        return {}
+    windows = expand_windows(chunks)
+    return {"chunks": windows, "trace": {"windows": len(windows), "window_hits": sum(c.position >= 0 for c in chunks)}}
 
 def load_memory_node(state: AgentState) -> AgentState:
     session_id = state.get("session_id", "default")
     persona_ids = state.get("persona_ids", [])
     if not persona_ids:
-        return {**state, "history": []}
+        return {"history": []}
     persona_id = persona_ids[0]
     MEM.reset_if_person_changed(session_id, persona_id)
     history = MEM.get(session_id, persona_id)
-    return {**state, "history": history}
+    if MEMORY_MODE == "summary":
+        # el tope de tokens es del modo resumen; "window" deja los turnos de la ventana completos
+        history = fit_history(MEM.get_summary(session_id, persona_id), history)
+    return {"history": history, "trace": {"history_tokens": sum(estimate_tokens(h["content"]) for h in history)}}
 
 def generate_answer_node(state: AgentState) -> AgentState:
-    chunks = (state.get("chunks") or [])[:TOPK_CONTEXT]
+    chunks = (state.get("chunks") or ())[:TOPK_CONTEXT]
     context = build_context(chunks)
     history_txt = render_history(state.get("history", []))
     user_q = state["query"]
@@ -456,21 +1436,37 @@ def generate_answer_node(state: AgentState) -> AgentState:
         f"Pregunta actual: {user_q}\n"
         f"Responde con citas [#] y lista final de (id=...)."
     )
-    answer = llm_chat(SYSTEM, prompt)
-    return {**state, "answer": answer}
+    return budgeted_answer(state, prompt, list(chunks))
 
 def save_memory_node(state: AgentState) -> AgentState:
     session_id = state.get("session_id", "default")
     persona_ids = state.get("persona_ids", [])
     if persona_ids and state.get("answer"):
         MEM.append(session_id, persona_ids[0], state["query"], state["answer"])
-    return state
+        if MEMORY_MODE == "summary":
+            SUMMARIZER.schedule(session_id, persona_ids[0])
+    return {}
 
 # ========= GRAFO =========
-def build_app():
+def build_checkpointer(kind: str = CHECKPOINTER):
+    """Checkpointer por sesión: "memory", "sqlite" (sobrevive reinicios) o "none"."""
+    if kind == "memory":
+        return InMemorySaver()
+    if kind == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        directory = os.path.dirname(CHECKPOINT_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False)
+        return SqliteSaver(conn)
+    return None
+
+def build_app(checkpointer=None):
     g = StateGraph(AgentState)
 
     # --- Nodos nuevos (router + multi) ---
+    g.add_node("resolve_roster", resolve_roster_node)
+    g.add_node("unknown_person", unknown_person_node)
     g.add_node("classify_mode", classify_mode_node)
     g.add_node("resolve_people_multi", resolve_people_multi_node)
     g.add_node("retrieve_cv_chunks_multi", retrieve_cv_chunks_multi_node)
@@ -481,13 +1477,30 @@ def build_app():
     g.add_node("resolve_people", resolve_people_node)
     g.add_node("decide_disambiguation", decide_disambiguation_node)
     g.add_node("ask_user_short_disambiguation", ask_user_short_disambiguation_node)
+    if checkpointer is not None:
+        g.add_node("await_disambiguation_choice", await_disambiguation_choice_node)
+    g.add_node("answer_from_profile", answer_from_profile_node)
     g.add_node("retrieve_cv_chunks", retrieve_cv_chunks_node)
+    g.add_node("rerank_chunks", rerank_chunks_node)
+    g.add_node("rerank_chunks_multi", rerank_chunks_node)
+    g.add_node("expand_windows", expand_windows_node)
+    g.add_node("expand_windows_multi", expand_windows_node)
     g.add_node("load_memory", load_memory_node)
     g.add_node("generate_answer", generate_answer_node)
     g.add_node("save_memory", save_memory_node)
 
-    # Entry: router de modo
-    g.set_entry_point("classify_mode")
+    # Entry: nombres contra el roster local (sin LLM); si no alcanza, router de modo
+    g.set_entry_point("resolve_roster")
+    g.add_conditional_edges(
+        "resolve_roster",
+        route_after_roster,
+        {
+            "resolve_people_multi": "resolve_people_multi",
+            "decide_disambiguation": "decide_disambiguation",
+            "unknown_person": "unknown_person",
+            "classify_mode": "classify_mode",
+        },
+    )
 
     # Router condicional a multi o single
     g.add_conditional_edges(
@@ -496,12 +1509,16 @@ def build_app():
         {
             "resolve_people_multi": "resolve_people_multi",   # multi (stateless)
             "decide_coref_with_llm": "decide_coref_with_llm", # single (stateful)
+            "unknown_person": "unknown_person",               # nombres fuera del roster
         },
     )
+    g.add_edge("unknown_person", END)
 
     # --- Camino MULTI (stateless) ---
     g.add_edge("resolve_people_multi", "retrieve_cv_chunks_multi")
-    g.add_edge("retrieve_cv_chunks_multi", "generate_answer_multi")
+    g.add_edge("retrieve_cv_chunks_multi", "rerank_chunks_multi")
+    g.add_edge("rerank_chunks_multi", "expand_windows_multi")
+    g.add_edge("expand_windows_multi", "generate_answer_multi")
     g.add_edge("generate_answer_multi", END)
 
     # --- Camino SINGLE (stateful) — tu flujo actual ---
@@ -513,17 +1530,30 @@ def build_app():
         route_after_decision,
         {
             "ask_user_short_disambiguation": "ask_user_short_disambiguation",
+            "answer_from_profile": "answer_from_profile",
             "retrieve_cv_chunks": "retrieve_cv_chunks",
         },
     )
 
-    g.add_edge("ask_user_short_disambiguation", END)
-    g.add_edge("retrieve_cv_chunks", "load_memory")
+    if checkpointer is not None:
+        # la respuesta a la repregunta reanuda acá, no desde classify_mode
+        g.add_conditional_edges(
+            "ask_user_short_disambiguation",
+            route_after_ask,
+            {"await_disambiguation_choice": "await_disambiguation_choice", END: END},
+        )
+        g.add_edge("await_disambiguation_choice", "decide_disambiguation")
+    else:
+        g.add_edge("ask_user_short_disambiguation", END)
+    g.add_edge("answer_from_profile", "save_memory")
+    g.add_edge("retrieve_cv_chunks", "rerank_chunks")
+    g.add_edge("rerank_chunks", "expand_windows")
+    g.add_edge("expand_windows", "load_memory")
     g.add_edge("load_memory", "generate_answer")
     g.add_edge("generate_answer", "save_memory")
     g.add_edge("save_memory", END)
 
-    app = g.compile()
+    app = g.compile(checkpointer=checkpointer)
     return app
 
 app = None
@@ -532,9 +1562,127 @@ app = None
 def init_app():
     global app
     if app is None:
-        app = build_app()
+        app = build_app(checkpointer=build_checkpointer())
     return app
 
+# ========= TURNOS (thread_id = session_id) =========
+# Campos por turno: se reinician en cada input nuevo para no arrastrar
+# valores del turno anterior guardados en el checkpoint.
+TURN_DEFAULTS: Dict[str, Any] = {
+    "candidates": [],
+    "persona_ids": [],
+    "chunks": (),
+    "history": [],
+    "answer": "",
+    "disambiguation_choice": "",
+    "reuse_last_persona": False,
+    "speculation": {},
+}
+
+def session_config(session_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": session_id}}
+
+def new_turn_input(session_id: str, query: str, budget_ms: int = TURN_BUDGET_MS, **extra: Any) -> Dict[str, Any]:
+    """
+    Payload de un turno nuevo (extra: disambiguation_choice, candidates, ...).
+    budget_ms es el SLO de latencia del turno: el plazo corre desde acá.
+    """
+    return {
+        **TURN_DEFAULTS,
+        "session_id": session_id,
+        "query": query,
+        "budget_ms": budget_ms,
+        "deadline": turn_deadline(budget_ms),
+        "trace": {NEW_TURN: True},
+        **extra,
+    }
+
+def recorded_turn(session_id: str, payload: Dict[str, Any] | Command, entry: str = "invoke", **meta: Any):
+    """
+    Scope de grabación de un turno (TRAFFIC_RECORD, ver replay.py): las llamadas
+    a Groq y al índice vectorial dentro del turno quedan asociadas a él.
+    """
+    if isinstance(payload, Command):
+        meta["resume"] = True
+        return get_traffic_recorder().turn(session_id, entry, payload.resume, **meta)
+    return get_traffic_recorder().turn(session_id, entry, payload, **meta)
+
+def invoke_turn(session_id: str, query: str, **extra: Any) -> AgentState:
+    """Corre un turno completo del grafo para la sesión."""
+    payload = new_turn_input(session_id, query, **extra)
+    with recorded_turn(session_id, payload) as record:
+        state = init_app().invoke(payload, config=session_config(session_id))
+        record["answer"] = state.get("answer", "")
+    return state
+
+def is_awaiting_choice(session_id: str) -> bool:
+    """True si la sesión quedó pausada en await_disambiguation_choice."""
+    graph = init_app()
+    if graph.checkpointer is None:
+        return False
+    return "await_disambiguation_choice" in graph.get_state(session_config(session_id)).next
+
+def turn_payload(
+    session_id: str,
+    query: str = "",
+    choice: str | None = None,
+    candidates: List[Dict[str, Any]] | None = None,
+    tenants: List[str] | None = None,
+    budget_ms: int | None = None,
+) -> Dict[str, Any] | Command:
+    """
+    Input del grafo para un turno: pregunta nueva o, si viene choice, la
+    respuesta a la repregunta (Command(resume) si la sesión quedó pausada;
+    si no, re-invocación con los candidatos del cliente). tenants fija los
+    pools de la sesión; si no viene, quedan los del checkpoint (o TENANT).
+    budget_ms: SLO de latencia del turno (default TURN_BUDGET_MS); al reanudar
+    una sesión pausada rige el del turno que repreguntó.
+    """
+    extra: Dict[str, Any] = {"tenants": list(tenants)} if tenants else {}
+    if budget_ms is not None:
+        extra["budget_ms"] = budget_ms
+    if choice is None:
+        return new_turn_input(session_id, query, **extra)
+    if is_awaiting_choice(session_id):
+        return Command(resume=choice)
+    return new_turn_input(session_id, choice, disambiguation_choice=choice, candidates=candidates or [], **extra)
+
+def continue_disambiguation(session_id: str, choice: str, candidates: List[Dict[str, Any]] | None = None) -> AgentState:
+    """
+    Respuesta del usuario a la repregunta: reanuda el grafo pausado si hay
+    checkpointer; si no, re-invoca desde cero con los candidatos del cliente.
+    """
+    payload = turn_payload(session_id, choice=choice, candidates=candidates)
+    with recorded_turn(session_id, payload) as record:
+        state = init_app().invoke(payload, config=session_config(session_id))
+        record["answer"] = state.get("answer", "")
+    return state
+
+def stream_turn(session_id: str, payload: Dict[str, Any] | Command, stream_tokens: bool = False) -> Iterator[tuple]:
+    """
+    Corre un turno con graph.stream y va emitiendo eventos:
+    ("node", nombre, ms) al terminar cada nodo, ("token", delta) de la respuesta
+    si stream_tokens, y al final ("state", estado final del turno).
+    """
+    config = session_config(session_id)
+    config["configurable"]["stream_tokens"] = stream_tokens
+    final: Dict[str, Any] = {}
+    last = time.perf_counter()
+    with recorded_turn(session_id, payload, "stream", stream_tokens=stream_tokens) as record:
+        for mode, data in init_app().stream(payload, config=config, stream_mode=["updates", "custom", "values"]):
+            if mode == "updates":
+                now = time.perf_counter()
+                for node in data:
+                    if not node.startswith("__"):  # __interrupt__
+                        yield ("node", node, round((now - last) * 1000, 2))
+                last = now
+            elif mode == "custom" and "token" in data:
+                yield ("token", data["token"])
+            elif mode == "values":
+                final = data
+        record["answer"] = final.get("answer", "")
+    yield ("state", final)
+
 
 if __name__ == "__main__":
     pass
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, block_rows: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid (inner product) for each row."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for s in range(0, len(vectors), block_rows):
+        out[s:s + block_rows] = np.argmax(np.asarray(vectors[s:s + block_rows], dtype=np.float32) @ centroids.T, axis=1)
+    return out
+
+def train_centroids(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    sample_size: int = 50_000,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Spherical k-means (cosine) over a random sample of the rows.
+
+    Args:
+        vectors (np.ndarray): (n, dim) L2-normalized rows (may be a memmap).
+        nlist (int): Number of inverted lists (clusters).
+        iterations (int): Lloyd iterations.
+        sample_size (int): Max rows used for training.
+        seed (int): Random seed (training is deterministic for a given corpus).
+
+    Returns:
+        np.ndarray: (nlist, dim) float32 L2-normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_rows = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    nlist = max(1, min(nlist, len(sample)))
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        # clusters vacíos: se re-siembran con filas al azar
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+def build_lists(vectors: np.ndarray, centroids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Assigns every row to its nearest centroid and builds the inverted lists.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (order, bounds) where the rows of list l
+        are order[bounds[l]:bounds[l + 1]] (ascending row ids inside each list).
+    """
+    assign = _nearest(vectors, centroids)
+    order = np.argsort(assign, kind="stable").astype(np.int64)
+    bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64)
+    return order, bounds
+
+def probe(centroids: np.ndarray, query: np.ndarray, nprobe: int) -> np.ndarray:
+    """Ids of the nprobe lists whose centroids are most similar to the query."""
+    scores = centroids @ query
+    nprobe = min(nprobe, len(centroids))
+    return np.argpartition(-scores, nprobe - 1)[:nprobe]
+
+def default_nlist(n: int) -> int:
+    """~4·sqrt(n) lists: a few hundred rows per list."""
+    return max(1, int(4 * np.sqrt(n)))
@@ -0,0 +1,190 @@
+"""
+Consultas batch sobre CVs: muchas preguntas estándar contra muchas personas,
+sin pasar por el grafo conversacional (sin memoria, coref ni desambiguación).
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import src.agent as agent
+from src.agent import Chunk
+from src.localStore import get_document_store, get_profile_store
+from src.rateLimiter import RateLimiter
+from src.textUtils import fold_text
+from src.config.settings import BATCH_CONCURRENCY
+from src.config.settings import BATCH_REQUESTS_PER_MINUTE
+
+
+def item_key(persona: str, question: str) -> str:
+    return f"{fold_text(persona)}\t{fold_text(question)}"
+
+def read_items(path: str) -> List[Dict[str, str]]:
+    """Lee un JSONL de {"persona": ..., "question": ...}."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                items.append({"persona": str(row["persona"]), "question": str(row["question"])})
+    return items
+
+def grid_items(questions: Iterable[str], personas: Optional[Iterable[str]] = None) -> List[Dict[str, str]]:
+    """Preguntas × personas; por defecto todas las personas del almacén local."""
+    if personas is None:
+        personas = [r["person_id"] for r in get_profile_store().all()] or \
+                   [r["person_id"] for r in get_document_store().all()]
+    return [{"persona": p, "question": q} for p in personas for q in questions]
+
+def read_done_keys(output_path: str) -> set:
+    """Claves ya respondidas en una corrida anterior (para reanudar)."""
+    done: set = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # línea truncada por una corrida interrumpida
+            if not row.get("error"):
+                done.add(item_key(row["persona"], row["question"]))
+    return done
+
+def resolve_persona(persona: str) -> Tuple[Optional[str], str]:
+    """
+    persona_id y nombre para un persona_id o nombre: primero el almacén local,
+    después el índice de personas.
+    """
+    for store in (get_profile_store(), get_document_store()):
+        record = store.get(persona)
+        if record:
+            return record["person_id"], f"{record.get('name', '')} {record.get('lastname', '')}".strip()
+
+    target = fold_text(persona)
+    for record in get_profile_store().all() or get_document_store().all():
+        full_name = f"{record.get('name', '')} {record.get('lastname', '')}".strip()
+        if target and target in fold_text(full_name):
+            return record["person_id"], full_name
+
+    hits = agent.pinecone_query_people([persona])[:1]
+    if hits and hits[0]["score"] >= agent.MIN_SCORE:
+        return hits[0]["persona_id"], hits[0]["name"]
+    return None, persona
+
+
+class BatchRunner:
+    """
+    Corre preguntas agrupadas por persona: la persona se resuelve una sola vez,
+    el CV completo (si entra en el presupuesto) se reutiliza para todas sus
+    preguntas y las llamadas al LLM corren en paralelo hasta `concurrency`,
+    con un tope propio de requests por minuto además del rate limiter global
+    (prioridad "batch": cede cuota a los turnos interactivos).
+    """
+    def __init__(
+        self,
+        concurrency: int = BATCH_CONCURRENCY,
+        requests_per_minute: float = BATCH_REQUESTS_PER_MINUTE,
+    ):
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute=0, store="memory", reserve=0.0)
+
+    def _context_for(self, question: str, persona_id: str, full: Optional[Chunk]) -> Tuple[List[Chunk], str]:
+        if full:
+            return [full], "full_cv"
+        return agent.pinecone_query_cv(question, [persona_id])[:agent.TOPK_CONTEXT], "retrieval"
+
+    def answer(self, item: Dict[str, str], persona_id: Optional[str], name: str, full: Optional[Chunk]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        row: Dict[str, Any] = {**item, "persona_id": persona_id, "name": name}
+        try:
+            if not persona_id:
+                raise ValueError(f"persona not found: {item['persona']}")
+
+            intents = agent.match_profile_intents(item["question"], [name]) if agent.PROFILE_FASTPATH_ENABLED else []
+            profile = get_profile_store().get(persona_id) if intents else None
+            if profile and all(profile.get(i) for i in intents):
+                row.update(answer=agent.render_profile_answer(profile, intents, item["question"]), source="profile", chunk_ids=[])
+            else:
+                chunks, source = self._context_for(item["question"], persona_id, full)
+                prompt = (
+                    f"Persona: {name}\n"
+                    f"Contexto:\n{agent.build_context(chunks)}\n\n"
+                    f"Pregunta: {item['question']}\n"
+                    f"Responde con citas [#] y lista final de (id=...)."
+                )
+                self.limiter.acquire("batch")
+                row.update(
+                    answer=agent.llm_chat(agent.SYSTEM, prompt, priority="batch"),
+                    source=source,
+                    chunk_ids=[c.chunk_id for c in chunks],
+                )
+            row["error"] = None
+        except Exception as e:
+            row.update(answer="", error=str(e))
+        row["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return row
+
+    def run(
+        self,
+        items: List[Dict[str, str]],
+        output_path: str,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Responde los items pendientes y los agrega a output_path (JSONL) a medida
+        que terminan; los ya respondidos en output_path se saltean (resume).
+        """
+        done = read_done_keys(output_path)
+        pending = [it for it in items if item_key(it["persona"], it["question"]) not in done]
+
+        by_persona: Dict[str, List[Dict[str, str]]] = {}
+        for it in pending:
+            by_persona.setdefault(it["persona"], []).append(it)
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        stats = {"skipped": len(items) - len(pending), "ok": 0, "errors": 0}
+        write_lock = threading.Lock()
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = []
+            for persona, group in by_persona.items():
+                # resolución y contexto de CV completo: una vez por persona
+                persona_id, name = resolve_persona(persona)
+                full = agent.full_cv_chunk(persona_id) if persona_id else None
+                futures += [pool.submit(self.answer, it, persona_id, name, full) for it in group]
+
+            for future in as_completed(futures):
+                row = future.result()
+                with write_lock:
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    out.flush()
+                stats["errors" if row["error"] else "ok"] += 1
+                if on_result:
+                    on_result(row)
+        return stats
+
+
+def jsonl_to_parquet(jsonl_path: str, parquet_path: str) -> int:
+    """
+    Convierte los resultados JSONL a Parquet (requiere pyarrow). Los items
+    reintentados al reanudar quedan una sola vez (gana la última fila).
+    """
+    try:
+        import pyarrow as pa  # type: ignore[import-not-found]
+        import pyarrow.parquet as pq  # type: ignore[import-not-found]
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow: uv add pyarrow") from e
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                rows[item_key(row["persona"], row["question"])] = row
+    pq.write_table(pa.Table.from_pylist(list(rows.values())), parquet_path)
+    return len(rows)
@@ -25,8 +25,157 @@ PINECONE_EMBEDDING_MODEL = "llama-text-embed-v2"
 PINECONE_NAMESPACE = "ceia-nlp-tp3-namespace"
 PINECONE_TOPK_SEARCH = 10
 
+# Tenants: cada empresa cliente tiene su propio shard (namespace) en los dos índices,
+# elegido por sesión. "" = PINECONE_NAMESPACE, el pool único de siempre.
+TENANT = os.getenv("TENANT", "")
+TENANT_SEARCH_WORKERS = 8           # shards consultados en paralelo en búsquedas entre pools (scatter-gather)
+SEARCH_CACHE_SIZE = 256             # resultados de búsqueda cacheados por shard (0 = sin caché)
+SEARCH_CACHE_TTL_SECONDS = 300      # la ingesta desde otro proceso se ve a lo sumo después de este tiempo
+
+# Backend vectorial: "pinecone" (índices integrados) | "local" (índice en proceso, src/localVectorStore.py)
+VECTOR_BACKEND = "pinecone"
+# Embeddings explícitos (src/embeddingService.py): "pinecone" (inference) | "local" (sentence-transformers) | "hashing" (determinístico, offline)
+EMBEDDING_PROVIDER = "pinecone"
+EMBEDDING_MODEL = PINECONE_EMBEDDING_MODEL
+EMBEDDING_DIM = 1024
+EMBEDDING_BATCH_SIZE = 96           # máximo de textos por llamada al proveedor (y por upsert)
+# Índice local: vectores en archivos memory-mapped; el scan usa la versión cuantizada
+# ("float32" | "int8" | "binary") y los top_k * LOCAL_RERANK_FACTOR candidatos se re-rankean en float32
+LOCAL_VECTOR_QUANTIZATION = "int8"
+LOCAL_RERANK_FACTOR = 4
+LOCAL_RERANK_FACTOR_BINARY = 32     # los códigos binarios ordenan peor: más candidatos al re-rank
+LOCAL_SCAN_BLOCK_ROWS = 8192
+# ANN en el índice local: "ivf" (listas invertidas sobre k-means) | "none" (scan exhaustivo)
+LOCAL_ANN = "ivf"
+LOCAL_IVF_MIN_ROWS = 20000          # por debajo, el scan exhaustivo es igual de rápido
+LOCAL_IVF_NPROBE = 16               # listas escaneadas por query (recall vs latencia)
+LOCAL_IVF_RETRAIN_GROWTH = 2.0      # se re-entrenan los centroides si el corpus duplica el tamaño de entrenamiento
+LOCAL_DELTA_MAX_ROWS = 5000         # inserts incrementales antes de compactar el segmento base
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_LLM_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 GROQ_MAX_COMPLETION_TOKENS = 1024
+PROFILE_EXTRACTION_MAX_TOKENS = 4096  # campos estructurados del CV en load.py (CVs largos)
 GROQ_TEMPERATURE = 1.0
-GROQ_STREAM = True
\ No newline at end of file
+GROQ_STREAM = True
+
+# Almacén local por persona (CV completo normalizado, cargado en load.py)
+LOCAL_STORE_DIR = "store"
+DOCUMENT_STORE_PATH = os.path.join(LOCAL_STORE_DIR, "documents.json")
+PROFILE_STORE_PATH = os.path.join(LOCAL_STORE_DIR, "profiles.json")
+EMBEDDING_CACHE_PATH = os.path.join(LOCAL_STORE_DIR, "embeddings.sqlite")
+LOCAL_VECTOR_DIR = os.path.join(LOCAL_STORE_DIR, "vectors")
+
+# Contexto directo con el CV completo: si el CV de una persona entra en el
+# presupuesto de tokens, se usa entero y se evita la búsqueda vectorial.
+FULLCV_ENABLED = True
+FULLCV_TOKEN_BUDGET = 1000
+
+# Checkpointing del grafo por sesión (thread_id = session_id): "sqlite" | "memory" | "none".
+# Permite reanudar la desambiguación en decide_disambiguation en lugar de re-ejecutar todo.
+CHECKPOINTER = "sqlite"
+CHECKPOINT_DB_PATH = os.path.join(LOCAL_STORE_DIR, "checkpoints.sqlite")
+
+
+# Resolución de nombres contra el roster local (perfiles cargados) antes de llamar al LLM
+ROSTER_ENABLED = True
+ROSTER_MIN_SIMILARITY = 88          # rapidfuzz ratio mínimo por token de nombre (tolera typos)
+DEFAULT_PERSONA = os.getenv("DEFAULT_PERSONA", "")  # persona_id o nombre para preguntas sin nombre ("" = ninguno)
+
+# Coref especulativa: búsqueda de personas y retrieval del CV previo en paralelo con el yes/no del LLM
+SPECULATIVE_COREF = os.getenv("SPECULATIVE_COREF", "0") == "1"
+
+# Reranking en CPU entre el retrieval y la generación: "none" | "lexical" (BM25 + score denso) | "cross-encoder"
+RERANKER = os.getenv("RERANKER", "lexical")
+RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # multilingüe, solo para "cross-encoder"
+RERANK_BATCH_SIZE = 16
+RERANK_BUDGET_MS = 150              # pasado el presupuesto, el resto de los candidatos queda en orden denso
+RERANK_DENSE_WEIGHT = 0.3           # peso del score denso en el reranker léxico
+
+# Multi-query en el retrieval de CVs: "none" | "rules" (reescrituras por reglas, sin LLM) | "llm".
+# Las sub-queries corren en paralelo con el mismo filtro por persona y se fusionan por RRF
+MULTI_QUERY = os.getenv("MULTI_QUERY", "none")
+MULTI_QUERY_MAX = 4                 # queries por turno, la original incluida
+MULTI_QUERY_WORKERS = 8
+RRF_K = 60                          # constante de reciprocal rank fusion
+
+# Presupuesto de latencia por turno (budget_ms en el payload; 0 = sin límite). Cuando queda
+# poco tiempo el grafo degrada en lugar de esperar: cada umbral es el tiempo restante por
+# debajo del cual se aplica esa degradación.
+TURN_BUDGET_MS = int(os.getenv("TURN_BUDGET_MS", 0))
+DEGRADE_SKIP_LLM_MS = 1500          # sin coref ni extracción de nombres por LLM: sigue la persona previa
+DEGRADE_RETRIEVAL_MS = 1200         # una sola query y DEGRADED_TOPK_RETRIEVE candidatos
+DEGRADED_TOPK_RETRIEVE = 8
+DEGRADE_FAST_MODEL_MS = 1000        # la respuesta se genera con GROQ_FAST_MODEL
+DEGRADE_NO_LLM_MS = 300             # sin LLM: perfil estructurado (aunque sea parcial) o extractos del contexto
+GROQ_FAST_MODEL = "llama-3.1-8b-instant"
+
+# Granularidad del índice de CVs: "chunk" (5 oraciones con overlap de 2) | "sentence" (unidades
+# cortas indexadas una sola vez, con posición; al consultar se expanden a ventanas sin overlap)
+INDEX_GRANULARITY = os.getenv("INDEX_GRANULARITY", "chunk")
+CHUNK_SIZE = 5                      # oraciones por chunk (INDEX_GRANULARITY="chunk"); elegir con make sweep
+CHUNK_OVERLAP = 2
+SENTENCE_UNIT_MIN_CHARS = 200       # oraciones cortas (títulos, fechas) se agrupan hasta este largo
+WINDOW_RADIUS = 1                   # unidades vecinas que se suman a cada lado de un hit
+WINDOW_MAX_UNITS = 8                # largo máximo de una ventana fusionada
+
+# Respuestas directas desde el perfil estructurado (sin RAG ni LLM)
+PROFILE_FASTPATH_ENABLED = True
+
+# Resúmenes de perfil precomputados para comparaciones multi-persona
+SUMMARY_MAX_WORDS = 80
+MULTI_CONTEXT_TOKEN_BUDGET = 2000   # si los CVs completos no entran, se usan resúmenes
+MULTI_CHUNKS_PER_PERSON = 2         # chunks específicos de la query por persona
+
+# UI (Dash): el callback encola el turno y una pool acotada de workers corre el grafo
+UI_JOB_QUEUE = os.getenv("UI_JOB_QUEUE", "1") == "1"   # en modo serve (multi-proceso) corre inline
+UI_WORKERS = 4
+UI_QUEUE_MAXSIZE = 16               # back-pressure: más turnos pendientes se rechazan
+UI_POLL_INTERVAL_MS = 500
+UI_JOB_TTL_SECONDS = 600
+
+# Consultas batch (batch.py): llamadas al LLM en paralelo con un tope de requests por minuto
+BATCH_CONCURRENCY = 8
+BATCH_REQUESTS_PER_MINUTE = 30
+
+# Rate limit global de Groq (src/rateLimiter.py): token buckets de requests y tokens por minuto
+# que comparten todas las llamadas al LLM, por prioridad: interactive > classification > batch > ingestion
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", "30000"))
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")  # "memory" (por proceso) | "sqlite" (compartido entre procesos)
+RATE_LIMIT_DB_PATH = os.path.join(LOCAL_STORE_DIR, "ratelimit.sqlite")
+RATE_LIMIT_RESERVE = 0.2            # fracción de cada bucket que batch/ingestion no pueden consumir
+RATE_LIMIT_MAX_WAIT_SECONDS = 30    # espera máxima de interactive/classification (batch/ingestion esperan lo necesario)
+RATE_LIMIT_MAX_RETRIES = 3          # reintentos ante un 429 de Groq
+
+# Captura de tráfico (src/trafficRecorder.py): llamadas a Groq y al índice vectorial de cada turno,
+# con tiempos, para reproducir conversaciones reales offline con replay.py
+TRAFFIC_RECORD = os.getenv("TRAFFIC_RECORD", "0") == "1"
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH", os.path.join(LOCAL_STORE_DIR, "traffic.jsonl"))  # .jsonl | .sqlite
+TRAFFIC_SAMPLE_RATE = float(os.getenv("TRAFFIC_SAMPLE_RATE", "1.0"))   # fracción de sesiones grabadas (sesiones completas)
+TRAFFIC_REDACT_PII = os.getenv("TRAFFIC_REDACT_PII", "1") == "1"       # emails, teléfonos, DNI y URLs de perfiles
+
+# Memoria corta y alias por sesión: "memory" (en proceso) | "sqlite" (compartida entre procesos).
+# Por defecto sigue al checkpointer: si el grafo sobrevive un reinicio, la memoria también.
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite" if CHECKPOINTER == "sqlite" else "memory")
+SESSION_DB_PATH = os.path.join(LOCAL_STORE_DIR, "sessions.sqlite")
+
+# Historia que entra al prompt: "window" (últimos turnos completos) | "summary"
+# (MEMORY_RECENT_TURNS completos + resumen incremental de los anteriores, fuera del camino crítico)
+MEMORY_MODE = os.getenv("MEMORY_MODE", "window")
+MEMORY_RECENT_TURNS = 2
+MEMORY_TOKEN_BUDGET = 600           # tope de tokens de historia (resumen + turnos) por prompt, solo en "summary"
+MEMORY_SUMMARY_MAX_WORDS = 120
+
+# Modo serve (gunicorn.conf.py): workers pre-forkeados con el grafo y las cachés ya cargadas
+SERVE_BIND = os.getenv("SERVE_BIND", "0.0.0.0:8050")
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", os.cpu_count() or 1))
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", 4))          # turnos concurrentes por worker
+SERVE_TIMEOUT = int(os.getenv("SERVE_TIMEOUT", 120))
+SERVE_MAX_REQUESTS = int(os.getenv("SERVE_MAX_REQUESTS", 1000))  # reciclado de workers (0 = nunca)
+
+# API HTTP/JSON (api.py): turnos concurrentes acotados y timeout por request
+API_BIND = os.getenv("API_BIND", "0.0.0.0:8060")
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", 8))     # más turnos en curso → 429
+API_QUEUE_WAIT_SECONDS = float(os.getenv("API_QUEUE_WAIT_SECONDS", 0.5))
+API_TIMEOUT_SECONDS = float(os.getenv("API_TIMEOUT_SECONDS", 60))  # turno más lento → 504
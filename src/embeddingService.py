@@ -0,0 +1,233 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.config.settings import PINECONE_API_KEY
+from src.config.settings import EMBEDDING_PROVIDER
+from src.config.settings import EMBEDDING_MODEL
+from src.config.settings import EMBEDDING_DIM
+from src.config.settings import EMBEDDING_BATCH_SIZE
+from src.config.settings import EMBEDDING_CACHE_PATH
+
+
+class EmbeddingProvider:
+    """Turns a batch of texts into a (n, dim) float32 matrix of L2-normalized rows."""
+    name: str = ""
+    dim: int = 0
+
+    def embed(self, texts: List[str], input_type: str = "passage") -> np.ndarray:
+        raise NotImplementedError
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic stand-in: hashed bag of words plus character trigrams
+    (accent and case insensitive). No model download and no network, so it
+    is stable across runs and processes; useful for tests and offline work.
+    """
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        folded = unicodedata.normalize("NFKD", text.lower())
+        folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+        words = re.findall(r"\w+", folded)
+        grams = [f"#{w[i:i + 3]}" for w in words for i in range(max(1, len(w) - 2))]
+        return words + grams
+
+    def embed(self, texts: List[str], input_type: str = "passage") -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) else -1.0
+        return _normalize_rows(out)
+
+
+class PineconeEmbeddingProvider(EmbeddingProvider):
+    """Pinecone hosted inference (same model the integrated indexes use)."""
+    def __init__(self, model: str = EMBEDDING_MODEL, dim: int = EMBEDDING_DIM):
+        from pinecone import Pinecone
+
+        self.pc = Pinecone(api_key=PINECONE_API_KEY)
+        self.name = model
+        self.dim = dim
+
+    def embed(self, texts: List[str], input_type: str = "passage") -> np.ndarray:
+        result = self.pc.inference.embed(
+            model=self.name,
+            inputs=texts,
+            parameters={"input_type": input_type, "truncate": "END", "dimension": self.dim},
+        )
+        return _normalize_rows(np.array([e["values"] for e in result], dtype=np.float32))
+
+
+class SentenceTransformerProvider(EmbeddingProvider):
+    """Local CPU model (requires the optional sentence-transformers package)."""
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        try:
+            from sentence_transformers import SentenceTransformer  # type: ignore[import-not-found]
+        except ImportError as e:
+            raise ImportError("EMBEDDING_PROVIDER='local' requires sentence-transformers: uv add sentence-transformers") from e
+
+        self.model = SentenceTransformer(model, device="cpu")
+        self.name = model
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+
+    def embed(self, texts: List[str], input_type: str = "passage") -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+        return _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+def build_provider(kind: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    """Provider by name: "hashing" | "pinecone" | "local"."""
+    if kind == "hashing":
+        return HashingEmbeddingProvider()
+    if kind == "pinecone":
+        return PineconeEmbeddingProvider()
+    if kind == "local":
+        return SentenceTransformerProvider()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {kind}")
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model, sha256(text)) in a SQLite file."""
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._conn_obj: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # una conexión por proceso: no se comparte a través de un fork
+        if self._conn_obj is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            conn.commit()
+            self._conn_obj, self._pid = conn, os.getpid()
+        return self._conn_obj
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # de a 500 para no pasar el límite de parámetros de SQLite
+            for i in range(0, len(hashes), 500):
+                part = list(hashes[i:i + 500])
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()],
+            )
+            self._conn.commit()
+
+
+class EmbeddingService:
+    """
+    Batched, cached embedding of queries and chunks.
+
+    encode() deduplicates its input, serves known texts from the cache and
+    sends only the missing ones to the provider, in batches of batch_size.
+    """
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.batch_size = batch_size
+        self.stats = {"requested": 0, "cache_hits": 0, "embedded": 0, "provider_calls": 0}
+
+    @property
+    def dim(self) -> int:
+        return self.provider.dim
+
+    def encode(self, texts: Sequence[str], input_type: str = "passage") -> np.ndarray:
+        """
+        Embeds texts in as few provider calls as possible.
+
+        Args:
+            texts (Sequence[str]): Texts to embed (duplicates are embedded once).
+            input_type (str): "passage" for indexed chunks, "query" for searches.
+
+        Returns:
+            np.ndarray: (len(texts), dim) float32 matrix, rows L2-normalized.
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        # queries y pasajes pueden embeberse distinto según el modelo
+        model_key = f"{self.provider.name}:{input_type}"
+        hashes = [EmbeddingCache.text_hash(t) for t in texts]
+        unique = dict(zip(hashes, texts))
+        vectors = self.cache.get_many(model_key, list(unique)) if self.cache else {}
+        missing = [h for h in unique if h not in vectors]
+
+        self.stats["requested"] += len(texts)
+        self.stats["cache_hits"] += len(unique) - len(missing)
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            embedded = self.provider.embed([unique[h] for h in batch], input_type=input_type)
+            new = dict(zip(batch, embedded))
+            if self.cache:
+                self.cache.put_many(model_key, new)
+            vectors.update(new)
+            self.stats["embedded"] += len(batch)
+            self.stats["provider_calls"] += 1
+
+        return np.stack([vectors[h] for h in hashes]).astype(np.float32, copy=False)
+
+    def encode_one(self, text: str, input_type: str = "query") -> np.ndarray:
+        return self.encode([text], input_type=input_type)[0]
+
+
+_embedding_service: Optional[EmbeddingService] = None
+
+def get_embedding_service() -> EmbeddingService:
+    """Get the process-wide embedding service (lazy singleton)."""
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService(build_provider(), EmbeddingCache())
+    return _embedding_service
+
+def reset_clients() -> None:
+    """Re-creates the provider's HTTP client after a fork (Pinecone inference only)."""
+    if _embedding_service is not None and isinstance(_embedding_service.provider, PineconeEmbeddingProvider):
+        from pinecone import Pinecone
+
+        _embedding_service.provider.pc = Pinecone(api_key=PINECONE_API_KEY)
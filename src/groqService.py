@@ -1,5 +1,6 @@
 from groq import Groq
 from typing import Any, List, Optional, Dict
+from src.rateLimiter import get_rate_limiter, request_tokens, tokens_used
 from src.config.settings import (
     GROQ_API_KEY,
     GROQ_LLM_MODEL,
@@ -16,12 +17,14 @@ class GroqLLMWrapper:
         max_completion_tokens: int = GROQ_MAX_COMPLETION_TOKENS,
         temperature: float = GROQ_TEMPERATURE,
         stream: bool = GROQ_STREAM,
+        priority: str = "interactive",
     ):
-        self.client = Groq(api_key=api_key)
+        self.client = Groq(api_key=api_key, max_retries=0)  # los reintentos los hace el rate limiter
         self.model = model
         self.max_completion_tokens = max_completion_tokens
         self.temperature = temperature
         self.stream = stream
+        self.priority = priority  # clase del rate limiter global (load.py usa "ingestion")
 
     def send_prompt(
         self,
@@ -33,14 +36,19 @@ class GroqLLMWrapper:
         messages = context if context else []
         messages.append({"role": "user", "content": prompt})
 
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            max_completion_tokens=self.max_completion_tokens,
-            top_p=top_p,
-            stream=self.stream,
-            stop=stop,
+        completion = get_rate_limiter().call(
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_completion_tokens=self.max_completion_tokens,
+                top_p=top_p,
+                stream=self.stream,
+                stop=stop,
+            ),
+            self.priority,
+            request_tokens(messages, self.max_completion_tokens),
+            used=None if self.stream else tokens_used,
         )
         
         return completion
@@ -51,20 +59,26 @@ class GroqLLMWrapper:
         context: Optional[List[Dict[str, str]]] = None,
         top_p: float = 1.0,
         stop: Optional[List[str]] = None,
+        max_completion_tokens: Optional[int] = None,
     ) -> Any:
-        """Send prompt with JSON response format enforced"""
+        """Send prompt with JSON response format enforced (max_completion_tokens overrides the instance cap)"""
         messages = context if context else []
         messages.append({"role": "user", "content": prompt})
+        max_tokens = max_completion_tokens or self.max_completion_tokens
 
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            max_completion_tokens=self.max_completion_tokens,
-            top_p=top_p,
-            stream=False,  # JSON mode requires stream=False
-            response_format={"type": "json_object"},
-            stop=stop,
+        completion = get_rate_limiter().call(
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_completion_tokens=max_tokens,
+                top_p=top_p,
+                stream=False,  # JSON mode requires stream=False
+                response_format={"type": "json_object"},
+                stop=stop,
+            ),
+            self.priority,
+            request_tokens(messages, max_tokens),
         )
         
         return completion
\ No newline at end of file
@@ -0,0 +1,114 @@
+import time
+import uuid
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from src.config.settings import UI_WORKERS
+from src.config.settings import UI_QUEUE_MAXSIZE
+from src.config.settings import UI_JOB_TTL_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room left (back-pressure)."""
+
+
+class JobQueue:
+    """
+    Bounded worker pool that runs jobs off the caller's thread.
+
+    submit() enqueues a payload and returns a job id right away; a fixed
+    number of daemon threads run `handler(payload)` and keep the result until
+    it is collected with pop() or it expires after `result_ttl` seconds.
+    """
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Any],
+        workers: int = UI_WORKERS,
+        max_pending: int = UI_QUEUE_MAXSIZE,
+        result_ttl: float = UI_JOB_TTL_SECONDS,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """
+        Enqueues a job without blocking.
+
+        Args:
+            payload (Dict[str, Any]): Argument passed to the handler.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting.
+        """
+        self._ensure_workers()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._jobs[job_id] = {"status": "queued", "submitted_at": time.time()}
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            raise QueueFullError(f"job queue is full ({self._queue.maxsize} pending)")
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pop(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns and forgets a finished job (None if unknown or still running)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in ("done", "error"):
+                return None
+            return self._jobs.pop(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j["status"] == "running")
+        return {"pending": self._queue.qsize(), "running": running, "workers": self.workers}
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [
+                k for k, j in self._jobs.items()
+                if j["status"] in ("done", "error") and now - j.get("finished_at", now) > self.result_ttl
+            ]
+            for k in expired:
+                del self._jobs[k]
+
+    def _worker(self) -> None:
+        while True:
+            job_id, payload = self._queue.get()
+            with self._lock:
+                self._jobs[job_id].update(status="running", started_at=time.time())
+            try:
+                result = self.handler(payload)
+                update = {"status": "done", "result": result}
+            except Exception as e:
+                update = {"status": "error", "error": str(e)}
+            with self._lock:
+                self._jobs[job_id].update(update, finished_at=time.time())
+            self._queue.task_done()
+            self._purge_expired()
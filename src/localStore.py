@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.config.settings import DOCUMENT_STORE_PATH
+from src.config.settings import PROFILE_STORE_PATH
+from src.config.settings import SUMMARY_MAX_WORDS
+from src.textUtils import normalize_text, estimate_tokens
+
+
+class JSONStore:
+    """Small per-person key/value store persisted as a single JSON file."""
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._records is None:
+            with self._lock:
+                if self._records is None:
+                    if os.path.exists(self.path):
+                        with open(self.path, "r", encoding="utf-8") as f:
+                            self._records = json.load(f)
+                    else:
+                        self._records = {}
+        return self._records
+
+    def get(self, person_id: str) -> Optional[Dict[str, Any]]:
+        return self._load().get(str(person_id))
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self._load().values())
+
+    def put(self, person_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        records = self._load()
+        with self._lock:
+            records[str(person_id)] = {**record, "person_id": str(person_id)}
+        return records[str(person_id)]
+
+    def save(self) -> None:
+        records = self._load()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class DocumentStore(JSONStore):
+    """
+    Keeps the full normalized CV text of each person, keyed by person_id,
+    so small CVs can be placed straight into the prompt without retrieval.
+    """
+    def __init__(self, path: str = DOCUMENT_STORE_PATH):
+        super().__init__(path)
+
+
+class ProfileStore(JSONStore):
+    """
+    Structured CV fields extracted at load time (contact, roles, companies,
+    skills, education), used to answer factual questions without RAG.
+    """
+    def __init__(self, path: str = PROFILE_STORE_PATH):
+        super().__init__(path)
+
+
+_document_store: Optional[DocumentStore] = None
+_profile_store: Optional[ProfileStore] = None
+
+def get_document_store() -> DocumentStore:
+    """Get the process-wide document store (lazy singleton)."""
+    global _document_store
+    if _document_store is None:
+        _document_store = DocumentStore()
+    return _document_store
+
+def find_person_by_source(source: str, tenant: str = "") -> Optional[str]:
+    """person_id already assigned to a CV file (by basename) in the tenant, if it was loaded before."""
+    name = os.path.basename(source)
+    for record in get_document_store().all():
+        if record.get("source") == name and record.get("tenant", "") == tenant:
+            return record["person_id"]
+    return None
+
+def in_tenants(record: Dict[str, Any], tenants: Sequence[str]) -> bool:
+    """Whether a stored person belongs to one of the tenants (records loaded before tenants are "")."""
+    return record.get("tenant", "") in tenants
+
+def get_profile_store() -> ProfileStore:
+    """Get the process-wide structured profile store (lazy singleton)."""
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore()
+    return _profile_store
+
+# "Etiqueta: valor" en la sección de datos personales de los CVs
+CONTACT_PATTERNS = {
+    "email": r"(?:correo(?: electr[oó]nico)?|e-?mail)\s*:\s*(\S+@\S+)",
+    "telefono": r"(?:tel[eé]fono|celular)\s*:\s*([+\d][\d ()-]{6,})",
+    "linkedin": r"linkedin\s*:\s*(\S+)",
+    "ubicacion": r"(?:lugar de residencia|residencia|ubicaci[oó]n)\s*:\s*(.+)",
+    "fecha_nacimiento": r"fecha de nacimiento\s*:\s*(.+)",
+    "dni": r"dni\s*:\s*([\d.]+)",
+}
+
+def parse_contact_fields(text: str) -> Dict[str, str]:
+    """
+    Deterministic extraction of contact fields from "Label: value" lines.
+
+    Args:
+        text (str): CV text.
+
+    Returns:
+        Dict[str, str]: Found contact fields (missing ones are omitted).
+    """
+    found = {}
+    for key, pattern in CONTACT_PATTERNS.items():
+        m = re.search(pattern, text, flags=re.IGNORECASE)
+        if m:
+            found[key] = m.group(1).strip()
+    return found
+
+def compact_summary(text: str, max_words: int = SUMMARY_MAX_WORDS) -> str:
+    """Collapses a profile summary to a single line of at most max_words words."""
+    words = (text or "").split()
+    if len(words) <= max_words:
+        return " ".join(words)
+    return " ".join(words[:max_words]) + "…"
+
+def load_profile_into_store(
+    file_path: str,
+    person_id: str,
+    name: str,
+    lastname: str,
+    profile_type: str,
+    fields: Dict[str, Any],
+    tenant: str = "",
+) -> Dict[str, Any]:
+    """
+    Stores the structured fields extracted from a CV.
+    Contact fields found by the LLM take precedence; regex matches on the
+    raw CV fill whatever the LLM left empty.
+
+    Args:
+        file_path (str): Path to the CV file (used for contact fallback and citations).
+        person_id (str): Unique identifier for the person.
+        name (str): Name of the person.
+        lastname (str): Last name of the person.
+        profile_type (str): Profile type extracted at load time.
+        fields (Dict[str, Any]): Structured fields extracted by the LLM.
+        tenant (str): Client company the person belongs to ("" = default pool).
+
+    Returns:
+        Dict[str, Any]: The stored record.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    contact = {k: v for k, v in (fields.get("contacto") or {}).items() if v}
+    for key, value in parse_contact_fields(text).items():
+        contact.setdefault(key, value)
+
+    store = get_profile_store()
+    record = store.put(person_id, {
+        "name": name,
+        "lastname": lastname,
+        "profile_type": profile_type,
+        "source": os.path.basename(file_path),
+        "tenant": tenant,
+        "contacto": contact,
+        "experiencia": fields.get("experiencia") or [],
+        "empresas": fields.get("empresas") or [],
+        "skills": fields.get("skills") or [],
+        "educacion": fields.get("educacion") or [],
+        "certificaciones": fields.get("certificaciones") or [],
+        "idiomas": fields.get("idiomas") or [],
+        "summary": compact_summary(fields.get("resumen") or ""),
+    })
+    store.save()
+    return record
+
+def load_document_into_store(
+    file_path: str,
+    name: str,
+    lastname: str,
+    profile_type: str,
+    person_id: str,
+    units: Optional[List[str]] = None,
+    tenant: str = "",
+) -> Dict[str, Any]:
+    """
+    Reads a CV file, normalizes it and stores the full text for the person.
+
+    Args:
+        file_path (str): Path to the CV file.
+        name (str): Name of the person.
+        lastname (str): Last name of the person.
+        profile_type (str): Profile type extracted at load time.
+        person_id (str): Unique identifier for the person.
+        units (List[str] | None): Sentence units indexed for the person, kept
+            to expand hits into windows at query time (INDEX_GRANULARITY="sentence").
+        tenant (str): Client company the person belongs to ("" = default pool).
+
+    Returns:
+        Dict[str, Any]: The stored record.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"{file_path} does not exist.")
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = normalize_text(f.read())
+
+    store = get_document_store()
+    fields = {
+        "name": name,
+        "lastname": lastname,
+        "profile_type": profile_type,
+        "source": os.path.basename(file_path),
+        "tenant": tenant,
+        "text": text,
+        "tokens": estimate_tokens(text),
+    }
+    if units:
+        fields["units"] = list(units)
+    record = store.put(person_id, fields)
+    store.save()
+    return record
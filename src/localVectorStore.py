@@ -0,0 +1,507 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.settings import LOCAL_VECTOR_DIR
+from src.config.settings import LOCAL_VECTOR_QUANTIZATION
+from src.config.settings import LOCAL_RERANK_FACTOR
+from src.config.settings import LOCAL_RERANK_FACTOR_BINARY
+from src.config.settings import LOCAL_SCAN_BLOCK_ROWS
+from src.config.settings import LOCAL_ANN
+from src.config.settings import LOCAL_IVF_MIN_ROWS
+from src.config.settings import LOCAL_IVF_NPROBE
+from src.config.settings import LOCAL_IVF_RETRAIN_GROWTH
+from src.config.settings import LOCAL_DELTA_MAX_ROWS
+from src.embeddingService import EmbeddingService, get_embedding_service
+from src.annIndex import build_lists, default_nlist, probe, train_centroids
+
+
+QUANTIZATIONS = ("float32", "int8", "binary")
+
+def match_filter(fields: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """Subset of Pinecone's metadata filter syntax: {"f": v}, {"f": {"$eq": v}}, {"f": {"$in": [...]}}."""
+    for key, cond in (metadata_filter or {}).items():
+        value = fields.get(key)
+        if isinstance(cond, dict):
+            if "$eq" in cond and value != cond["$eq"]:
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+def person_ids_in_filter(metadata_filter: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """person_ids pedidos si el filtro es solo sobre person_id ($eq/$in/valor); None si no."""
+    if not metadata_filter or set(metadata_filter) != {"person_id"}:
+        return None
+    cond = metadata_filter["person_id"]
+    if not isinstance(cond, dict):
+        return [str(cond)]
+    if set(cond) == {"$eq"}:
+        return [str(cond["$eq"])]
+    if set(cond) == {"$in"}:
+        return [str(v) for v in cond["$in"]]
+    return None
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: v ≈ codes * scale."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits packed 8 per byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+class _Namespace:
+    """Writable copy of a namespace (ids, metadata and float32 matrix) used while ingesting."""
+    def __init__(self, dim: int):
+        self.ids: List[str] = []
+        self.fields: List[Dict[str, Any]] = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.positions: Dict[str, int] = {}
+
+    def upsert(self, ids: List[str], fields: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        new_rows: List[Tuple[str, Dict[str, Any], np.ndarray]] = []
+        for rid, f, v in zip(ids, fields, vectors):
+            if rid in self.positions:
+                pos = self.positions[rid]
+                self.fields[pos] = f
+                self.vectors[pos] = v
+            else:
+                self.positions[rid] = len(self.ids) + len(new_rows)
+                new_rows.append((rid, f, v))
+        if new_rows:
+            self.ids += [r[0] for r in new_rows]
+            self.fields += [r[1] for r in new_rows]
+            self.vectors = np.vstack([self.vectors, np.stack([r[2] for r in new_rows])])
+
+    def delete(self, ids: List[str]) -> int:
+        drop = {self.positions[i] for i in ids if i in self.positions}
+        if not drop:
+            return 0
+        keep = [p for p in range(len(self.ids)) if p not in drop]
+        self.ids = [self.ids[p] for p in keep]
+        self.fields = [self.fields[p] for p in keep]
+        self.vectors = self.vectors[keep]
+        self.positions = {rid: p for p, rid in enumerate(self.ids)}
+        return len(drop)
+
+    def search(self, query: np.ndarray, top_k: int, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Exact scan (the delta segment is small). Returns [(id, score, fields)] best first."""
+        rows = [i for i, f in enumerate(self.fields) if match_filter(f, metadata_filter)]
+        if not rows:
+            return []
+        scores = self.vectors[rows] @ query
+        best = np.argsort(-scores)[:top_k]
+        return [(self.ids[rows[i]], float(scores[i]), self.fields[rows[i]]) for i in best]
+
+    def save_delta(self, path: str, tombstones: Dict[str, int]) -> None:
+        """Persists the delta segment and the base tombstones (small, rewritten on every change)."""
+        with open(f"{path}.npy.tmp", "wb") as f:
+            np.save(f, self.vectors)
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "fields": self.fields, "tombstones": tombstones}, f, ensure_ascii=False)
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load_delta(cls, path: str, dim: int) -> Tuple["_Namespace", Dict[str, int]]:
+        ns = cls(dim)
+        if not os.path.exists(f"{path}.json"):
+            return ns, {}
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["ids"]:
+            ns.upsert(meta["ids"], meta["fields"], np.load(f"{path}.npy"))
+        return ns, meta["tombstones"]
+
+    def write(self, directory: str, centroids: Optional[np.ndarray] = None, trained_rows: int = 0) -> None:
+        """
+        Persists the namespace sorted by person_id, so each person's rows are
+        contiguous, with every storage format plus the per-person offset table.
+        With LOCAL_ANN = "ivf" and enough rows it also writes the IVF lists;
+        given centroids are reused until the corpus outgrows the size they were
+        trained on by LOCAL_IVF_RETRAIN_GROWTH.
+        Files are written to a sibling directory and swapped in at the end;
+        readers that still map the old files keep a consistent view.
+        """
+        order = sorted(range(len(self.ids)), key=lambda p: (str(self.fields[p].get("person_id", "")), p))
+        vectors = np.ascontiguousarray(self.vectors[order], dtype=np.float32)
+        codes, scales = quantize_int8(vectors)
+
+        tmp = f"{directory}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.f32.npy"), vectors)
+        np.save(os.path.join(tmp, "vectors.i8.npy"), codes)
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+        np.save(os.path.join(tmp, "vectors.bin.npy"), quantize_binary(vectors))
+
+        if LOCAL_ANN == "ivf" and len(vectors) >= LOCAL_IVF_MIN_ROWS:
+            if centroids is None or len(vectors) > trained_rows * LOCAL_IVF_RETRAIN_GROWTH:
+                centroids, trained_rows = train_centroids(vectors, default_nlist(len(vectors))), len(vectors)
+            ivf_order, bounds = build_lists(vectors, centroids)
+            np.save(os.path.join(tmp, "ivf_centroids.npy"), centroids)
+            np.save(os.path.join(tmp, "ivf_order.npy"), ivf_order)
+            np.save(os.path.join(tmp, "ivf_bounds.npy"), bounds)
+            with open(os.path.join(tmp, "ivf.json"), "w", encoding="utf-8") as f:
+                json.dump({"trained_rows": trained_rows}, f)
+
+        conn = sqlite3.connect(os.path.join(tmp, "meta.sqlite"))
+        conn.execute("CREATE TABLE rows (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, fields TEXT NOT NULL)")
+        conn.execute("CREATE TABLE offsets (person_id TEXT PRIMARY KEY, start INTEGER NOT NULL, stop INTEGER NOT NULL)")
+        conn.executemany(
+            "INSERT INTO rows VALUES (?, ?, ?)",
+            [(row, self.ids[p], json.dumps(self.fields[p], ensure_ascii=False)) for row, p in enumerate(order)],
+        )
+        offsets: Dict[str, List[int]] = {}
+        for row, p in enumerate(order):
+            pid = str(self.fields[p].get("person_id", ""))
+            offsets.setdefault(pid, [row, row])[1] = row + 1
+        conn.executemany("INSERT INTO offsets VALUES (?, ?, ?)", [(k, a, b) for k, (a, b) in offsets.items()])
+        conn.commit()
+        conn.close()
+
+        old = f"{directory}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.isdir(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class _MappedNamespace:
+    """
+    Read-only view of a persisted namespace. Vectors are np.memmap, so every
+    process mapping the same files shares their pages through the OS cache;
+    only the per-person offset table lives in process memory and metadata is
+    read from SQLite for the final hits only.
+    """
+    def __init__(self, directory: str, quantization: str = LOCAL_VECTOR_QUANTIZATION):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown LOCAL_VECTOR_QUANTIZATION: {quantization}")
+        self.directory = directory
+        self.quantization = quantization
+        self.f32 = np.load(os.path.join(directory, "vectors.f32.npy"), mmap_mode="r")
+        self.dim = int(self.f32.shape[1])
+        self.size = int(self.f32.shape[0])
+        if quantization == "int8":
+            self.codes = np.load(os.path.join(directory, "vectors.i8.npy"), mmap_mode="r")
+            self.scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+        elif quantization == "binary":
+            self.codes = np.load(os.path.join(directory, "vectors.bin.npy"), mmap_mode="r")
+
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        if os.path.exists(os.path.join(directory, "ivf.json")):
+            self.centroids = np.load(os.path.join(directory, "ivf_centroids.npy"))
+            self.ivf_order = np.load(os.path.join(directory, "ivf_order.npy"), mmap_mode="r")
+            self.ivf_bounds = np.load(os.path.join(directory, "ivf_bounds.npy"))
+            with open(os.path.join(directory, "ivf.json"), "r", encoding="utf-8") as f:
+                self.trained_rows = json.load(f)["trained_rows"]
+
+        self._meta_path = os.path.join(directory, "meta.sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(f"file:{self._meta_path}?mode=ro", uri=True)
+        self.offsets: Dict[str, Tuple[int, int]] = {
+            pid: (start, stop) for pid, start, stop in conn.execute("SELECT person_id, start, stop FROM offsets")
+        }
+        conn.close()
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            # conexión abierta de forma perezosa: no se hereda a través de un fork
+            if self._conn is None:
+                self._conn = sqlite3.connect(f"file:{self._meta_path}?mode=ro", uri=True, check_same_thread=False)
+            return self._conn.execute(sql, params).fetchall()
+
+    def rows(self, rows: List[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        out = {}
+        for i in range(0, len(rows), 500):
+            part = rows[i:i + 500]
+            sql = f"SELECT row, id, fields FROM rows WHERE row IN ({','.join('?' * len(part))})"
+            for row, rid, fields in self._query(sql, tuple(part)):
+                out[row] = (rid, json.loads(fields))
+        return out
+
+    def rows_for_ids(self, ids: List[str]) -> Dict[str, int]:
+        out = {}
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            sql = f"SELECT id, row FROM rows WHERE id IN ({','.join('?' * len(part))})"
+            out.update(dict(self._query(sql, tuple(part))))
+        return out
+
+    def ids_with_prefix(self, prefix: str) -> List[str]:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return [r[0] for r in self._query("SELECT id FROM rows WHERE id LIKE ? ESCAPE '\\' ORDER BY row", (f"{escaped}%",))]
+
+    def segments(self, metadata_filter: Optional[Dict[str, Any]], query: Optional[np.ndarray] = None,
+                 nprobe: int = LOCAL_IVF_NPROBE) -> List[Any]:
+        """
+        Filas a escanear: slices contiguos para filtros por person_id, las listas
+        IVF más cercanas a la query si no hay filtro e índice IVF, todas si no.
+        """
+        if not metadata_filter:
+            if self.centroids is None or query is None or nprobe <= 0:
+                return [slice(0, self.size)]
+            lists = probe(self.centroids, query, nprobe)
+            rows = np.concatenate([self.ivf_order[self.ivf_bounds[i]:self.ivf_bounds[i + 1]] for i in lists])
+            return [np.sort(rows)]
+        pids = person_ids_in_filter(metadata_filter)
+        if pids is not None:
+            return [slice(*self.offsets[p]) for p in pids if p in self.offsets]
+        matched = [
+            row for row, fields in self._query("SELECT row, fields FROM rows")
+            if match_filter(json.loads(fields), metadata_filter)
+        ]
+        return [np.array(matched, dtype=np.int64)] if matched else []
+
+    def _approx_scores(self, sel: Any, query: np.ndarray, query_bits: Optional[np.ndarray]) -> np.ndarray:
+        if self.quantization == "int8":
+            return (self.codes[sel].astype(np.float32) @ query) * self.scales[sel]
+        if self.quantization == "binary" and query_bits is not None:
+            hamming = np.bitwise_count(np.bitwise_xor(self.codes[sel], query_bits)).sum(axis=1)
+            return 1.0 - 2.0 * hamming.astype(np.float32) / self.dim
+        return self.f32[sel] @ query
+
+    def search(self, query: np.ndarray, top_k: int, metadata_filter: Optional[Dict[str, Any]] = None,
+               rerank_factor: Optional[int] = None, block_rows: int = LOCAL_SCAN_BLOCK_ROWS,
+               nprobe: int = LOCAL_IVF_NPROBE) -> List[Tuple[int, float]]:
+        """
+        Scans the selected rows (person slices, probed IVF lists or everything)
+        block by block over the quantized codes and keeps the best
+        top_k * rerank_factor candidates, then re-ranks those with the exact
+        float32 vectors. Returns [(row, score)] best first.
+        nprobe <= 0 forces an exhaustive scan.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query_bits = quantize_binary(query[None, :])[0] if self.quantization == "binary" else None
+        exact = self.quantization == "float32"
+        if rerank_factor is None:
+            rerank_factor = LOCAL_RERANK_FACTOR_BINARY if self.quantization == "binary" else LOCAL_RERANK_FACTOR
+        keep = top_k if exact else top_k * max(1, rerank_factor)
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for segment in self.segments(metadata_filter, query, nprobe):
+            if isinstance(segment, slice):
+                blocks = [
+                    (slice(s, min(s + block_rows, segment.stop)), np.arange(s, min(s + block_rows, segment.stop)))
+                    for s in range(segment.start, segment.stop, block_rows)
+                ]
+            else:
+                blocks = [(segment[s:s + block_rows], segment[s:s + block_rows]) for s in range(0, len(segment), block_rows)]
+            for sel, row_ids in blocks:
+                scores = self._approx_scores(sel, query, query_bits)
+                best_rows = np.concatenate([best_rows, row_ids])
+                best_scores = np.concatenate([best_scores, scores.astype(np.float32)])
+                if best_rows.size > keep:
+                    top = np.argpartition(-best_scores, keep - 1)[:keep]
+                    best_rows, best_scores = best_rows[top], best_scores[top]
+
+        if best_rows.size == 0:
+            return []
+        if not exact:
+            # re-rank exacto: solo se tocan las páginas float32 de los candidatos
+            order = np.sort(best_rows)
+            best_rows, best_scores = order, self.f32[order] @ query
+        final = np.argsort(-best_scores)[:top_k]
+        return [(int(best_rows[i]), float(best_scores[i])) for i in final]
+
+    def to_buffer(self) -> _Namespace:
+        ns = _Namespace(self.dim)
+        rows = self._query("SELECT row, id, fields FROM rows ORDER BY row")
+        ns.upsert([r[1] for r in rows], [json.loads(r[2]) for r in rows], np.array(self.f32))
+        return ns
+
+
+class LocalVectorIndex:
+    """
+    In-process replacement for a Pinecone integrated index.
+
+    Mirrors the subset of the Pinecone Index API used by vectorService
+    (upsert_records, search, delete, list, describe_index_stats), so
+    search_similar works unchanged with VECTOR_BACKEND = "local". Texts are
+    embedded through the EmbeddingService (batched and cached).
+
+    Each namespace has a base segment, persisted under LOCAL_VECTOR_DIR and
+    served from memory-mapped, optionally quantized files with an IVF index,
+    and a small delta segment that takes inserts and overwrites incrementally.
+    Deleted or overwritten base rows are tombstoned; compact() folds the delta
+    into the base (automatically once it exceeds LOCAL_DELTA_MAX_ROWS).
+    """
+    def __init__(
+        self,
+        name: str,
+        text_field: str,
+        embedder: Optional[EmbeddingService] = None,
+        directory: str = LOCAL_VECTOR_DIR,
+        quantization: str = LOCAL_VECTOR_QUANTIZATION,
+    ):
+        self.name = name
+        self.text_field = text_field
+        self.embedder = embedder or get_embedding_service()
+        self.quantization = quantization
+        self.path = os.path.join(directory, name)
+        self._base: Dict[str, _MappedNamespace] = {}
+        self._delta: Dict[str, _Namespace] = {}
+        self._tombstones: Dict[str, Dict[str, int]] = {}    # id -> fila del base
+        self._lock = threading.Lock()
+        self._load()
+
+    def _delta_path(self, namespace: str) -> str:
+        return os.path.join(self.path, f"{namespace}.delta")
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.path):
+            return
+        for entry in sorted(os.listdir(self.path)):
+            ns_dir = os.path.join(self.path, entry)
+            if os.path.isfile(os.path.join(ns_dir, "meta.sqlite")):
+                self._base[entry] = _MappedNamespace(ns_dir, self.quantization)
+            elif entry.endswith(".delta.json"):
+                namespace = entry[:-len(".delta.json")]
+                self._delta[namespace], self._tombstones[namespace] = _Namespace.load_delta(
+                    self._delta_path(namespace), self.embedder.dim
+                )
+
+    def _namespaces(self) -> List[str]:
+        return sorted(set(self._base) | set(self._delta))
+
+    def _tombstone(self, namespace: str, ids: List[str]) -> int:
+        base = self._base.get(namespace)
+        if not base:
+            return 0
+        rows = base.rows_for_ids(ids)
+        tombstones = self._tombstones.setdefault(namespace, {})
+        new = {k: v for k, v in rows.items() if k not in tombstones}
+        tombstones.update(new)
+        return len(new)
+
+    def _save_delta(self, namespace: str) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self._delta[namespace].save_delta(self._delta_path(namespace), self._tombstones.get(namespace, {}))
+
+    def compact(self, namespace: Optional[str] = None) -> None:
+        """Folds delta and tombstones into the base segment (rewrites it)."""
+        with self._lock:
+            for ns_name in ([namespace] if namespace else self._namespaces()):
+                self._compact(ns_name)
+
+    def _compact(self, namespace: str) -> None:
+        delta = self._delta.get(namespace)
+        tombstones = self._tombstones.get(namespace, {})
+        base = self._base.get(namespace)
+        if base and not tombstones and (delta is None or not delta.ids):
+            return
+        merged = base.to_buffer() if base else _Namespace(self.embedder.dim)
+        merged.delete(list(tombstones))
+        if delta and delta.ids:
+            merged.upsert(delta.ids, delta.fields, delta.vectors)
+
+        ns_dir = os.path.join(self.path, namespace)
+        os.makedirs(self.path, exist_ok=True)
+        merged.write(ns_dir, base.centroids if base else None, base.trained_rows if base else 0)
+        self._base[namespace] = _MappedNamespace(ns_dir, self.quantization)
+        self._delta[namespace], self._tombstones[namespace] = _Namespace(self.embedder.dim), {}
+        for ext in (".json", ".npy"):
+            if os.path.exists(f"{self._delta_path(namespace)}{ext}"):
+                os.remove(f"{self._delta_path(namespace)}{ext}")
+
+    # ---- API tipo Pinecone ----
+    def upsert_records(self, namespace: str, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        ids = [str(r["_id"]) for r in records]
+        fields = [{k: v for k, v in r.items() if k != "_id"} for r in records]
+        vectors = self.embedder.encode([str(f.get(self.text_field, "")) for f in fields], input_type="passage")
+        with self._lock:
+            self._tombstone(namespace, ids)
+            delta = self._delta.setdefault(namespace, _Namespace(self.embedder.dim))
+            delta.upsert(ids, fields, vectors)
+            if len(delta.ids) > LOCAL_DELTA_MAX_ROWS:
+                self._compact(namespace)
+            else:
+                self._save_delta(namespace)
+
+    def delete(self, ids: List[str], namespace: str) -> int:
+        ids = [str(i) for i in ids]
+        with self._lock:
+            delta = self._delta.setdefault(namespace, _Namespace(self.embedder.dim))
+            removed = delta.delete(ids) + self._tombstone(namespace, ids)
+            if removed:
+                self._save_delta(namespace)
+        return removed
+
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100):
+        """Yields pages of live ids starting with prefix (like Index.list on serverless)."""
+        base = self._base.get(namespace)
+        tombstones = self._tombstones.get(namespace, {})
+        ids = [i for i in (base.ids_with_prefix(prefix) if base else []) if i not in tombstones]
+        delta = self._delta.get(namespace)
+        ids += [i for i in (delta.ids if delta else []) if i.startswith(prefix)]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for ns_name in self._namespaces():
+            base, delta = self._base.get(ns_name), self._delta.get(ns_name)
+            namespaces[ns_name] = {
+                "vector_count": (base.size if base else 0) - len(self._tombstones.get(ns_name, {})) + (len(delta.ids) if delta else 0),
+                "delta_count": len(delta.ids) if delta else 0,
+                "ivf_lists": len(base.centroids) if base is not None and base.centroids is not None else 0,
+            }
+        return {
+            "dimension": self.embedder.dim,
+            "quantization": self.quantization,
+            "namespaces": namespaces,
+            "total_vector_count": sum(v["vector_count"] for v in namespaces.values()),
+        }
+
+    def search(self, namespace: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        """query: {"top_k", "inputs": {"text"} | "vector": {"values"}, "filter"?}; returns Pinecone's shape."""
+        base, delta = self._base.get(namespace), self._delta.get(namespace)
+        if (base is None or base.size == 0) and (delta is None or not delta.ids):
+            return {"result": {"hits": []}}
+
+        if "vector" in query:
+            qvec = np.asarray(query["vector"]["values"], dtype=np.float32)
+        else:
+            qvec = self.embedder.encode_one(query["inputs"]["text"], input_type="query")
+        top_k = int(query.get("top_k", 10))
+        metadata_filter = query.get("filter")
+
+        hits: List[Dict[str, Any]] = []
+        if base is not None and base.size:
+            dead = set(self._tombstones.get(namespace, {}).values())
+            ranked = [r for r in base.search(qvec, top_k + len(dead), metadata_filter) if r[0] not in dead][:top_k]
+            meta = base.rows([row for row, _ in ranked])
+            hits += [{"_id": meta[row][0], "_score": score, "fields": meta[row][1]} for row, score in ranked]
+        if delta is not None and delta.ids:
+            hits += [
+                {"_id": rid, "_score": score, "fields": dict(fields)}
+                for rid, score, fields in delta.search(qvec, top_k, metadata_filter)
+            ]
+        hits.sort(key=lambda h: h["_score"], reverse=True)
+        return {"result": {"hits": hits[:top_k]}}
+
+
+_local_indexes: Dict[str, LocalVectorIndex] = {}
+
+def get_local_index(name: str, text_field: str) -> LocalVectorIndex:
+    """Get the process-wide local index for `name` (lazy, one per index name)."""
+    if name not in _local_indexes:
+        _local_indexes[name] = LocalVectorIndex(name, text_field)
+    return _local_indexes[name]
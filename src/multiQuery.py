@@ -0,0 +1,99 @@
+import re
+from typing import Callable, Dict, Hashable, Iterable, List, Sequence, Tuple, TypeVar
+
+from src.config.settings import MULTI_QUERY_MAX
+from src.config.settings import RRF_K
+from src.rerankService import STOPWORDS
+from src.textUtils import fold_text
+
+
+T = TypeVar("T")
+
+# Intención de la pregunta -> títulos de sección de los CVs (acercan la query al chunk de esa sección)
+SECTION_HINTS: List[Tuple[str, str]] = [
+    (r"trabaj|experien|empresa|puesto|cargo|rol\b|proyecto", "Experiencia Laboral"),
+    (r"estudi|universidad|titul|carrera|educacion|formacion|grado", "Educación"),
+    (r"certific|curso", "Certificaciones"),
+    (r"idioma|ingles|portugues|frances|aleman", "Idiomas"),
+    (r"tecnolog|herramient|lenguaje|skill|habilidad|conocimiento|stack|sabe", "Conocimientos Técnicos"),
+    (r"perfil|resumen|quien es|seniority", "Perfil Profesional"),
+]
+
+# Conectores que separan ítems coordinados ("con Spark, Airflow y dbt")
+COORDINATION = re.compile(r"\s*(?:,|;|\by\b|\be\b|\bo\b|\bu\b)\s*", flags=re.IGNORECASE)
+# Preposición que introduce los ítems ("experiencia con ...", "trabajó en ...")
+ITEMS_START = re.compile(r"\b(?:con|en|de|sobre|usando)\s+(?=\S)", flags=re.IGNORECASE)
+
+
+def _content_words(text: str, drop: Iterable[str] = ()) -> List[str]:
+    drop = {fold_text(w) for w in drop}
+    return [
+        w for w in re.findall(r"[\w+#.-]+", text)
+        if len(w.strip(".")) >= 2 and fold_text(w) not in STOPWORDS and fold_text(w) not in drop
+    ]
+
+
+def expand_query(query: str, names: Sequence[str] = (), max_queries: int = MULTI_QUERY_MAX) -> List[str]:
+    """
+    Rule-based rewrites of a CV question, without an LLM call.
+
+    Besides the original question it produces, in this order:
+    one sub-question per coordinated item ("con Spark y Airflow" -> "... Spark",
+    "... Airflow"), a keyword query without the person's name and question
+    words, and the CV section title matching the intent.
+
+    Args:
+        query (str): User question.
+        names (Sequence[str]): Names of the resolved people, removed from the rewrites.
+        max_queries (int): Maximum number of queries returned, the original included.
+
+    Returns:
+        List[str]: Distinct queries, the original first.
+    """
+    name_words = [w for n in names for w in n.split()]
+    core = re.sub(r"[¿?¡!]", " ", query).strip()
+    folded = fold_text(core)
+    hint = next((section for pattern, section in SECTION_HINTS if re.search(pattern, folded)), "")
+
+    rewrites: List[str] = []
+    start = ITEMS_START.search(core)
+    if start:
+        head, tail = core[:start.start()], core[start.end():]
+        items = [" ".join(_content_words(p, name_words)) for p in COORDINATION.split(tail)]
+        items = [i for i in items if i]
+        if len(items) >= 2:
+            head_words = " ".join(_content_words(head, name_words)) or hint
+            rewrites += [f"{head_words} {item}".strip() for item in items]
+
+    keywords = " ".join(_content_words(core, name_words))
+    rewrites += [keywords, f"{hint}: {keywords}" if hint and keywords else hint]
+
+    out: Dict[str, str] = {fold_text(query): query}
+    for q in rewrites:
+        if q and fold_text(q) not in out:
+            out[fold_text(q)] = q
+    return list(out.values())[:max(1, max_queries)]
+
+
+def rrf_fuse(rankings: Sequence[Sequence[T]], key: Callable[[T], Hashable], k: int = RRF_K) -> List[Tuple[T, float]]:
+    """
+    Reciprocal rank fusion: score(item) = sum over rankings of 1 / (k + rank).
+
+    Args:
+        rankings (Sequence[Sequence[T]]): One ranked list per query, best first.
+        key (Callable[[T], Hashable]): Identity of an item across lists.
+        k (int): Damping constant; higher flattens the weight of the top ranks.
+
+    Returns:
+        List[Tuple[T, float]]: (item, fused score), best first; each item is the
+        instance from the list where it ranked best.
+    """
+    scores: Dict[Hashable, float] = {}
+    best: Dict[Hashable, Tuple[int, T]] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            ident = key(item)
+            scores[ident] = scores.get(ident, 0.0) + 1.0 / (k + rank)
+            if ident not in best or rank < best[ident][0]:
+                best[ident] = (rank, item)
+    return sorted(((best[i][1], s) for i, s in scores.items()), key=lambda x: x[1], reverse=True)
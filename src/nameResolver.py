@@ -0,0 +1,217 @@
+import re
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from rapidfuzz import fuzz, process
+
+from src.config.settings import ROSTER_MIN_SIMILARITY
+from src.localStore import get_document_store, get_profile_store, in_tenants
+from src.textUtils import fold_text
+
+
+# Palabras con mayúscula que no son nombres aunque no aparezcan en ningún CV
+NOT_NAMES = {"cv", "curriculum", "perfil", "perfiles", "usted", "ustedes", "senor", "senora", "sr", "sra", "ok", "hola", "gracias"}
+
+# Palabras de la pregunta que nunca se comparan contra el roster
+QUERY_STOPWORDS = {
+    "que", "cual", "cuales", "quien", "quienes", "como", "donde", "cuando", "cuanto", "cuantos", "con", "sin",
+    "por", "para", "del", "las", "los", "una", "uno", "sus", "tiene", "tienen", "sabe", "hizo", "esta", "este",
+}
+
+# Nombres de pila frecuentes (sin tildes): una palabra desconocida que empieza así es una persona
+FIRST_NAMES = {
+    "adriana", "agustin", "agustina", "alejandra", "alejandro", "alberto", "ana", "andrea", "andres", "antonio",
+    "beatriz", "camila", "carla", "carlos", "carolina", "catalina", "cecilia", "claudia", "cristian", "daniel",
+    "daniela", "diego", "eduardo", "elena", "emilia", "emiliano", "esteban", "eugenia", "facundo", "federico",
+    "fernanda", "fernando", "florencia", "francisco", "gabriel", "gabriela", "gonzalo", "guillermo", "gustavo",
+    "ignacio", "isabel", "javier", "jimena", "joaquin", "jorge", "jose", "juan", "julia", "julian", "juliana",
+    "laura", "leandro", "lorena", "lucas", "lucia", "luciana", "luis", "manuel", "marcela", "marcos", "maria",
+    "mariana", "martin", "martina", "mateo", "matias", "mercedes", "miguel", "monica", "natalia", "nicolas",
+    "pablo", "patricia", "paula", "pedro", "ricardo", "roberto", "rocio", "santiago", "sebastian", "silvia",
+    "sofia", "tomas", "valentin", "valentina", "valeria", "veronica", "victoria",
+}
+
+# Palabras que anteceden a un nombre de persona ("el candidato X", "la ingeniera X")
+PERSON_CUES = {
+    "candidato", "candidata", "postulante", "persona", "senor", "senora", "sr", "sra", "don", "dona",
+    "ingeniero", "ingeniera", "ing", "licenciado", "licenciada", "lic", "doctor", "doctora", "dr", "dra",
+}
+
+# Verbos que llevan "a" personal antes de una persona ("conoces a X", "compara a X")
+PERSON_VERBS = {
+    "conoces", "conoce", "conocen", "busca", "buscar", "busco", "compara", "comparar", "comparame",
+    "contratar", "contratarias", "evalua", "evaluar", "entrevistar", "recomendas", "recomiendas",
+}
+
+# Campos del perfil de los que sale el vocabulario (sin contacto: ciudades, nombres de terceros)
+PROFILE_VOCABULARY_FIELDS = ("experiencia", "empresas", "skills", "educacion", "certificaciones", "idiomas", "summary")
+
+
+class Roster:
+    """
+    Names of the people loaded in the local stores, for resolving mentions in a
+    query without the LLM or the person index.
+
+    Every name token (first name and last names, accent and case folded) maps to
+    the person_ids that carry it; mentions are matched token by token with
+    rapidfuzz, so small typos still resolve.
+    """
+    def __init__(self, records: List[Dict[str, Any]], vocabulary_texts: List[str]):
+        self.people: Dict[str, str] = {}
+        self.tokens: Dict[str, Set[str]] = {}
+        for record in records:
+            pid = str(record["person_id"])
+            name = " ".join(dict.fromkeys(f"{record.get('name', '')} {record.get('lastname', '')}".split()))
+            self.people[pid] = name
+            for token in fold_text(name).split():
+                if len(token) >= 3:
+                    self.tokens.setdefault(token, set()).add(pid)
+        self._choices = list(self.tokens)
+        # vocabulario de los CVs: una palabra con mayúscula que está acá es una tecnología, empresa, título...
+        self.vocabulary = {w for text in vocabulary_texts for w in re.findall(r"\w+", fold_text(text))}
+
+    def __len__(self) -> int:
+        return len(self.people)
+
+    def name_of(self, persona_id: str) -> str:
+        return self.people.get(str(persona_id), "")
+
+    def _token_match(self, word: str) -> Optional[tuple]:
+        if len(word) < 3 or word in QUERY_STOPWORDS or not self._choices:
+            return None
+        return process.extractOne(word, self._choices, scorer=fuzz.ratio, score_cutoff=ROSTER_MIN_SIMILARITY)
+
+    def match(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Mentions of roster people in the query.
+
+        Consecutive matching words form one mention ("Valentina Rodríguez").
+        Each candidate scores the summed similarity of its matched tokens, so a
+        first name alone ties between namesakes (and decide_disambiguation asks)
+        while first name + last name wins outright.
+
+        Args:
+            query (str): User query.
+
+        Returns:
+            List[Dict[str, Any]]: One {"text", "words", "candidates"} per mention, candidates
+            as {persona_id, name, score, source_name} sorted by score.
+        """
+        mentions: List[Dict[str, Any]] = []
+        last_index = -2
+        for index, m in enumerate(re.finditer(r"\w+", query)):
+            hit = self._token_match(fold_text(m.group()))
+            if not hit:
+                continue
+            token, similarity, _ = hit
+            if index != last_index + 1 or not mentions:
+                mentions.append({"words": [], "scores": {}})
+            mention = mentions[-1]
+            mention["words"].append(m.group())
+            for pid in self.tokens[token]:
+                # nombre + dos apellidos exactos = 1.0
+                mention["scores"][pid] = min(1.0, mention["scores"].get(pid, 0.0) + similarity / 300)
+            last_index = index
+
+        return [
+            {
+                "text": " ".join(mention["words"]),
+                "words": mention["words"],
+                "candidates": [
+                    {"persona_id": pid, "name": self.people[pid], "score": round(score, 3), "source_name": "[roster]"}
+                    for pid, score in sorted(mention["scores"].items(), key=lambda kv: (-kv[1], kv[0]))
+                ],
+            }
+            for mention in mentions
+        ]
+
+    def _unknown_spans(self, query: str, known_words: Sequence[str]) -> List[Tuple[int, List[str]]]:
+        """
+        Runs of capitalized words that are neither a roster name nor a word of
+        any loaded CV, as (index of the first word among the query tokens, words).
+        A capitalized word at the start of a sentence only counts if it is a
+        common first name.
+        """
+        known = {fold_text(w) for w in known_words}
+        spans: List[Tuple[int, List[str]]] = []
+        last_index = -2
+        for index, m in enumerate(re.finditer(r"\w+", query)):
+            word = m.group()
+            before = query[:m.start()].rstrip()
+            folded = fold_text(word)
+            sentence_start = not before or before[-1] in ".?!¿¡:;\"'«("
+            if (
+                word[0].isupper() and len(word) >= 3 and (not sentence_start or folded in FIRST_NAMES)
+                and folded not in known and folded not in NOT_NAMES
+                and folded not in self.vocabulary and not self._token_match(folded)
+            ):
+                if index == last_index + 1 and spans:
+                    spans[-1][1].append(word)
+                else:
+                    spans.append((index, [word]))
+                last_index = index
+        return spans
+
+    def unknown_names(self, query: str, known_words: Sequence[str] = ()) -> List[str]:
+        """
+        Capitalized words that are not in the roster nor in any loaded CV: a
+        person not in the roster, but just as well a technology or a company
+        ("Rust", "Mercado Libre"). Consecutive words are one name ("Zoraida Quispe").
+        """
+        return [" ".join(words) for _, words in self._unknown_spans(query, known_words)]
+
+    def unknown_people(self, query: str, known_words: Sequence[str] = ()) -> List[str]:
+        """
+        The unknown names that look like a person: the first word is a common
+        first name, or the name sits where a person goes ("el candidato Quispe",
+        "conoces a Quispe", "Valentina y Quispe" next to a roster name).
+        """
+        tokens = [fold_text(w) for w in re.findall(r"\w+", query)]
+        known = {fold_text(w) for w in known_words}
+        people = []
+        for index, words in self._unknown_spans(query, known_words):
+            prev = tokens[index - 1] if index >= 1 else ""
+            prev2 = tokens[index - 2] if index >= 2 else ""
+            if (
+                fold_text(words[0]) in FIRST_NAMES
+                or prev in PERSON_CUES
+                or (prev == "a" and prev2 in PERSON_VERBS)
+                or (prev in ("y", "e", "o", "vs") and prev2 in known)
+            ):
+                people.append(" ".join(words))
+        return people
+
+    def lookup(self, name: str) -> List[Dict[str, Any]]:
+        """Candidates for a single name (persona_id or mention), best first."""
+        if str(name) in self.people:
+            return [{"persona_id": str(name), "name": self.people[str(name)], "score": 1.0, "source_name": "[roster]"}]
+        mentions = self.match(name)
+        return mentions[0]["candidates"] if mentions else []
+
+
+# un roster por conjunto de tenants: (ids de personas con que se armó, roster)
+_rosters: Dict[tuple, tuple] = {}
+_roster_lock = threading.Lock()
+
+def get_roster(tenants: Sequence[str] = ("",)) -> Roster:
+    """
+    Roster of the tenants' people in the profile store (or the document store
+    if no profiles were extracted); rebuilt only when that set of people changes.
+    """
+    tenants = tuple(sorted(set(tenants)))
+    profiles = [r for r in get_profile_store().all() if in_tenants(r, tenants)]
+    records = profiles or [r for r in get_document_store().all() if in_tenants(r, tenants)]
+    key = tuple(sorted(str(r["person_id"]) for r in records))
+    cached = _rosters.get(tenants)
+    if cached is None or cached[0] != key:
+        with _roster_lock:
+            cached = _rosters.get(tenants)
+            if cached is None or cached[0] != key:
+                # sin perfiles extraídos, el texto completo de los CVs
+                texts = [
+                    json.dumps([r.get(k) for k in PROFILE_VOCABULARY_FIELDS], ensure_ascii=False)
+                    for r in profiles
+                ] or [r.get("text", "") for r in records]
+                cached = _rosters[tenants] = (key, Roster(records, texts))
+    return cached[1]
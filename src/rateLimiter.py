@@ -0,0 +1,367 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Sequence
+
+from src.config.settings import GROQ_REQUESTS_PER_MINUTE
+from src.config.settings import GROQ_TOKENS_PER_MINUTE
+from src.config.settings import RATE_LIMIT_STORE
+from src.config.settings import RATE_LIMIT_DB_PATH
+from src.config.settings import RATE_LIMIT_RESERVE
+from src.config.settings import RATE_LIMIT_MAX_WAIT_SECONDS
+from src.config.settings import RATE_LIMIT_MAX_RETRIES
+from src.textUtils import estimate_tokens
+
+
+# Clases de prioridad: menor rango = se atiende primero
+PRIORITIES = {"interactive": 0, "classification": 1, "batch": 2, "ingestion": 3}
+# Clases en segundo plano: no tocan la reserva y esperan lo que haga falta
+BACKGROUND = {"batch", "ingestion"}
+HEARTBEAT_SECONDS = 0.25    # cada cuánto re-chequea un waiter (y refresca su lugar en la cola)
+STALE_WAITER_SECONDS = 5.0  # un waiter que no se refresca (proceso muerto) deja de bloquear la cola
+
+
+class RateLimitTimeout(Exception):
+    """No se liberó cupo dentro de la espera máxima del llamador."""
+
+
+def request_tokens(messages: Sequence[Mapping[str, Any]], max_tokens: int) -> int:
+    """Tokens que puede consumir un pedido de chat: estimación del prompt más el tope de la completion."""
+    return sum(estimate_tokens(m.get("content") or "") for m in messages) + int(max_tokens)
+
+def tokens_used(response: Any) -> Optional[int]:
+    """Tokens totales reales de una completion sin streaming (None si la respuesta no trae usage)."""
+    return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+def retry_after(error: Exception, attempt: int) -> Optional[float]:
+    """Segundos a esperar después de un 429 del proveedor; None si el error no es de rate limit."""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", ""))
+    except (TypeError, ValueError):
+        return float(2 ** attempt)
+
+
+class _MemoryState:
+    """Estado de los buckets de este proceso; los waiters duermen en una condition y despiertan con cada liberación."""
+    def __init__(self):
+        self.cond = threading.Condition(threading.RLock())
+        self.state: Dict[str, Any] = {"levels": {}, "updated": None, "blocked_until": 0.0, "waiters": {}}
+
+    def held(self):
+        return self.cond
+
+    @contextmanager
+    def transact(self) -> Iterator[Dict[str, Any]]:
+        with self.cond:
+            yield self.state
+
+    def sleep(self, seconds: float) -> None:
+        with self.cond:
+            self.cond.wait(seconds)
+
+    def notify(self) -> None:
+        with self.cond:
+            self.cond.notify_all()
+
+
+class _SQLiteState:
+    """
+    Estado de los buckets en un SQLite compartido por todos los procesos
+    (workers del modo serve, load.py, batch.py). Cada lectura-escritura corre
+    en una transacción BEGIN IMMEDIATE; los waiters re-chequean cada
+    HEARTBEAT_SECONDS.
+    """
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH):
+        self.path = path
+        self._conn_obj: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # una conexión por proceso: no se comparte a través de un fork
+        if self._conn_obj is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters ("
+                "id TEXT PRIMARY KEY, priority INTEGER NOT NULL, since REAL NOT NULL, seen REAL NOT NULL)"
+            )
+            self._conn_obj, self._pid = conn, os.getpid()
+        return self._conn_obj
+
+    def held(self):
+        return nullcontext()
+
+    @contextmanager
+    def transact(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = {name: (level, updated) for name, level, updated in conn.execute("SELECT name, level, updated FROM buckets")}
+                state = {
+                    "levels": {k: v[0] for k, v in rows.items() if k != "blocked_until"},
+                    "updated": min((v[1] for k, v in rows.items() if k != "blocked_until"), default=None),
+                    "blocked_until": rows.get("blocked_until", (0.0, 0.0))[0],
+                    "waiters": {w: [p, s, seen] for w, p, s, seen in conn.execute("SELECT id, priority, since, seen FROM waiters")},
+                }
+                yield state
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                    [(k, v, state["updated"]) for k, v in state["levels"].items()] + [("blocked_until", state["blocked_until"], 0.0)],
+                )
+                conn.execute("DELETE FROM waiters")
+                conn.executemany(
+                    "INSERT INTO waiters (id, priority, since, seen) VALUES (?, ?, ?, ?)",
+                    [(w, *entry) for w, entry in state["waiters"].items()],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def notify(self) -> None:
+        pass
+
+
+class RateLimiter:
+    """
+    Token buckets de requests y tokens por minuto, compartidos por todas las
+    llamadas al LLM del proceso (o de todos los procesos, con store="sqlite").
+
+    Los llamadores esperan en una sola cola ordenada por clase de prioridad y
+    llegada, y solo la cabeza de la cola puede tomar cupo: una carga masiva
+    encolada antes cede el paso a un turno interactivo que llega después. Las
+    clases batch e ingestion además dejan intacta la `reserve` de cada bucket,
+    así un usuario en vivo encuentra cupo enseguida aunque una recarga sature
+    la cuota.
+    """
+    def __init__(
+        self,
+        requests_per_minute: float = GROQ_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = GROQ_TOKENS_PER_MINUTE,
+        store: str = RATE_LIMIT_STORE,
+        reserve: float = RATE_LIMIT_RESERVE,
+        max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS,
+        db_path: str = RATE_LIMIT_DB_PATH,
+    ):
+        # 0 = sin límite para ese bucket
+        self.capacity = {"requests": float(requests_per_minute), "tokens": float(tokens_per_minute)}
+        self.rate = {k: v / 60.0 for k, v in self.capacity.items()}
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.store = store
+        self._state = _SQLiteState(db_path) if store == "sqlite" else _MemoryState()
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            name: {"queued": 0, "max_queued": 0, "granted": 0, "timeouts": 0, "throttled": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for name in PRIORITIES
+        }
+
+    def _refill(self, state: Dict[str, Any], now: float) -> None:
+        if state["updated"] is None:
+            state["levels"] = dict(self.capacity)  # primer uso: buckets llenos
+        else:
+            elapsed = max(0.0, now - state["updated"])
+            for k, cap in self.capacity.items():
+                state["levels"][k] = min(cap, state["levels"].get(k, cap) + elapsed * self.rate[k])
+        state["updated"] = now
+
+    def _try_take(self, waiter_id: str, priority: str, cost: Dict[str, float], since: float) -> float:
+        """Toma el cupo si este waiter encabeza la cola y los buckets alcanzan; si no, segundos a esperar."""
+        with self._state.transact() as state:
+            now = time.time()
+            self._refill(state, now)
+            state["waiters"] = {w: e for w, e in state["waiters"].items() if now - e[2] <= STALE_WAITER_SECONDS}
+            state["waiters"][waiter_id] = [PRIORITIES[priority], since, now]
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            head = min(state["waiters"], key=lambda w: tuple(state["waiters"][w][:2]))
+            if head != waiter_id:
+                return HEARTBEAT_SECONDS
+
+            floor = self.reserve if priority in BACKGROUND else 0.0
+            wait = 0.0
+            for k, cap in self.capacity.items():
+                if cap <= 0:
+                    continue
+                # un pedido más grande que el bucket pasa con el bucket lleno (y deja deuda)
+                need = min(cost[k], cap * (1 - floor)) + cap * floor
+                if need > state["levels"][k]:
+                    wait = max(wait, (need - state["levels"][k]) / self.rate[k])
+            if wait > 0:
+                return wait
+            for k, cap in self.capacity.items():
+                if cap > 0:
+                    state["levels"][k] -= cost[k]
+            del state["waiters"][waiter_id]
+            return 0.0
+
+    def _leave(self, waiter_id: str) -> None:
+        with self._state.transact() as state:
+            state["waiters"].pop(waiter_id, None)
+        self._state.notify()
+
+    def _metric(self, priority: str, key: str, value: float = 1) -> None:
+        with self._metrics_lock:
+            self.metrics[priority][key] += value
+
+    def acquire(self, priority: str = "interactive", tokens: int = 0, max_wait: Optional[float] = None) -> float:
+        """
+        Bloquea hasta que haya un request y `tokens` tokens disponibles para la clase.
+
+        Args:
+            priority (str): "interactive" | "classification" | "batch" | "ingestion".
+            tokens (int): Tokens que puede consumir la llamada (ver request_tokens).
+            max_wait (float | None): Segundos antes de rendirse; por defecto
+                RATE_LIMIT_MAX_WAIT_SECONDS para interactive/classification y
+                sin límite para batch/ingestion.
+
+        Returns:
+            float: Segundos esperados.
+
+        Raises:
+            RateLimitTimeout: Si el cupo no se liberó dentro de max_wait.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        if max_wait is None and priority not in BACKGROUND:
+            max_wait = self.max_wait
+        waiter_id, cost = uuid.uuid4().hex, {"requests": 1.0, "tokens": float(tokens)}
+        t0 = time.time()
+        with self._metrics_lock:
+            m = self.metrics[priority]
+            m["queued"] += 1
+            m["max_queued"] = max(m["max_queued"], m["queued"])
+
+        granted = False
+        try:
+            with self._state.held():
+                while True:
+                    wait = self._try_take(waiter_id, priority, cost, t0)
+                    if wait <= 0:
+                        granted = True
+                        break
+                    if max_wait is not None and time.time() - t0 >= max_wait:
+                        self._metric(priority, "timeouts")
+                        raise RateLimitTimeout(f"{priority} call waited {max_wait:g}s for the LLM quota")
+                    self._state.sleep(min(wait, HEARTBEAT_SECONDS))
+        finally:
+            self._metric(priority, "queued", -1)
+            if granted:
+                self._state.notify()  # el siguiente de la cola pasa a ser la cabeza
+            else:
+                self._leave(waiter_id)
+
+        waited_ms = (time.time() - t0) * 1000
+        with self._metrics_lock:
+            m["granted"] += 1
+            m["wait_ms_total"] += waited_ms
+            m["wait_ms_max"] = max(m["wait_ms_max"], waited_ms)
+        return waited_ms / 1000
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Devuelve la parte no usada de una reserva de tokens cuando se conoce el consumo real."""
+        if self.capacity["tokens"] <= 0 or used >= reserved:
+            return
+        with self._state.transact() as state:
+            self._refill(state, time.time())
+            state["levels"]["tokens"] = min(self.capacity["tokens"], state["levels"]["tokens"] + reserved - used)
+        self._state.notify()
+
+    def penalize(self, seconds: float) -> None:
+        """Frena todas las clases por `seconds` (el proveedor respondió 429 con Retry-After)."""
+        with self._state.transact() as state:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        priority: str = "interactive",
+        tokens: int = 0,
+        used: Optional[Callable[[Any], Optional[int]]] = tokens_used,
+        retries: int = RATE_LIMIT_MAX_RETRIES,
+        max_wait: Optional[float] = None,
+    ) -> Any:
+        """
+        Corre fn bajo el limiter: espera cupo, reintenta los 429 después de su
+        Retry-After (frenando mientras tanto a todas las clases) y devuelve los
+        tokens no usados (todos, si el intento falla).
+
+        Args:
+            fn (Callable): La llamada al proveedor.
+            priority (str): Clase de prioridad de la llamada.
+            tokens (int): Tokens reservados para la llamada (ver request_tokens).
+            used (Callable | None): Lee el consumo real de tokens del resultado de fn.
+            retries (int): Reintentos ante un 429.
+            max_wait (float | None): Espera máxima por cupo en cada intento (ver acquire).
+
+        Returns:
+            Any: El resultado de fn.
+        """
+        for attempt in range(retries + 1):
+            self.acquire(priority, tokens, max_wait)
+            try:
+                result = fn()
+            except Exception as e:
+                # el intento fallido no consumió la completion: se devuelve lo reservado
+                self.settle(tokens, 0)
+                backoff = retry_after(e, attempt)
+                if backoff is None or attempt == retries:
+                    raise
+                self._metric(priority, "throttled")
+                self.penalize(backoff)
+                continue
+            actual = used(result) if used else None
+            if actual is not None:
+                self.settle(tokens, actual)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Nivel de los buckets, waiters por clase (de todos los procesos con store="sqlite") y contadores de este proceso."""
+        with self._state.transact() as state:
+            now = time.time()
+            self._refill(state, now)
+            levels = {k: round(v, 1) for k, v in state["levels"].items()}
+            ranks = [e[0] for e in state["waiters"].values() if now - e[2] <= STALE_WAITER_SECONDS]
+            blocked = max(0.0, state["blocked_until"] - now)
+        with self._metrics_lock:
+            classes = {
+                name: {**m, "wait_ms_mean": round(m["wait_ms_total"] / m["granted"], 2) if m["granted"] else 0.0}
+                for name, m in self.metrics.items()
+            }
+        return {
+            "store": self.store,
+            "capacity": self.capacity,
+            "levels": levels,
+            "blocked_s": round(blocked, 2),
+            "waiting": {name: ranks.count(rank) for name, rank in PRIORITIES.items()},
+            "classes": classes,
+        }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Rate limiter de Groq del proceso (singleton lazy)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
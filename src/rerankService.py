@@ -0,0 +1,182 @@
+import re
+import time
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.config.settings import RERANKER
+from src.config.settings import RERANK_MODEL
+from src.config.settings import RERANK_BATCH_SIZE
+from src.config.settings import RERANK_BUDGET_MS
+from src.config.settings import RERANK_DENSE_WEIGHT
+from src.textUtils import fold_text
+
+
+# Palabras vacías (ya sin tildes) que no aportan al score léxico
+STOPWORDS = {
+    "que", "cual", "cuales", "quien", "como", "donde", "cuando", "cuanto", "cuantos", "con", "sin", "por", "para",
+    "del", "las", "los", "una", "uno", "unos", "unas", "sus", "este", "esta", "esto", "ese", "esa", "tiene", "tienen",
+    "tuvo", "hay", "sobre", "entre", "desde", "hasta", "mas", "muy", "pero", "son", "fue", "ser", "sabe", "and", "the",
+}
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    span = float(values.max() - values.min()) if len(values) else 0.0
+    return (values - values.min()) / span if span > 0 else np.zeros_like(values)
+
+
+class Reranker:
+    """
+    Scores candidate chunks against the query on CPU.
+
+    score() may stop early once the deadline passes; chunks it did not reach
+    get NaN and keep their dense order after the scored ones.
+    """
+    name: str = ""
+
+    def score(self, query: str, texts: Sequence[str], dense: np.ndarray, deadline: float) -> np.ndarray:
+        raise NotImplementedError
+
+
+class LexicalReranker(Reranker):
+    """
+    BM25 over the candidate set (IDF from the candidates themselves) blended
+    with the dense score. Terms are accent-folded 6-character prefixes, a cheap
+    stemmer for Spanish inflections (desarrollo / desarrollador).
+    """
+    name = "lexical"
+
+    def __init__(self, dense_weight: float = RERANK_DENSE_WEIGHT, k1: float = 1.2, b: float = 0.75):
+        self.dense_weight = dense_weight
+        self.k1 = k1
+        self.b = b
+
+    @staticmethod
+    def terms(text: str) -> List[str]:
+        return [w[:6] for w in re.findall(r"\w+", fold_text(text)) if len(w) >= 3 and w not in STOPWORDS]
+
+    def score(self, query: str, texts: Sequence[str], dense: np.ndarray, deadline: float) -> np.ndarray:
+        vocab = {t: i for i, t in enumerate(dict.fromkeys(self.terms(query)))}
+        if not vocab:
+            return dense.astype(np.float32)
+
+        # matriz de frecuencias (docs x términos de la query), armada de una vez con np.add.at
+        tf = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            doc_terms = self.terms(text)
+            lengths[row] = len(doc_terms)
+            for t in doc_terms:
+                col = vocab.get(t)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        np.add.at(tf, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), 1.0)
+
+        n = len(texts)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(1.0, float(lengths.mean())))
+        bm25 = ((tf * (self.k1 + 1)) / (tf + norm[:, None])) @ idf
+        return (1 - self.dense_weight) * _minmax(bm25) + self.dense_weight * _minmax(dense.astype(np.float32))
+
+
+class CrossEncoderReranker(Reranker):
+    """Small local cross-encoder on CPU (requires the optional sentence-transformers package)."""
+    name = "cross-encoder"
+
+    def __init__(self, model: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE):
+        try:
+            from sentence_transformers import CrossEncoder  # type: ignore[import-not-found]
+        except ImportError as e:
+            raise ImportError("RERANKER='cross-encoder' requires sentence-transformers: uv add sentence-transformers") from e
+
+        self.model = CrossEncoder(model, device="cpu")
+        self.batch_size = batch_size
+
+    def score(self, query: str, texts: Sequence[str], dense: np.ndarray, deadline: float) -> np.ndarray:
+        out = np.full(len(texts), np.nan, dtype=np.float32)
+        # en orden denso: si se acaba el presupuesto, quedan sin puntuar los menos prometedores
+        for s in range(0, len(texts), self.batch_size):
+            if time.perf_counter() > deadline:
+                break
+            batch = [(query, t) for t in texts[s:s + self.batch_size]]
+            out[s:s + len(batch)] = self.model.predict(batch, batch_size=self.batch_size, show_progress_bar=False)
+        return out
+
+
+def build_reranker(kind: str = RERANKER) -> Optional[Reranker]:
+    """Reranker by name: "none" | "lexical" | "cross-encoder"."""
+    if kind == "none":
+        return None
+    if kind == "lexical":
+        return LexicalReranker()
+    if kind == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown RERANKER: {kind}")
+
+
+def rerank_order(
+    reranker: Optional[Reranker],
+    query: str,
+    texts: Sequence[str],
+    dense: Sequence[float],
+    budget_ms: float = RERANK_BUDGET_MS,
+) -> tuple[np.ndarray, Dict[str, object]]:
+    """
+    New order of the candidates, best first.
+
+    Args:
+        reranker (Reranker | None): Scorer; None keeps the dense order.
+        query (str): User query.
+        texts (Sequence[str]): Candidate chunk texts, in dense order.
+        dense (Sequence[float]): Dense retrieval scores of the candidates.
+        budget_ms (float): Latency budget; past it the unscored tail keeps its dense order.
+
+    Returns:
+        tuple[np.ndarray, Dict[str, object]]: (indices into texts, info for the trace:
+        reranker, ms, scored, fallback).
+    """
+    n = len(texts)
+    dense_scores = np.asarray(dense, dtype=np.float32)
+    dense_order = np.argsort(-dense_scores, kind="stable")
+    info: Dict[str, object] = {"reranker": reranker.name if reranker else "none", "ms": 0.0, "scored": 0, "fallback": None}
+    if reranker is None or n < 2:
+        return dense_order, info
+
+    t0 = time.perf_counter()
+    texts = [texts[int(i)] for i in dense_order]
+    try:
+        scores = reranker.score(query, texts, dense_scores[dense_order], deadline=t0 + budget_ms / 1000)
+    except Exception as e:
+        info.update(ms=round((time.perf_counter() - t0) * 1000, 2), fallback=f"error: {e}")
+        return dense_order, info
+
+    scored = ~np.isnan(scores)
+    info["scored"] = int(scored.sum())
+    if not scored.all():
+        info["fallback"] = "budget"
+    positions = np.arange(n)
+    # puntuados por score; el resto detrás, en orden denso
+    order = np.concatenate([
+        positions[scored][np.argsort(-scores[scored], kind="stable")],
+        positions[~scored],
+    ])
+    info["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return dense_order[order], info
+
+
+_reranker: Optional[Reranker] = None
+_reranker_loaded = False
+_reranker_lock = threading.Lock()
+
+def get_reranker() -> Optional[Reranker]:
+    """Get the process-wide reranker (lazy singleton; None when RERANKER='none')."""
+    global _reranker, _reranker_loaded
+    if not _reranker_loaded:
+        with _reranker_lock:
+            if not _reranker_loaded:
+                _reranker, _reranker_loaded = build_reranker(), True
+    return _reranker
@@ -0,0 +1,81 @@
+"""
+Hooks del modo serve (gunicorn.conf.py): el master carga y calienta todo una
+sola vez antes del fork y cada worker solo re-crea lo que no puede compartirse
+(clientes HTTP y conexiones SQLite). Por eso un HUP al master no recarga el
+código ni las cachés: ver gunicorn.conf.py para desplegar código nuevo.
+"""
+import os
+import time
+from typing import Any, Dict
+
+import src.agent as agent
+import src.vectorService as vector_service
+import src.embeddingService as embedding_service
+from src.rerankService import get_reranker
+from src.rateLimiter import get_rate_limiter
+from src.localStore import get_document_store, get_profile_store
+from src.config.settings import PINECONE_INDEX
+from src.config.settings import PINECONE_PERSONA_INDEX
+from src.config.settings import VECTOR_BACKEND
+
+STARTED_AT = time.time()
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Loads everything a turn needs so forked workers inherit it (copy-on-write):
+    compiled graph, document/profile stores (roster of names), vector index
+    handles, the sentence tokenizer, the reranker and, for the local backend,
+    the embedding model and memory-mapped indexes.
+    """
+    t0 = time.perf_counter()
+    agent.init_app()
+    people = len(get_profile_store().all()) or len(get_document_store().all())
+
+    warnings = []
+    try:
+        for index_name in (PINECONE_INDEX, PINECONE_PERSONA_INDEX):
+            vector_service.get_or_create_index(index_name=index_name)
+        if VECTOR_BACKEND == "local":
+            embedding_service.get_embedding_service()
+    except Exception as e:
+        # no es fatal: cada worker vuelve a intentarlo en su primera búsqueda
+        warnings.append(f"vector index warm-up failed: {e}")
+
+    try:
+        get_reranker()  # con cross-encoder, el modelo queda cargado antes del fork
+    except Exception as e:
+        warnings.append(f"reranker warm-up failed: {e}")
+
+    try:
+        vector_service.nltk.sent_tokenize("Calentamiento. Listo.", language="spanish")
+    except LookupError:
+        pass  # sin punkt descargado: lo resuelve la primera ingesta
+
+    return {"people": people, "seconds": round(time.perf_counter() - t0, 2), "warnings": warnings}
+
+def reset_after_fork() -> None:
+    """
+    Per-worker re-initialization: HTTP clients (Groq, Pinecone) and the graph
+    checkpointer connection are re-created; SQLite stores reconnect lazily per pid.
+    """
+    from groq import Groq
+
+    agent.groq_client = Groq(api_key=agent.GROQ_API_KEY, max_retries=0)
+    vector_service.reset_clients()
+    embedding_service.reset_clients()
+
+    # el grafo compilado se reconstruye para que el checkpointer abra su propia conexión
+    agent.app = None
+    agent.init_app()
+
+def health() -> Dict[str, Any]:
+    """Liveness/readiness info for the /health endpoint."""
+    return {
+        "status": "ok" if agent.app is not None else "starting",
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - STARTED_AT, 1),
+        "people": len(get_profile_store().all()) or len(get_document_store().all()),
+        "search_cache": {**vector_service.search_cache.stats, "shards": vector_service.search_cache.sizes()},
+        "rate_limit": get_rate_limiter().stats(),
+    }
@@ -0,0 +1,171 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from src.config.settings import SESSION_DB_PATH
+from src.textUtils import fold_text
+
+
+T = TypeVar("T")
+
+
+class SQLiteSessionDB:
+    """
+    SQLite file shared by every serving process. Each process (and each fork)
+    opens its own connection on first use; WAL lets readers and one writer
+    work concurrently.
+    """
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            "session_id TEXT NOT NULL, persona_id TEXT NOT NULL, messages TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, persona_id))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "session_id TEXT NOT NULL, persona_id TEXT NOT NULL, summary TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, persona_id))"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS last_persona (session_id TEXT PRIMARY KEY, persona_id TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS aliases ("
+            "session_id TEXT NOT NULL, mention TEXT NOT NULL, persona_id TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, mention))"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS pending_aliases (session_id TEXT PRIMARY KEY, mentions TEXT NOT NULL)")
+        return conn
+
+    def execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                self._conn, self._pid = self._connect(), os.getpid()
+            return self._conn.execute(sql, params).fetchall()
+
+    def run_in_transaction(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Corre fn(conn) en un BEGIN IMMEDIATE: lo que lee y escribe no se intercala con otro escritor."""
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                self._conn, self._pid = self._connect(), os.getpid()
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def transaction(self, statements: List[tuple]) -> None:
+        def run(conn: sqlite3.Connection) -> None:
+            for sql, params in statements:
+                conn.execute(sql, params)
+        self.run_in_transaction(run)
+
+
+class SQLiteShortMemory:
+    """ShortMemory with the same interface, persisted in the shared session DB."""
+    def __init__(self, db: SQLiteSessionDB, max_turns: Optional[int] = 4):
+        self.db = db
+        self.max_turns = max_turns
+
+    def get(self, session_id: str, persona_id: str) -> List[Dict[str, str]]:
+        rows = self.db.execute(
+            "SELECT messages FROM memory WHERE session_id = ? AND persona_id = ?", (session_id, str(persona_id))
+        )
+        return json.loads(rows[0][0]) if rows else []
+
+    def get_summary(self, session_id: str, persona_id: str) -> str:
+        rows = self.db.execute(
+            "SELECT summary FROM summaries WHERE session_id = ? AND persona_id = ?", (session_id, str(persona_id))
+        )
+        return rows[0][0] if rows else ""
+
+    def fold(self, session_id: str, persona_id: str, folded: List[Dict[str, str]], summary: str) -> bool:
+        """Reemplaza los mensajes `folded` (prefijo del buffer) por el resumen; False si el buffer cambió."""
+        buf = self.get(session_id, persona_id)
+        if not folded or buf[:len(folded)] != folded:
+            return False
+        # update condicional: si otro proceso escribió el buffer entremedio, no se pisa
+        self.db.transaction([
+            (
+                "UPDATE memory SET messages = ? WHERE session_id = ? AND persona_id = ? AND messages = ?",
+                (json.dumps(buf[len(folded):], ensure_ascii=False), session_id, str(persona_id), json.dumps(buf, ensure_ascii=False)),
+            ),
+            (
+                "INSERT OR REPLACE INTO summaries SELECT ?, ?, ? WHERE changes() = 1",
+                (session_id, str(persona_id), summary),
+            ),
+        ])
+        return self.get_summary(session_id, persona_id) == summary
+
+    def last_persona(self, session_id: str) -> Optional[str]:
+        rows = self.db.execute("SELECT persona_id FROM last_persona WHERE session_id = ?", (session_id,))
+        return rows[0][0] if rows else None
+
+    def append(self, session_id: str, persona_id: str, user_msg: str, assistant_msg: str):
+        # lectura y escritura en la misma transacción: un fold concurrente no pierde ni repite turnos
+        def run(conn: sqlite3.Connection) -> None:
+            rows = conn.execute(
+                "SELECT messages FROM memory WHERE session_id = ? AND persona_id = ?", (session_id, str(persona_id))
+            ).fetchall()
+            buf = json.loads(rows[0][0]) if rows else []
+            buf.append({"role": "user", "content": user_msg})
+            buf.append({"role": "assistant", "content": assistant_msg})
+            # recortar a los últimos max_turns*2 (porque cada turno son 2 mensajes)
+            # (sin tope en modo "summary": los turnos viejos solo salen con fold)
+            if self.max_turns is not None:
+                buf = buf[-self.max_turns * 2:]
+            conn.execute(
+                "INSERT OR REPLACE INTO memory VALUES (?, ?, ?)",
+                (session_id, str(persona_id), json.dumps(buf, ensure_ascii=False)),
+            )
+            conn.execute("INSERT OR REPLACE INTO last_persona VALUES (?, ?)", (session_id, str(persona_id)))
+        self.db.run_in_transaction(run)
+
+    def reset_if_person_changed(self, session_id: str, new_persona_id: str):
+        last = self.last_persona(session_id)
+        if last is not None and last != str(new_persona_id):
+            # limpiar todas las memorias (y resúmenes) de esa sesión
+            self.db.transaction([
+                ("DELETE FROM memory WHERE session_id = ?", (session_id,)),
+                ("DELETE FROM summaries WHERE session_id = ?", (session_id,)),
+            ])
+
+
+class SQLiteAliasCache:
+    """AliasCache with the same interface, persisted in the shared session DB."""
+    def __init__(self, db: SQLiteSessionDB):
+        self.db = db
+
+    def get(self, session_id: str, mention: str) -> str | None:
+        rows = self.db.execute(
+            "SELECT persona_id FROM aliases WHERE session_id = ? AND mention = ?", (session_id, fold_text(mention))
+        )
+        return rows[0][0] if rows else None
+
+    def remember(self, session_id: str, mentions: List[str], persona_id: str):
+        self.db.transaction([
+            ("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)", (session_id, fold_text(m), str(persona_id)))
+            for m in mentions if fold_text(m)
+        ])
+
+    def set_pending(self, session_id: str, mentions: List[str]):
+        self.db.execute("INSERT OR REPLACE INTO pending_aliases VALUES (?, ?)", (session_id, json.dumps(list(mentions))))
+
+    def pop_pending(self, session_id: str) -> List[str]:
+        rows = self.db.execute("DELETE FROM pending_aliases WHERE session_id = ? RETURNING mentions", (session_id,))
+        return json.loads(rows[0][0]) if rows else []
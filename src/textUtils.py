@@ -0,0 +1,43 @@
+import re
+import unicodedata
+
+
+# Aproximación para modelos tipo llama sobre texto en español
+CHARS_PER_TOKEN = 3.5
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a raw CV text: unifies line breaks, trims every line,
+    collapses inner whitespace and drops blank lines.
+
+    Args:
+        text (str): Raw document text.
+
+    Returns:
+        str: Normalized text.
+    """
+    text = unicodedata.normalize("NFC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (sin tokenizer externo)."""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Recorta el texto para que estimate_tokens no pase de max_tokens."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, int((max_tokens - 1) * CHARS_PER_TOKEN) - 1)].rstrip() + "…"
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas, sin tildes y con espacios colapsados (para comparar texto libre)."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", stripped.lower()).strip()
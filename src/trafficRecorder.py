@@ -0,0 +1,328 @@
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from src.config.settings import TRAFFIC_RECORD
+from src.config.settings import TRAFFIC_RECORD_PATH
+from src.config.settings import TRAFFIC_SAMPLE_RATE
+from src.config.settings import TRAFFIC_REDACT_PII
+
+
+# Turno en curso (None = no se graba) y marca de llamada grabada en curso: lo que una
+# llamada grabada hace por dentro (search_shards -> search_similar) no se graba dos veces
+_current_turn: ContextVar[Optional[Dict[str, Any]]] = ContextVar("traffic_turn", default=None)
+_in_recorded_call: ContextVar[bool] = ContextVar("traffic_in_call", default=False)
+
+# Argumentos que no cambian la respuesta (prints de debug, timeout del presupuesto del turno)
+IGNORED_ARGS = {"debug", "ui", "timeout"}
+
+def _phone(match: re.Match) -> str:
+    # 8+ dígitos; los rangos de años ("2010 - 2016") no son teléfonos
+    groups = re.findall(r"\d+", match.group(0))
+    if sum(len(g) for g in groups) < 8 or all(len(g) == 4 and g[:2] in ("19", "20") for g in groups):
+        return match.group(0)
+    return "<phone>"
+
+PII_PATTERNS: List[tuple] = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"(?:https?://)?(?:www\.)?(?:linkedin|github)\.com/[\w/.-]+", flags=re.IGNORECASE), "<url>"),
+    (re.compile(r"\b\d{1,2}\.\d{3}\.\d{3}\b"), "<dni>"),
+    (re.compile(r"\+?\d[\d\s().-]{6,}\d"), _phone),
+]
+
+
+def redact_pii(text: str) -> str:
+    """Reemplaza emails, URLs de perfiles, DNIs y teléfonos por placeholders."""
+    for pattern, placeholder in PII_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+# Hooks de redacción: cada uno recibe y devuelve un string (add_redactor suma los propios)
+REDACTORS: List[Callable[[str], str]] = [redact_pii] if TRAFFIC_REDACT_PII else []
+
+def add_redactor(fn: Callable[[str], str]) -> None:
+    """Registra un hook de redacción extra, que se aplica a cada string de una grabación."""
+    REDACTORS.append(fn)
+
+def redact(obj: Any) -> Any:
+    """Aplica los hooks de redacción a cada string dentro de obj (dicts, listas, tuplas)."""
+    if isinstance(obj, str):
+        for fn in REDACTORS:
+            obj = fn(obj)
+        return obj
+    if isinstance(obj, dict):
+        return {k: redact(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [redact(v) for v in obj]
+    return obj
+
+def jsonable(obj: Any) -> Any:
+    """Tipos JSON planos a partir de respuestas de los SDKs (hits de Pinecone, escalares numpy, Command, ...)."""
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [jsonable(v) for v in obj]
+    if hasattr(obj, "to_dict"):
+        return jsonable(obj.to_dict())
+    if hasattr(obj, "keys") and hasattr(obj, "__getitem__"):
+        return {str(k): jsonable(obj[k]) for k in obj.keys()}
+    if hasattr(obj, "item"):
+        return obj.item()  # escalares de numpy
+    if hasattr(obj, "_asdict"):
+        return jsonable(obj._asdict())
+    return str(obj)
+
+def call_request(fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Argumentos de una llamada por nombre (con los defaults aplicados), sin los de IGNORED_ARGS."""
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {k: v for k, v in bound.arguments.items() if k not in IGNORED_ARGS}
+
+def request_key(fn_name: str, request: Dict[str, Any]) -> str:
+    """Identidad estable de una llamada, para emparejar una llamada del replay con su grabación."""
+    payload = json.dumps([fn_name, jsonable(redact(request))], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _JSONLLog:
+    """Una línea JSON por turno; cada registro es un solo write() sobre un archivo abierto en modo append."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class _SQLiteLog:
+    """Turnos en un archivo SQLite, compartido por todos los workers del modo serve."""
+    def __init__(self, path: str):
+        self.path = path
+        self._conn_obj: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # una conexión por proceso: no se comparte a través de un fork
+        if self._conn_obj is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "turn_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, t REAL NOT NULL, record TEXT NOT NULL)"
+            )
+            self._conn_obj, self._pid = conn, os.getpid()
+        return self._conn_obj
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO turns (turn_id, session_id, t, record) VALUES (?, ?, ?, ?)",
+                    (record["turn_id"], record["session_id"], record["t"], json.dumps(record, ensure_ascii=False)),
+                )
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM turns ORDER BY t").fetchall()
+        for (record,) in rows:
+            yield json.loads(record)
+
+
+def open_log(path: str) -> _JSONLLog | _SQLiteLog:
+    """Log de tráfico según la extensión: .sqlite / .db -> SQLite, cualquier otra -> JSONL."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return _SQLiteLog(path) if path.endswith((".sqlite", ".db")) else _JSONLLog(path)
+
+def read_traffic(path: str) -> List[Dict[str, Any]]:
+    """Turnos grabados de un log, en orden de inicio."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} does not exist.")
+    return sorted(open_log(path).read(), key=lambda r: r["t"])
+
+
+class TrafficRecorder:
+    """
+    Graba, por cada turno muestreado, todas las llamadas a las funciones
+    envueltas (Groq y el índice vectorial) con sus argumentos, respuesta,
+    offset de inicio y duración.
+
+    El muestreo es por sesión (hash del session_id): una conversación
+    muestreada se graba entera y se puede reproducir en orden. Todo pasa por
+    los hooks de redacción antes de escribirse.
+    """
+    def __init__(self, path: str = TRAFFIC_RECORD_PATH, sample_rate: float = TRAFFIC_SAMPLE_RATE, enabled: bool = TRAFFIC_RECORD):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._log: Optional[_JSONLLog | _SQLiteLog] = None
+        self._log_lock = threading.Lock()
+
+    def sampled(self, session_id: str) -> bool:
+        if not self.enabled or self.sample_rate <= 0:
+            return False
+        bucket = int(hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.sample_rate
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        log = self._log
+        if log is None:
+            with self._log_lock:
+                if self._log is None:
+                    self._log = open_log(self.path)
+                log = self._log
+        log.write(record)
+
+    @contextmanager
+    def turn(self, session_id: str, entry: str, payload: Any, **meta: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Alcance de un turno del grafo. Las llamadas hechas adentro (en este
+        thread o en cualquiera que copie el contexto) quedan en el turno; el
+        llamador puede poner "answer" en el dict que recibe. El registro se
+        escribe al salir del alcance.
+
+        Args:
+            session_id (str): Sesión (thread_id del grafo).
+            entry (str): Entrada que debe usar el replay: "invoke" | "stream".
+            payload (Any): Input del grafo (dict o Command).
+            **meta: Campos extra que se guardan tal cual (p.ej. stream_tokens).
+        """
+        if not self.sampled(session_id):
+            yield {}
+            return
+
+        turn: Dict[str, Any] = {
+            "turn_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "entry": entry,
+            "payload": redact(jsonable(payload)),
+            "t": time.time(),
+            "calls": [],
+            **meta,
+        }
+        t0 = time.perf_counter()
+        turn["_t0"] = t0
+        token = _current_turn.set(turn)
+        try:
+            yield turn
+        except Exception as e:
+            turn["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            try:
+                _current_turn.reset(token)
+            except ValueError:
+                pass  # generador (stream_turn) cerrado desde otro contexto
+            turn.pop("_t0", None)
+            turn["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            if "answer" in turn:
+                turn["answer"] = redact(turn["answer"])
+            # una llamada especulativa descartada puede seguir corriendo: se copia la lista
+            turn["calls"] = sorted(list(turn["calls"]), key=lambda c: c["t_ms"])
+            try:
+                self._write(turn)
+            except Exception as e:
+                # grabar nunca rompe un turno
+                print(f"[warn] traffic recorder: {e}")
+
+
+def _add_call(turn: Dict[str, Any], fn_name: str, request: Dict[str, Any], t0: float, result: Any, error: str | None, **extra: Any) -> None:
+    call = {
+        "fn": fn_name,
+        "key": request_key(fn_name, request),
+        "request": redact(jsonable(request)),
+        "t_ms": round((t0 - turn["_t0"]) * 1000, 2) if "_t0" in turn else 0.0,
+        "ms": round((time.perf_counter() - t0) * 1000, 2),
+        "result": redact(jsonable(result)),
+        **extra,
+    }
+    if error:
+        call["error"] = error
+    turn["calls"].append(call)
+
+def recorded(fn: Callable) -> Callable:
+    """
+    Graba las llamadas a fn hechas dentro de un TrafficRecorder.turn; fuera de
+    uno solo cuesta leer una ContextVar. Las funciones generadoras (streams de
+    tokens) se graban como la lista de deltas con el offset de cada uno.
+    """
+    fn_name = fn.__name__
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            turn = _current_turn.get()
+            if turn is None or _in_recorded_call.get():
+                yield from fn(*args, **kwargs)
+                return
+            request = call_request(fn, args, kwargs)
+            t0 = time.perf_counter()
+            deltas, offsets, error = [], [], None
+            try:
+                for delta in fn(*args, **kwargs):
+                    deltas.append(delta)
+                    offsets.append(round((time.perf_counter() - t0) * 1000, 2))
+                    yield delta
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                _add_call(turn, fn_name, request, t0, deltas, error, delta_ms=offsets)
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        turn = _current_turn.get()
+        if turn is None or _in_recorded_call.get():
+            return fn(*args, **kwargs)
+        request = call_request(fn, args, kwargs)
+        token = _in_recorded_call.set(True)
+        t0 = time.perf_counter()
+        result, error = None, None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _in_recorded_call.reset(token)
+            _add_call(turn, fn_name, request, t0, result, error)
+    return wrapper
+
+
+_traffic_recorder: Optional[TrafficRecorder] = None
+_traffic_recorder_lock = threading.Lock()
+
+def get_traffic_recorder() -> TrafficRecorder:
+    """Grabador de tráfico del proceso (singleton lazy; apagado salvo con TRAFFIC_RECORD)."""
+    global _traffic_recorder
+    if _traffic_recorder is None:
+        with _traffic_recorder_lock:
+            if _traffic_recorder is None:
+                _traffic_recorder = TrafficRecorder()
+    return _traffic_recorder
@@ -1,9 +1,14 @@
 import os
+import re
 import sys
+import json
 import nltk
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pinecone import Pinecone
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from src.config.settings import PINECONE_INDEX
 from src.config.settings import PINECONE_PERSONA_INDEX
@@ -11,6 +16,19 @@ from src.config.settings import PINECONE_API_KEY
 from src.config.settings import PINECONE_NAMESPACE
 from src.config.settings import PINECONE_TOPK_SEARCH
 from src.config.settings import PINECONE_EMBEDDING_MODEL
+from src.config.settings import VECTOR_BACKEND
+from src.config.settings import EMBEDDING_BATCH_SIZE
+from src.config.settings import INDEX_GRANULARITY
+from src.config.settings import CHUNK_SIZE
+from src.config.settings import CHUNK_OVERLAP
+from src.config.settings import SENTENCE_UNIT_MIN_CHARS
+from src.config.settings import TENANT
+from src.config.settings import TENANT_SEARCH_WORKERS
+from src.config.settings import SEARCH_CACHE_SIZE
+from src.config.settings import SEARCH_CACHE_TTL_SECONDS
+from src.embeddingService import get_embedding_service
+from src.textUtils import normalize_text
+from src.trafficRecorder import recorded
 
 
 nltk.download('punkt')
@@ -20,10 +38,15 @@ pc = Pinecone(api_key=PINECONE_API_KEY)
 dense_index: Optional[object] = None
 persona_dense_index: Optional[object] = None
 
-def get_or_create_index(index_name: str = PINECONE_INDEX) -> object:
-    """Get the index, creating it if it doesn't exist"""
+def get_or_create_index(index_name: str = PINECONE_INDEX) -> Any:
+    """Get the index, creating it if it doesn't exist (Pinecone index, or LocalIndex with VECTOR_BACKEND="local")"""
     global dense_index
     global persona_dense_index
+
+    if VECTOR_BACKEND == "local":
+        from src.localVectorStore import get_local_index
+        text_field = "canonical_name" if index_name == PINECONE_PERSONA_INDEX else "chunk_text"
+        return get_local_index(index_name, text_field)
     
     if index_name == PINECONE_PERSONA_INDEX:
         if persona_dense_index is None:
@@ -63,6 +86,99 @@ def get_or_create_index(index_name: str = PINECONE_INDEX) -> object:
     
     return dense_index
 
+def reset_clients() -> None:
+    """
+    Re-creates the Pinecone client and index handles (their HTTP connection
+    pools must not be shared across a fork). Local indexes are fork-safe.
+    """
+    global pc
+    global dense_index
+    global persona_dense_index
+
+    if VECTOR_BACKEND == "local":
+        return
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    if dense_index is not None:
+        dense_index = pc.Index(PINECONE_INDEX)
+    if persona_dense_index is not None:
+        persona_dense_index = pc.Index(PINECONE_PERSONA_INDEX)
+
+# ========= Tenants (un shard = un namespace en cada índice) =========
+def tenant_namespace(tenant: Optional[str] = None) -> str:
+    """
+    Namespace (shard) of a tenant in both indexes.
+
+    Args:
+        tenant (str | None): Client company id; None uses TENANT and "" the
+            original shared namespace.
+
+    Returns:
+        str: PINECONE_NAMESPACE for the default pool, PINECONE_NAMESPACE__<tenant> otherwise.
+    """
+    tenant = TENANT if tenant is None else tenant.strip()
+    if not tenant:
+        return PINECONE_NAMESPACE
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", tenant):
+        raise ValueError(f"Invalid tenant id: {tenant!r}")
+    return f"{PINECONE_NAMESPACE}__{tenant}"
+
+
+class ShardCache:
+    """
+    Search results cached per (index, namespace) shard, each with its own LRU.
+
+    Ingesting into a shard only drops that shard's entries, so loading one
+    tenant's CVs does not cold-start the others. Entries also expire after
+    ttl seconds, which bounds staleness when another process (load.py) writes.
+    """
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._shards: Dict[Tuple[str, str], OrderedDict] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        return json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+
+    def get(self, index: str, namespace: str, key: str) -> Optional[List[dict]]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            shard = self._shards.get((index, namespace))
+            entry = shard.get(key) if shard is not None else None
+            if shard is None or entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.stats["misses"] += 1
+                return None
+            shard.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, index: str, namespace: str, key: str, hits: List[dict]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            shard = self._shards.setdefault((index, namespace), OrderedDict())
+            shard[key] = (time.monotonic(), hits)
+            shard.move_to_end(key)
+            while len(shard) > self.max_entries:
+                shard.popitem(last=False)
+
+    def invalidate(self, index: str, namespace: str) -> None:
+        with self._lock:
+            if self._shards.pop((index, namespace), None) is not None:
+                self.stats["invalidations"] += 1
+
+    def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            return {f"{index}/{namespace}": len(shard) for (index, namespace), shard in self._shards.items()}
+
+
+search_cache = ShardCache()
+# los threads se crean en el primer submit (seguro con el fork del modo serve)
+SHARD_POOL = ThreadPoolExecutor(max_workers=TENANT_SEARCH_WORKERS, thread_name_prefix="shard-search")
+
 def read_and_chunk_sentences(
     file_path: str,
     chunk_size: int = 40,
@@ -95,10 +211,42 @@ def read_and_chunk_sentences(
         i += chunk_size - overlap
     return chunks
 
+def read_sentence_units(file_path: str, min_chars: int = SENTENCE_UNIT_MIN_CHARS) -> List[str]:
+    """
+    Reads a text file and splits it into small, non-overlapping units: the
+    sentences of each line, with short ones (headings, dates) grouped until
+    they reach min_chars. The unit position is its index in the returned list.
+
+    Args:
+        file_path (str): Path to the text file.
+        min_chars (int): Minimum length of a unit.
+
+    Returns:
+        List[str]: Units in document order.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"{file_path} does not exist.")
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = normalize_text(f.read())
+
+    units, current = [], ""
+    for line in text.split("\n"):
+        for sentence in nltk.sent_tokenize(line, language='spanish'):
+            current = f"{current} {sentence}".strip()
+            if len(current) >= min_chars:
+                units.append(current)
+                current = ""
+    if current:
+        units.append(current)
+    return units
+
 def load_persona_into_vectordb(
     name: str,
     lastname: str,
-    person_id: str
+    person_id: str,
+    summary: str = "",
+    namespace: str = PINECONE_NAMESPACE,
 ) -> None:
     """
     Loads a persona into the vector database.
@@ -107,6 +255,8 @@ def load_persona_into_vectordb(
         name (str): Name of the person.
         lastname (str): Last name of the person.
         person_id (str): Unique identifier for the person.
+        summary (str): Precomputed compact profile summary (optional).
+        namespace (str): Tenant shard (see tenant_namespace).
     """
     index = get_or_create_index(index_name=PINECONE_PERSONA_INDEX)
     
@@ -118,13 +268,62 @@ def load_persona_into_vectordb(
         "lastname": lastname,
         "category": "persona"
     }
+    if summary:
+        persona_record["summary"] = summary
     
     # Upsert the record into the index
     index.upsert_records(
-        namespace=PINECONE_NAMESPACE,
+        namespace=namespace,
         records=[persona_record]
     )
-    time.sleep(10)  # Wait for the upserted vectors to be indexed
+    search_cache.invalidate(PINECONE_PERSONA_INDEX, namespace)
+    if VECTOR_BACKEND != "local":
+        time.sleep(10)  # Wait for the upserted vectors to be indexed
+
+def upsert_in_batches(
+    index: Any,
+    records: List[dict],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    namespace: str = PINECONE_NAMESPACE,
+) -> None:
+    """
+    Upserts records in batches of at most batch_size (one embedding call per batch).
+
+    With Pinecone (integrated indexes) the text is embedded server-side, so this
+    path bypasses EmbeddingService and its cache: re-ingesting re-embeds. Only the
+    local backend reuses cached vectors.
+    """
+    for i in range(0, len(records), batch_size):
+        index.upsert_records(namespace=namespace, records=records[i:i + batch_size])
+
+def delete_person_chunks(person_id: str, namespace: str = PINECONE_NAMESPACE) -> int:
+    """
+    Deletes every CV chunk of a person (ids cv_chunk_<person_id>_<n>), so a
+    re-ingested CV does not keep chunks the new version no longer has.
+
+    Args:
+        person_id (str): Unique identifier for the person.
+        namespace (str): Namespace holding the chunks.
+
+    Returns:
+        int: Number of deleted chunk ids.
+    """
+    index = get_or_create_index()
+    deleted = 0
+    for ids in index.list(prefix=f"cv_chunk_{person_id}_", namespace=namespace):
+        ids = list(ids)
+        if ids:
+            index.delete(ids=ids, namespace=namespace)
+            deleted += len(ids)
+    search_cache.invalidate(PINECONE_INDEX, namespace)
+    return deleted
+
+def compact_vectordb() -> None:
+    """Folds pending incremental inserts/deletes into the local indexes (no-op on Pinecone)."""
+    if VECTOR_BACKEND != "local":
+        return
+    for index_name in (PINECONE_INDEX, PINECONE_PERSONA_INDEX):
+        get_or_create_index(index_name=index_name).compact()
 
 def load_data_into_vectordb(
     dataset: List[str], 
@@ -133,7 +332,9 @@ def load_data_into_vectordb(
     profile_type: str,
     person_id: str,
     category: str = "cv",
-    ) -> None:
+    granularity: str = INDEX_GRANULARITY,
+    namespace: str = PINECONE_NAMESPACE,
+    ) -> List[str]:
     """
     Loads data into the vector database.
     This function iters over a list of files that represent the dataset
@@ -141,14 +342,24 @@ def load_data_into_vectordb(
 
     Args:
         dataset (List[str]): List of file paths to be processed.
+        granularity (str): "chunk" (CHUNK_SIZE sentences, CHUNK_OVERLAP overlap) or "sentence"
+            (non-overlapping units with their position, expanded at query time).
+        namespace (str): Tenant shard (see tenant_namespace).
+
+    Returns:
+        List[str]: Texts indexed for the last file (its units in "sentence" mode).
     """
+    chunks: List[str] = []
     for doc in dataset:
-        chunks = read_and_chunk_sentences(doc, chunk_size=5, overlap=2)
+        if granularity == "sentence":
+            chunks = read_sentence_units(doc)
+        else:
+            chunks = read_and_chunk_sentences(doc, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
         category = category
         cv_chunks = []
         
         for i, chunk in enumerate(chunks, start=1):
-            cv_chunks.append({
+            record: Dict[str, Any] = {
                 "_id": f"cv_chunk_{person_id}_{i}",
                 "chunk_text": chunk,
                 "category": category,
@@ -156,18 +367,22 @@ def load_data_into_vectordb(
                 "lastname": lastname,
                 "profile_type": profile_type,
                 "person_id": person_id,
-            })
+            }
+            if granularity == "sentence":
+                record["position"] = i - 1  # índice en las unidades del document store
+            cv_chunks.append(record)
         
         index = get_or_create_index()
 
         # Upsert the records into a namespace
-        index.upsert_records(
-            namespace=PINECONE_NAMESPACE,
-            records=cv_chunks
-        )
+        upsert_in_batches(index, cv_chunks, namespace=namespace)
+        search_cache.invalidate(PINECONE_INDEX, namespace)
         # Wait for the upserted vectors to be indexed
-        time.sleep(10)
+        if VECTOR_BACKEND != "local":
+            time.sleep(10)
+    return chunks
 
+@recorded
 def search_similar(
     text: str, 
     top_k: int = PINECONE_TOPK_SEARCH, 
@@ -206,10 +421,13 @@ def search_similar(
     if metadata_filter:
         query_payload["filter"] = metadata_filter
 
-    # Consulta
-    results = idx.search(namespace=namespace, query=query_payload)
-
-    hits = (results.get("result") or {}).get("hits", []) or []
+    # Consulta (cacheada por shard)
+    cache_key = ShardCache.key("text", text, top_k_int, metadata_filter)
+    hits = search_cache.get(index, namespace, cache_key)
+    if hits is None:
+        results = idx.search(namespace=namespace, query=query_payload)
+        hits = (results.get("result") or {}).get("hits", []) or []
+        search_cache.put(index, namespace, cache_key, hits)
 
     # Solo imprimir si ui=True, y sin asumir 'chunk_text'
     if debug and ui:
@@ -229,6 +447,83 @@ def search_similar(
 
     return hits
 
+@recorded
+def search_similar_many(
+    texts: List[str],
+    top_k: int = PINECONE_TOPK_SEARCH,
+    namespace: str = PINECONE_NAMESPACE,
+    metadata_filter: dict | None = None,
+    index: str = PINECONE_INDEX,
+) -> List[List[dict]]:
+    """
+    Busca varios textos a la vez: todos se embeben en una sola llamada batcheada
+    (con caché) y cada vector se consulta por separado. Devuelve una lista de
+    hits por texto, en el mismo orden.
+    Con VECTOR_BACKEND="pinecone", EMBEDDING_MODEL/EMBEDDING_DIM deben coincidir
+    con el modelo del índice integrado.
+    """
+    if not texts:
+        return []
+    keys = [ShardCache.key("vector", t, int(top_k), metadata_filter) for t in texts]
+    cached = [search_cache.get(index, namespace, k) for k in keys]
+    out = [hits or [] for hits in cached]
+    missing = [i for i, hits in enumerate(cached) if hits is None]
+    if not missing:
+        return out
+
+    idx = get_or_create_index(index_name=index)
+    vectors = get_embedding_service().encode([texts[i] for i in missing], input_type="query")
+    for i, vector in zip(missing, vectors):
+        query_payload = {"top_k": int(top_k), "vector": {"values": vector.tolist()}}
+        if metadata_filter:
+            query_payload["filter"] = metadata_filter
+        results = idx.search(namespace=namespace, query=query_payload)
+        out[i] = (results.get("result") or {}).get("hits", []) or []
+        search_cache.put(index, namespace, keys[i], out[i])
+    return out
+
+@recorded
+def search_shards(
+    text: str,
+    namespaces: Sequence[str],
+    top_k: int = PINECONE_TOPK_SEARCH,
+    metadata_filter: dict | None = None,
+    index: str = PINECONE_INDEX,
+) -> List[Tuple[str, dict]]:
+    """
+    Scatter-gather over several tenant shards: one search per namespace,
+    merged by score. Every shard lives in the same index (same embedding
+    model), so the scores are comparable. On Pinecone the searches run in
+    parallel on SHARD_POOL; local shards are scanned in turn, since an
+    in-process scan is cheaper than the thread handoff (make bench ARGS=shards).
+
+    Args:
+        text (str): Query text.
+        namespaces (Sequence[str]): Shards to search (see tenant_namespace).
+        top_k (int): Hits kept after merging (and asked from each shard).
+        metadata_filter (dict | None): Filter applied in every shard.
+        index (str): CV or persona index.
+
+    Returns:
+        List[Tuple[str, dict]]: (namespace, hit) pairs, best score first.
+    """
+    namespaces = list(dict.fromkeys(namespaces))
+    if len(namespaces) == 1:
+        hits = search_similar(text, top_k, namespaces[0], debug=False, ui=False, metadata_filter=metadata_filter, index=index)
+        return [(namespaces[0], h) for h in hits]
+
+    if VECTOR_BACKEND == "local":
+        results = {ns: search_similar(text, top_k, ns, False, False, metadata_filter, index) for ns in namespaces}
+    else:
+        futures = {
+            ns: SHARD_POOL.submit(search_similar, text, top_k, ns, False, False, metadata_filter, index)
+            for ns in namespaces
+        }
+        results = {ns: future.result() for ns, future in futures.items()}
+    merged = [(ns, h) for ns, hits in results.items() for h in hits]
+    merged.sort(key=lambda pair: pair[1].get("_score", 0.0), reverse=True)
+    return merged[:int(top_k)]
+
 
 if __name__ == "__main__":
     try:
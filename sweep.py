@@ -0,0 +1,331 @@
+"""
+Barrido offline de parámetros de retrieval y desambiguación sobre los CVs de data/.
+
+Corre un set de preguntas etiquetadas contra el índice local (src/localVectorStore.py)
+para una grilla de TOPK_RETRIEVE, TOPK_CONTEXT, chunk_size/overlap, AMBIG_DELTA y
+MIN_SCORE, y reporta recall, tasa de repregunta, tokens de prompt y latencia por punto.
+Los puntos de la grilla corren en paralelo en una pool de procesos.
+
+Las dos etapas son independientes (la desambiguación no depende del chunking ni de los
+top-k), así que se barren por separado: chunking × top-k para el retrieval y
+delta × min_score para la desambiguación, en lugar del producto completo.
+"""
+import os
+import re
+import json
+import glob
+import time
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import product
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import typer
+
+import src.agent as agent
+import src.localVectorStore as local_store
+from src.embeddingService import EmbeddingCache, EmbeddingService, build_provider
+from src.rerankService import build_reranker, rerank_order
+from src.textUtils import estimate_tokens, fold_text
+from src.vectorService import read_and_chunk_sentences
+from src.config.settings import CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_PROVIDER, RERANKER
+
+app = typer.Typer()
+
+DATA_GLOB = "data/*.txt"
+
+
+@app.callback()
+def main():
+    """Offline parameter sweep for retrieval and disambiguation settings."""
+
+
+# ========= CORPUS Y PREGUNTAS ETIQUETADAS =========
+def load_people() -> Dict[str, str]:
+    """persona_id (nombre del archivo) -> nombre completo de la línea "Nombre:" del CV."""
+    people = {}
+    for path in sorted(glob.glob(DATA_GLOB)):
+        with open(path, "r", encoding="utf-8") as f:
+            match = re.search(r"^Nombre:\s*(.+)$", f.read(), flags=re.MULTILINE)
+        if match:
+            people[os.path.splitext(os.path.basename(path))[0]] = match.group(1).strip()
+    return people
+
+def _typo(word: str) -> str:
+    # intercambia dos letras del medio: "Valentina" -> "Valetnina"
+    i = len(word) // 2
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:] if len(word) > 4 else word
+
+def generate_questions(per_person: int = 6, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Set etiquetado a partir de data/:
+
+    - retrieval: "¿Qué experiencia tiene {nombre} con X y Y?", con X e Y las dos
+      palabras más específicas (menor frecuencia en el corpus) de una oración del CV;
+      se espera que ambas aparezcan en el contexto recuperado.
+    - disambiguation: "¿Dónde trabajó {mención}?" con nombre completo, nombre,
+      nombre + apellido, un typo o solo el apellido; si el apellido lo comparten
+      varias personas se espera una repregunta ("ask"), si no el persona_id.
+    """
+    people = load_people()
+    sentences: Dict[str, List[str]] = {}
+    for pid in people:
+        with open(DATA_GLOB.replace("*", pid), "r", encoding="utf-8") as f:
+            sentences[pid] = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", f.read()) if len(s.strip()) > 30]
+
+    df: Dict[str, int] = {}
+    for pid, sents in sentences.items():
+        for word in set(re.findall(r"\w+", fold_text(" ".join(sents)))):
+            df[word] = df.get(word, 0) + 1
+
+    # apellidos (cualquiera de los dos) compartidos entre personas
+    surnames: Dict[str, set] = {}
+    for pid, name in people.items():
+        for token in name.split()[1:]:
+            surnames.setdefault(fold_text(token), set()).add(pid)
+
+    rng = np.random.default_rng(seed)
+    out: List[Dict[str, Any]] = []
+    for pid, name in people.items():
+        first, surname = name.split()[0], name.split()[1]
+        picks = rng.choice(len(sentences[pid]), size=min(per_person, len(sentences[pid])), replace=False)
+        for i in picks:
+            words = [w for w in dict.fromkeys(re.findall(r"\w+", sentences[pid][i])) if len(w) >= 5 and not w.isdigit()]
+            if len(words) < 2:
+                continue
+            keywords = sorted(words, key=lambda w: df.get(fold_text(w), 0))[:2]
+            out.append({
+                "kind": "retrieval",
+                "query": f"¿Qué experiencia tiene {first} con {keywords[0]} y {keywords[1]}?",
+                "person_id": pid,
+                "keywords": keywords,
+            })
+
+        mentions = [name, first, f"{first} {surname}", f"{_typo(first)} {surname}", surname]
+        for mention in mentions:
+            shared = mention == surname and len(surnames[fold_text(surname)]) > 1
+            out.append({
+                "kind": "disambiguation",
+                "query": f"¿Dónde trabajó {mention}?",
+                "person_id": pid,
+                "expected": "ask" if shared else pid,
+            })
+    return out
+
+def read_questions(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return generate_questions()
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ========= WORKERS =========
+# Cada proceso arma su EmbeddingService y reranker una sola vez; los índices
+# locales se construyen por (chunk_size, overlap) y se reutilizan entre puntos.
+_embedder: Optional[EmbeddingService] = None
+_reranker = None
+
+def _init_worker(provider: str, reranker: str) -> None:
+    global _embedder, _reranker
+    _embedder = EmbeddingService(build_provider(provider), EmbeddingCache())
+    _reranker = build_reranker(reranker)
+
+@lru_cache(maxsize=None)
+def cv_index(chunk_size: int, overlap: int) -> local_store._Namespace:
+    ids, fields, texts = [], [], []
+    for path in sorted(glob.glob(DATA_GLOB)):
+        pid = os.path.splitext(os.path.basename(path))[0]
+        for i, chunk in enumerate(read_and_chunk_sentences(path, chunk_size=chunk_size, overlap=overlap)):
+            ids.append(f"cv_chunk_{pid}_{i}")
+            fields.append({"chunk_text": chunk, "person_id": pid})
+            texts.append(chunk)
+    ns = local_store._Namespace(_embedder.dim)
+    ns.upsert(ids, fields, _embedder.encode(texts, input_type="passage"))
+    return ns
+
+@lru_cache(maxsize=None)
+def persona_index() -> local_store._Namespace:
+    people = load_people()
+    ns = local_store._Namespace(_embedder.dim)
+    ns.upsert(list(people), [{"canonical_name": n} for n in people.values()], _embedder.encode(list(people.values()), input_type="passage"))
+    return ns
+
+@lru_cache(maxsize=4096)
+def _query_vector(text: str) -> np.ndarray:
+    return _embedder.encode_one(text)
+
+def _percentile(values: List[float], q: float) -> float:
+    return sorted(values)[max(0, int(q * len(values)) - 1)]
+
+def eval_retrieval(point: Dict[str, Any], questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Recall (todas las palabras esperadas en el contexto que llega al LLM), recall de
+    los candidatos antes del corte a top_k_context, tokens del prompt y latencia de
+    búsqueda + rerank (sin el embedding de la query, que no depende de la grilla).
+    """
+    ns = cv_index(point["chunk_size"], point["overlap"])
+    hits_ctx, hits_ret, tokens, latencies = [], [], [], []
+    for q in questions:
+        vector = _query_vector(q["query"])
+        t0 = time.perf_counter()
+        found = ns.search(vector, point["topk_retrieve"], {"person_id": {"$eq": q["person_id"]}})
+        texts = [fields["chunk_text"] for _, _, fields in found]
+        order, _info = rerank_order(_reranker, q["query"], texts, [score for _, score, _ in found])
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        context = [texts[i] for i in order[:point["topk_context"]]]
+        keywords = [fold_text(k) for k in q["keywords"]]
+        hits_ctx.append(all(k in fold_text(" ".join(context)) for k in keywords))
+        hits_ret.append(all(k in fold_text(" ".join(texts)) for k in keywords))
+        chunks = [agent.Chunk(f"cv_chunk_{q['person_id']}_{i}", t, 0.0, q["person_id"]) for i, t in enumerate(context)]
+        tokens.append(estimate_tokens(agent.SYSTEM) + estimate_tokens(q["query"]) + estimate_tokens(agent.build_context(chunks)))
+
+    return {
+        **point,
+        "recall": round(statistics.mean(hits_ctx), 3),
+        "recall_retrieved": round(statistics.mean(hits_ret), 3),
+        "prompt_tokens": round(statistics.mean(tokens)),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(_percentile(latencies, 0.95), 3),
+    }
+
+def eval_disambiguation(point: Dict[str, Any], questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Con la misma búsqueda que search_people (top 5 sobre la pregunta completa) y
+    candidate_decision: tasa de repregunta, tasa de persona equivocada y aciertos
+    (repreguntar cuando corresponde o resolver a la persona correcta).
+    """
+    ns = persona_index()
+    asked, wrong, correct = [], [], []
+    for q in questions:
+        found = ns.search(_query_vector(q["query"]), 5)
+        cands = [{"persona_id": pid, "score": score} for pid, score, _ in found]
+        outcome = agent.candidate_decision(cands, point["ambig_delta"], point["min_score"])
+        resolved = "ask" if outcome == "ambiguous_top2" else cands[0]["persona_id"] if outcome == "clear_top1" else None
+        asked.append(resolved == "ask")
+        wrong.append(resolved not in ("ask", None) and resolved != q["expected"])
+        correct.append(resolved == q["expected"])
+    return {
+        **point,
+        "ask_rate": round(statistics.mean(asked), 3),
+        "wrong_rate": round(statistics.mean(wrong), 3),
+        "accuracy": round(statistics.mean(correct), 3),
+    }
+
+def _run_point(kind: str, point: Dict[str, Any], questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if kind == "retrieval":
+        return {"kind": kind, **eval_retrieval(point, questions)}
+    return {"kind": kind, **eval_disambiguation(point, questions)}
+
+
+# ========= REPORTE =========
+def _floats(values: str) -> List[float]:
+    return [float(v) for v in values.split(",") if v.strip()]
+
+def _ints(values: str) -> List[int]:
+    return [int(v) for v in values.split(",") if v.strip()]
+
+def _print_table(rows: List[Dict[str, Any]], keys: List[str], current: Dict[str, Any]) -> None:
+    typer.echo("  " + "".join(f"{k:>17}" for k in keys))
+    for row in rows:
+        mark = "*" if all(row[k] == v for k, v in current.items()) else " "
+        typer.echo(mark + " " + "".join(f"{row[k]:>17}" for k in keys))
+
+
+@app.command()
+def run(
+    provider: str = typer.Option(EMBEDDING_PROVIDER, help="Embedding provider: hashing | local | pinecone (thresholds are provider-specific)"),
+    reranker: str = typer.Option(RERANKER, help="Reranker: none | lexical | cross-encoder"),
+    chunk_size: str = typer.Option("3,5,7", help="Comma-separated sentences per chunk"),
+    overlap: str = typer.Option("0,1,2", help="Comma-separated overlapping sentences"),
+    topk_retrieve: str = typer.Option("10,20,50", help="Comma-separated TOPK_RETRIEVE values"),
+    topk_context: str = typer.Option("2,4,6", help="Comma-separated TOPK_CONTEXT values"),
+    ambig_delta: str = typer.Option("0.02,0.04,0.08", help="Comma-separated AMBIG_DELTA values"),
+    min_score: str = typer.Option("0.05,0.2", help="Comma-separated MIN_SCORE values"),
+    questions: Optional[str] = typer.Option(None, help="Labeled questions JSONL (default: generated from data/)"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Worker processes"),
+    tolerance: float = typer.Option(0.02, help="Recall the recommendation may give up for fewer prompt tokens"),
+    output: Optional[str] = typer.Option(None, help="Write every grid point as JSONL here"),
+):
+    """Retrieval recall, disambiguation rate, prompt tokens and latency for a grid of settings."""
+    labeled = read_questions(questions)
+    retrieval_qs = [q for q in labeled if q["kind"] == "retrieval"]
+    disamb_qs = [q for q in labeled if q["kind"] == "disambiguation"]
+
+    retrieval_grid = [
+        {"chunk_size": c, "overlap": o, "topk_retrieve": kr, "topk_context": kc}
+        for c, o, kr, kc in product(_ints(chunk_size), _ints(overlap), _ints(topk_retrieve), _ints(topk_context))
+        if o < c and kc <= kr
+    ]
+    disamb_grid = [{"ambig_delta": d, "min_score": m} for d, m in product(_floats(ambig_delta), _floats(min_score))]
+    typer.echo(
+        f"questions: {len(retrieval_qs)} retrieval, {len(disamb_qs)} disambiguation | "
+        f"grid: {len(retrieval_grid)} retrieval + {len(disamb_grid)} disambiguation points | "
+        f"provider={provider} reranker={reranker} workers={workers}"
+    )
+
+    t0 = time.perf_counter()
+    # agrupados por chunking: cada worker construye pocos índices distintos
+    jobs = sorted(retrieval_grid, key=lambda p: (p["chunk_size"], p["overlap"]))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(provider, reranker)) as pool:
+        futures = [pool.submit(_run_point, "retrieval", p, retrieval_qs) for p in jobs]
+        futures += [pool.submit(_run_point, "disambiguation", p, disamb_qs) for p in disamb_grid]
+        results = [f.result() for f in futures]
+    typer.echo(f"swept in {time.perf_counter() - t0:.1f}s")
+
+    retrieval = [r for r in results if r["kind"] == "retrieval"]
+    disamb = [r for r in results if r["kind"] == "disambiguation"]
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    typer.echo("\nretrieval (* = current settings)")
+    retrieval.sort(key=lambda r: (-r["recall"], r["prompt_tokens"], r["p50_ms"]))
+    _print_table(
+        retrieval,
+        ["chunk_size", "overlap", "topk_retrieve", "topk_context", "recall", "recall_retrieved", "prompt_tokens", "p50_ms", "p95_ms"],
+        {"chunk_size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP, "topk_retrieve": agent.TOPK_RETRIEVE, "topk_context": agent.TOPK_CONTEXT},
+    )
+    typer.echo("\ndisambiguation (* = current settings)")
+    disamb.sort(key=lambda r: (r["wrong_rate"], -r["accuracy"], r["ask_rate"]))
+    _print_table(
+        disamb,
+        ["ambig_delta", "min_score", "ask_rate", "wrong_rate", "accuracy"],
+        {"ambig_delta": agent.AMBIG_DELTA, "min_score": agent.MIN_SCORE},
+    )
+
+    # lo más barato (tokens de prompt, después latencia) que no pierde más de tolerance de recall
+    if retrieval:
+        floor = max(r["recall"] for r in retrieval) - tolerance
+        best = min((r for r in retrieval if r["recall"] >= floor), key=lambda r: (r["prompt_tokens"], r["topk_retrieve"], r["p50_ms"]))
+        typer.echo(
+            f"\nrecommended retrieval: CHUNK_SIZE={best['chunk_size']} CHUNK_OVERLAP={best['overlap']} "
+            f"TOPK_RETRIEVE={best['topk_retrieve']} TOPK_CONTEXT={best['topk_context']} "
+            f"(recall={best['recall']}, prompt_tokens={best['prompt_tokens']})"
+        )
+    if disamb:
+        best = disamb[0]
+        typer.echo(
+            f"recommended disambiguation: AMBIG_DELTA={best['ambig_delta']} MIN_SCORE={best['min_score']} "
+            f"(wrong={best['wrong_rate']}, ask={best['ask_rate']}, accuracy={best['accuracy']})"
+        )
+
+
+@app.command(name="questions")
+def dump_questions(
+    output: str = typer.Option("sweep_questions.jsonl", help="Where to write the generated labeled set"),
+    per_person: int = typer.Option(6, help="Retrieval questions per CV"),
+):
+    """Write the generated labeled question set as JSONL, to review or extend it by hand."""
+    labeled = generate_questions(per_person)
+    with open(output, "w", encoding="utf-8") as f:
+        for q in labeled:
+            f.write(json.dumps(q, ensure_ascii=False) + "\n")
+    typer.echo(f"{len(labeled)} questions -> {output}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,24 @@
+import os
+
+# settings.py exige las keys al importarse; los tests no llaman a Groq ni a Pinecone
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
+os.environ.setdefault("SESSION_STORE", "memory")
+
+import pytest  # noqa: E402
+
+from src.nameResolver import Roster  # noqa: E402
+
+
+RECORDS = [
+    {"person_id": "p1", "name": "Valentina", "lastname": "Rodríguez"},
+    {"person_id": "p2", "name": "Valentina", "lastname": "Gómez"},
+    {"person_id": "p3", "name": "Joaquín", "lastname": "González"},
+]
+
+VOCABULARY = ["Python, Docker y AWS. Backend en Globant.", "Ingeniería en Sistemas, UBA."]
+
+
+@pytest.fixture
+def roster() -> Roster:
+    return Roster(RECORDS, VOCABULARY)
@@ -0,0 +1,265 @@
+import time
+
+import httpx
+import pytest
+from groq import APITimeoutError
+
+import src.agent as agent
+from src.nameResolver import Roster
+
+
+@pytest.fixture
+def graph_state(monkeypatch: pytest.MonkeyPatch, roster: Roster):
+    """Roster de prueba y memoria de sesión vacía, sin persona por defecto."""
+    monkeypatch.setattr(agent, "get_roster", lambda tenants: roster)
+    monkeypatch.setattr(agent, "MEM", agent.ShortMemory())
+    monkeypatch.setattr(agent, "ALIASES", agent.AliasCache())
+    monkeypatch.setattr(agent, "DEFAULT_PERSONA", "")
+    return lambda query: {"query": query, "session_id": "s1", "trace": {}}
+
+
+# ========= RESOLUCIÓN CON ROSTER =========
+@pytest.mark.parametrize("query", ["¿Y sabe Rust?", "¿Sabe Kubernetes?", "¿Trabajó en Mercado Libre?"])
+def test_unknown_terms_keep_session_persona(graph_state, query: str):
+    agent.MEM.append("s1", "p3", "¿Qué sabe Joaquín?", "Python y Docker.")
+    out = agent.resolve_roster_node(graph_state(query))
+    assert out["trace"]["roster"] == "session_persona"
+    assert out["candidates"][0]["persona_id"] == "p3"
+    assert agent.route_after_roster(out) == "decide_disambiguation"
+
+
+@pytest.mark.parametrize("query", ["¿Y sabe Rust?", "¿Trabajó en Mercado Libre?"])
+def test_unknown_terms_without_session_go_to_llm(graph_state, query: str):
+    out = agent.resolve_roster_node(graph_state(query))
+    assert out["trace"]["roster"] == "no_names"
+    assert out["trace"]["roster_suspects"]
+    assert agent.route_after_roster(out) == "classify_mode"
+
+
+def test_unknown_terms_next_to_roster_name(graph_state):
+    out = agent.resolve_roster_node(graph_state("¿Joaquín trabajó con Kubernetes?"))
+    assert out["trace"]["roster"] == "match"
+    assert out["candidates"][0]["persona_id"] == "p3"
+
+
+def test_unknown_person_short_circuits(graph_state):
+    agent.MEM.append("s1", "p3", "¿Qué sabe Joaquín?", "Python y Docker.")
+    out = agent.resolve_roster_node(graph_state("¿Qué estudió Lucía Quispe?"))
+    assert out["trace"] == {"roster": "unknown_names", "parsed_names": ["Lucía Quispe"]}
+    assert agent.route_after_roster(out) == "unknown_person"
+
+
+def test_unknown_person_next_to_roster_name_goes_to_llm(graph_state):
+    out = agent.resolve_roster_node(graph_state("Compará Joaquín y Zoraida"))
+    assert out["trace"]["roster"] == "llm_names"
+    assert agent.route_after_roster(out) == "classify_mode"
+
+
+# ========= PERFIL ESTRUCTURADO =========
+PROFILE = {
+    "person_id": "p3",
+    "name": "Joaquín",
+    "lastname": "González",
+    "source": "cv3.txt",
+    "experiencia": [
+        {"rol": "Data Engineer", "empresa": "Nubank", "desde": "2020", "hasta": "Actualidad"},
+        {"rol": "Backend", "empresa": "Rappi", "desde": "2016", "hasta": "2020"},
+    ],
+    "empresas": ["Nubank", "Rappi", "Globant"],
+}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("¿Cuál es su experiencia laboral?", ["experiencia"]),
+    ("¿Y sus últimas 2 experiencias laborales?", ["experiencia"]),
+    ("¿En qué empresas trabajó Joaquín?", ["empresas"]),
+    ("¿Dónde trabajó?", ["empresas"]),
+    ("Datos personales de Joaquín", ["contacto"]),
+    ("¿Usó tecnologías cloud en Globant?", []),
+    ("¿Por qué cambió de empresas?", []),
+])
+def test_match_profile_intents(query: str, expected: list):
+    assert agent.match_profile_intents(query, ["Joaquín González"]) == expected
+
+
+def test_render_profile_answer_lists_companies():
+    answer = agent.render_profile_answer(PROFILE, ["empresas"], "¿En qué empresas trabajó?")
+    assert "- Nubank, Rappi, Globant" in answer
+    assert "[1] (id=cv_full_p3 | Experiencia Laboral | cv3.txt)" in answer
+
+
+def test_render_profile_answer_limits_experience():
+    answer = agent.render_profile_answer(PROFILE, ["experiencia"], "¿Y su última 1 experiencia laboral?")
+    assert "Nubank" in answer
+    assert "Rappi" not in answer
+
+
+# ========= VENTANAS (índice por oraciones) =========
+UNITS = {"p1": [f"Oración {i}." for i in range(10)]}
+
+
+def unit_hit(position: int, score: float, pid: str = "p1") -> agent.Chunk:
+    return agent.Chunk(f"cv_{pid}_u{position}", UNITS[pid][position], score, pid, position=position)
+
+
+def test_expand_windows_single_hit():
+    [window] = agent.expand_windows([unit_hit(5, 0.8)], radius=1, max_units=5, units_by_pid=UNITS)
+    assert window.chunk_id == "cv_win_p1_4_6"
+    assert window.text == "Oración 4. Oración 5. Oración 6."
+    assert window.score == 0.8
+
+
+def test_expand_windows_merges_nearby_hits():
+    hits = [unit_hit(5, 0.6), unit_hit(3, 0.9)]
+    [window] = agent.expand_windows(hits, radius=1, max_units=5, units_by_pid=UNITS)
+    assert window.chunk_id == "cv_win_p1_2_6"
+    assert window.score == 0.9
+
+
+def test_expand_windows_full_window_does_not_overlap():
+    hits = [unit_hit(2, 0.9), unit_hit(4, 0.8)]
+    windows = agent.expand_windows(hits, radius=1, max_units=3, units_by_pid=UNITS)
+    assert [w.chunk_id for w in windows] == ["cv_win_p1_1_3", "cv_win_p1_4_5"]
+
+
+def test_expand_windows_clips_to_cv_bounds():
+    [window] = agent.expand_windows([unit_hit(0, 0.5)], radius=2, max_units=5, units_by_pid=UNITS)
+    assert window.chunk_id == "cv_win_p1_0_2"
+
+
+def test_expand_windows_keeps_rank_and_passes_chunks_without_position():
+    plain = agent.Chunk("cv_p2_0", "Chunk sin posición.", 0.95, "p2")
+    out_of_range = agent.Chunk("cv_p1_u42", "Fuera de rango.", 0.4, "p1", position=42)
+    windows = agent.expand_windows([plain, unit_hit(8, 0.7), out_of_range], radius=1, max_units=5, units_by_pid=UNITS)
+    assert [w.chunk_id for w in windows] == ["cv_p2_0", "cv_win_p1_7_9", "cv_p1_u42"]
+
+
+# ========= PRESUPUESTO DE LATENCIA =========
+CHUNKS = [agent.Chunk("cv_p1_0", "Data Engineer en Nubank desde 2020.", 0.9, "p1", "Experiencia Laboral", "Nubank")]
+
+
+@pytest.fixture
+def llm_calls(monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    def llm_chat_answer(system, prompt, model=None, timeout=None):
+        calls.append({"model": model, "timeout": timeout})
+        return "Respuesta del LLM [1]."
+
+    monkeypatch.setattr(agent, "llm_chat_answer", llm_chat_answer)
+    return calls
+
+
+def with_budget(left_ms: float | None) -> dict:
+    deadline = time.time() + left_ms / 1000 if left_ms is not None else 0.0
+    return {"query": "q", "deadline": deadline, "trace": {}}
+
+
+def test_budgeted_answer_without_deadline(llm_calls):
+    out = agent.budgeted_answer(with_budget(None), "prompt", CHUNKS)
+    assert out == {"answer": "Respuesta del LLM [1]."}
+    assert llm_calls == [{"model": None, "timeout": None}]
+
+
+def test_budgeted_answer_fast_model_when_short(llm_calls):
+    out = agent.budgeted_answer(with_budget((agent.DEGRADE_NO_LLM_MS + agent.DEGRADE_FAST_MODEL_MS) / 2), "prompt", CHUNKS)
+    assert out["answer"] == "Respuesta del LLM [1]."
+    assert out["trace"]["degraded"] == ["fast_model"]
+    assert llm_calls[0]["model"] == agent.GROQ_FAST_MODEL
+    assert 0 < llm_calls[0]["timeout"] <= agent.DEGRADE_FAST_MODEL_MS / 1000
+
+
+def test_budgeted_answer_extractive_without_margin(llm_calls):
+    out = agent.budgeted_answer(with_budget(agent.DEGRADE_NO_LLM_MS / 2), "prompt", CHUNKS)
+    assert llm_calls == []
+    assert out["trace"]["degraded"] == ["extractive_answer"]
+    assert "[1] Data Engineer en Nubank desde 2020." in out["answer"]
+    assert "(id=cv_p1_0 | Experiencia Laboral/Nubank)" in out["answer"]
+
+
+@pytest.mark.parametrize("error", [
+    agent.RateLimitTimeout("sin cupo"),
+    APITimeoutError(request=httpx.Request("POST", "https://api.groq.com")),
+])
+def test_budgeted_answer_extractive_on_timeout(monkeypatch: pytest.MonkeyPatch, error: Exception):
+    def llm_chat_answer(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(agent, "llm_chat_answer", llm_chat_answer)
+    state = with_budget(5000)
+    state["trace"] = {"degraded": ["rerank_cut"]}
+    out = agent.budgeted_answer(state, "prompt", CHUNKS)
+    assert out["trace"]["degraded"] == ["rerank_cut", "answer_timeout"]
+    assert out["answer"].startswith("No llegué a redactar la respuesta a tiempo")
+
+
+# ========= COREF ESPECULATIVA =========
+SPEC_CHUNKS = [agent.Chunk("cv_p3_0", "Python y Docker.", 0.8, "p3")]
+SPEC_PEOPLE = [{"persona_id": "p9", "name": "Zoraida Quispe", "score": 0.7}]
+
+
+@pytest.fixture
+def speculation(monkeypatch: pytest.MonkeyPatch):
+    """Coref y ramas especulativas sin red; la decisión de la coref se fija con answer["reuse"]."""
+    answer = {"reuse": True, "people_error": None}
+    monkeypatch.setattr(agent, "ALIASES", agent.AliasCache())
+    monkeypatch.setattr(agent, "llm_yesno", lambda system, user, timeout=None: answer["reuse"])
+    monkeypatch.setattr(agent, "cv_queries", lambda q, pids: [q])
+    monkeypatch.setattr(agent, "retrieve_cv_context", lambda q, pids, namespaces, queries: (SPEC_CHUNKS, []))
+
+    def people(queries, namespaces):
+        if answer["people_error"]:
+            raise answer["people_error"]
+        return SPEC_PEOPLE
+
+    monkeypatch.setattr(agent, "pinecone_query_people", people)
+    return answer
+
+
+def spec_state(query: str, names: list | None = None) -> dict:
+    return {"query": query, "session_id": "s1", "trace": {"parsed_names": names or []}}
+
+
+def test_speculative_coref_keeps_cv_branch_on_reuse(speculation):
+    out = agent.speculative_coref(spec_state("¿Y dónde estudió?"), "p3", "msg")
+    assert out["reuse_last_persona"] is True
+    assert out["speculation"] == {"cv": {"persona_id": "p3", "chunks": SPEC_CHUNKS, "full_cv": []}}
+    assert out["trace"]["spec_launched"] == ["cv", "people"]
+    assert out["trace"]["spec_discarded"] == ["people"]
+
+
+def test_speculative_coref_keeps_people_branch_on_new_person(speculation):
+    speculation["reuse"] = False
+    out = agent.speculative_coref(spec_state("¿Y Zoraida?"), "p3", "msg")
+    assert out["speculation"] == {"people": SPEC_PEOPLE}
+    assert out["trace"]["spec_discarded"] == ["cv"]
+
+
+def test_speculative_coref_winning_branch_error(speculation):
+    speculation["reuse"] = False
+    speculation["people_error"] = RuntimeError("index down")
+    out = agent.speculative_coref(spec_state("¿Y Zoraida?"), "p3", "msg")
+    assert out["speculation"] == {}
+    assert out["trace"]["spec_error"] == "people: index down"
+
+
+def test_speculative_coref_skips_people_search_with_alias(speculation):
+    agent.ALIASES.remember("s1", ["Zoraida"], "p9")
+    out = agent.speculative_coref(spec_state("¿Y Zoraida?", ["Zoraida"]), "p3", "msg")
+    assert out["trace"]["spec_launched"] == ["cv"]
+
+
+def test_retrieve_uses_speculative_chunks_for_same_person():
+    spec = {"cv": {"persona_id": "p3", "chunks": SPEC_CHUNKS, "full_cv": []}}
+    out = agent.retrieve_cv_chunks_node({"query": "q", "persona_ids": ["p3"], "speculation": spec, "trace": {}})
+    assert out["chunks"] == SPEC_CHUNKS
+    assert out["speculation"] == {}
+    assert out["trace"]["spec_cv_used"] is True
+
+
+def test_resolve_people_uses_speculative_search(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(agent, "MEM", agent.ShortMemory())
+    monkeypatch.setattr(agent, "ALIASES", agent.AliasCache())
+    state = {"query": "¿Y Zoraida?", "session_id": "s1", "speculation": {"people": SPEC_PEOPLE}, "trace": {"parsed_names": ["Zoraida"]}}
+    out = agent.resolve_people_node(state)
+    assert out == {"candidates": SPEC_PEOPLE, "trace": {"spec_people_used": True}}
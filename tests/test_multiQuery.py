@@ -0,0 +1,35 @@
+import pytest
+
+from src.multiQuery import expand_query, rrf_fuse
+
+
+def test_rrf_rewards_items_in_several_rankings():
+    fused = rrf_fuse([["a", "b", "c"], ["c", "b", "d"]], key=lambda x: x, k=60)
+    assert {item for item, _ in fused[:2]} == {"b", "c"}
+    assert [item for item, _ in fused[2:]] == ["a", "d"]
+    assert dict(fused)["b"] == pytest.approx(2 / 62)
+    assert dict(fused)["d"] == pytest.approx(1 / 63)
+
+
+def test_rrf_keeps_instance_where_item_ranked_best():
+    first = [{"id": "x", "score": 0.2}, {"id": "y", "score": 0.1}]
+    second = [{"id": "y", "score": 0.9}]
+    fused = dict((item["id"], item) for item, _ in rrf_fuse([first, second], key=lambda h: h["id"]))
+    assert fused["y"]["score"] == 0.9
+    assert fused["x"]["score"] == 0.2
+
+
+def test_rrf_empty_rankings():
+    assert rrf_fuse([[], []], key=lambda x: x) == []
+
+
+def test_expand_query_splits_coordinated_items_and_drops_name():
+    queries = expand_query("¿Qué experiencia tiene Valentina con Spark y Airflow?", names=["Valentina"], max_queries=6)
+    assert queries[0] == "¿Qué experiencia tiene Valentina con Spark y Airflow?"
+    assert "experiencia Spark" in queries
+    assert "experiencia Airflow" in queries
+    assert all("Valentina" not in q for q in queries[1:])
+
+
+def test_expand_query_respects_max_queries():
+    assert len(expand_query("¿Qué experiencia tiene con Spark, Airflow y dbt?", max_queries=2)) == 2
@@ -0,0 +1,49 @@
+import pytest
+
+from src.nameResolver import Roster
+
+
+def test_match_tolerates_typos(roster: Roster):
+    mentions = roster.match("¿Qué sabe Joaqin Gonzales de Python?")
+    assert len(mentions) == 1
+    assert mentions[0]["candidates"][0]["persona_id"] == "p3"
+
+
+def test_match_first_name_is_ambiguous(roster: Roster):
+    mentions = roster.match("¿Dónde estudió Valentina?")
+    assert {c["persona_id"] for c in mentions[0]["candidates"]} == {"p1", "p2"}
+
+
+def test_unknown_names_groups_consecutive_words(roster: Roster):
+    assert roster.unknown_names("¿Qué estudió Zoraida Quispe?") == ["Zoraida Quispe"]
+
+
+def test_unknown_names_skips_cv_vocabulary(roster: Roster):
+    assert roster.unknown_names("¿Trabajó en Globant con Docker?") == []
+
+
+@pytest.mark.parametrize("query", [
+    "¿Y sabe Rust?",
+    "¿Tiene experiencia con Kubernetes?",
+    "¿Trabajó en Mercado Libre?",
+    "¿Qué hizo con Terraform y Ansible?",
+])
+def test_technology_and_company_words_are_not_people(roster: Roster, query: str):
+    assert roster.unknown_names(query)
+    assert roster.unknown_people(query) == []
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("¿Qué estudió Lucía Quispe?", ["Lucía Quispe"]),
+    ("Martina sabe Python?", ["Martina"]),
+    ("¿Qué experiencia tiene el candidato Quispe?", ["Quispe"]),
+    ("¿Conocés a Zoraida Quispe?", ["Zoraida Quispe"]),
+])
+def test_unknown_people(roster: Roster, query: str, expected: list):
+    assert roster.unknown_people(query) == expected
+
+
+def test_unknown_people_next_to_roster_name(roster: Roster):
+    query = "Compará Joaquín y Zoraida"
+    known = [w for m in roster.match(query) for w in m["words"]]
+    assert roster.unknown_people(query, known_words=known) == ["Zoraida"]
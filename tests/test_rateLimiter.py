@@ -0,0 +1,90 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.rateLimiter import RateLimiter, RateLimitTimeout
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_limiter(request: pytest.FixtureRequest, tmp_path):
+    def make(**kwargs) -> RateLimiter:
+        kwargs = {"requests_per_minute": 0, "tokens_per_minute": 0, "reserve": 0.0, "max_wait": 5.0, **kwargs}
+        return RateLimiter(store=request.param, db_path=str(tmp_path / "ratelimit.sqlite"), **kwargs)
+    return make
+
+
+def completion(total_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+def test_call_refunds_unused_tokens(make_limiter):
+    limiter = make_limiter(tokens_per_minute=600)
+    limiter.call(lambda: completion(100), tokens=500)
+    assert limiter.stats()["levels"]["tokens"] == pytest.approx(500, abs=5)
+
+
+def test_failed_call_refunds_whole_reservation(make_limiter):
+    limiter = make_limiter(tokens_per_minute=600)
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        limiter.call(fail, tokens=500)
+    assert limiter.stats()["levels"]["tokens"] == pytest.approx(600, abs=5)
+
+
+def test_call_retries_after_429(make_limiter):
+    limiter = make_limiter(requests_per_minute=600)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.time())
+        if len(attempts) == 1:
+            raise type("RateLimited", (Exception,), {"status_code": 429, "response": SimpleNamespace(headers={"retry-after": "0.2"})})()
+        return "ok"
+
+    assert limiter.call(flaky, retries=1) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+    assert limiter.metrics["interactive"]["throttled"] == 1
+
+
+def test_interactive_times_out_when_quota_is_gone(make_limiter):
+    limiter = make_limiter(requests_per_minute=2)
+    limiter.acquire("interactive")
+    limiter.acquire("interactive")
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("interactive", max_wait=0.1)
+    assert limiter.metrics["interactive"]["timeouts"] == 1
+
+
+def test_background_classes_leave_the_reserve(make_limiter):
+    limiter = make_limiter(requests_per_minute=10, reserve=0.5)
+    for _ in range(5):
+        limiter.acquire("batch", max_wait=0.1)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("batch", max_wait=0.1)
+    limiter.acquire("interactive", max_wait=0.1)
+
+
+def test_interactive_goes_before_earlier_batch(make_limiter):
+    # 120 requests/min: con el bucket vacío se libera uno cada 0.5 s
+    limiter = make_limiter(requests_per_minute=120)
+    for _ in range(120):
+        limiter.acquire("interactive")
+    granted = []
+
+    def wait_for(priority: str) -> None:
+        limiter.acquire(priority, max_wait=5.0)
+        granted.append(priority)
+
+    batch = threading.Thread(target=wait_for, args=("batch",))
+    batch.start()
+    time.sleep(0.1)
+    interactive = threading.Thread(target=wait_for, args=("interactive",))
+    interactive.start()
+    batch.join()
+    interactive.join()
+    assert granted == ["interactive", "batch"]
@@ -0,0 +1,60 @@
+from typing import Sequence
+
+import numpy as np
+
+from src.rerankService import LexicalReranker, Reranker, rerank_order
+
+
+class FixedReranker(Reranker):
+    """Devuelve scores fijos (en el orden denso que recibe); NaN = no llegó a puntuarlo."""
+    name = "fixed"
+
+    def __init__(self, scores: Sequence[float]):
+        self.scores = np.asarray(scores, dtype=np.float32)
+
+    def score(self, query: str, texts: Sequence[str], dense: np.ndarray, deadline: float) -> np.ndarray:
+        return self.scores
+
+
+class FailingReranker(Reranker):
+    name = "failing"
+
+    def score(self, query: str, texts: Sequence[str], dense: np.ndarray, deadline: float) -> np.ndarray:
+        raise RuntimeError("model not loaded")
+
+
+TEXTS = ["a", "b", "c", "d"]
+DENSE = [0.2, 0.9, 0.5, 0.7]  # orden denso: b, d, c, a = [1, 3, 2, 0]
+
+
+def test_without_reranker_keeps_dense_order():
+    order, info = rerank_order(None, "q", TEXTS, DENSE)
+    assert order.tolist() == [1, 3, 2, 0]
+    assert info["reranker"] == "none"
+
+
+def test_scores_reorder_candidates():
+    order, info = rerank_order(FixedReranker([0.1, 0.2, 0.9, 0.5]), "q", TEXTS, DENSE)
+    assert order.tolist() == [2, 0, 3, 1]
+    assert info["scored"] == 4
+    assert info["fallback"] is None
+
+
+def test_budget_leaves_unscored_tail_in_dense_order():
+    # solo llegó a puntuar los dos primeros del orden denso (b, d)
+    order, info = rerank_order(FixedReranker([0.1, 0.8, np.nan, np.nan]), "q", TEXTS, DENSE)
+    assert order.tolist() == [3, 1, 2, 0]
+    assert info["scored"] == 2
+    assert info["fallback"] == "budget"
+
+
+def test_error_falls_back_to_dense_order():
+    order, info = rerank_order(FailingReranker(), "q", TEXTS, DENSE)
+    assert order.tolist() == [1, 3, 2, 0]
+    assert str(info["fallback"]).startswith("error: model not loaded")
+
+
+def test_lexical_reranker_promotes_query_terms():
+    texts = ["Ventas y marketing digital.", "Desarrollador Python con Spark y Airflow."]
+    order, _ = rerank_order(LexicalReranker(dense_weight=0.3), "experiencia con Spark", texts, [0.6, 0.5])
+    assert order.tolist() == [1, 0]
@@ -0,0 +1,56 @@
+import pytest
+
+from src.agent import ShortMemory
+from src.sessionStore import SQLiteSessionDB, SQLiteShortMemory
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_memory(request: pytest.FixtureRequest, tmp_path):
+    if request.param == "memory":
+        return lambda max_turns: ShortMemory(max_turns=max_turns)
+    db = SQLiteSessionDB(str(tmp_path / "sessions.sqlite"))
+    return lambda max_turns: SQLiteShortMemory(db, max_turns=max_turns)
+
+
+def add_turns(mem, count: int) -> None:
+    for i in range(count):
+        mem.append("s1", "p1", f"pregunta {i}", f"respuesta {i}")
+
+
+def test_window_mode_keeps_last_turns(make_memory):
+    mem = make_memory(2)
+    add_turns(mem, 5)
+    assert [m["content"] for m in mem.get("s1", "p1")] == ["pregunta 3", "respuesta 3", "pregunta 4", "respuesta 4"]
+    assert mem.last_persona("s1") == "p1"
+
+
+def test_summary_mode_keeps_unfolded_turns(make_memory):
+    mem = make_memory(None)
+    add_turns(mem, 6)
+    assert len(mem.get("s1", "p1")) == 12
+
+
+def test_fold_drops_only_folded_prefix(make_memory):
+    mem = make_memory(None)
+    add_turns(mem, 4)
+    folded = mem.get("s1", "p1")[:4]
+    add_turns(mem, 1)  # turno nuevo mientras se resume
+    assert mem.fold("s1", "p1", folded, "resumen")
+    assert mem.get_summary("s1", "p1") == "resumen"
+    assert [m["content"] for m in mem.get("s1", "p1")][0] == "pregunta 2"
+    assert len(mem.get("s1", "p1")) == 6
+
+
+def test_fold_rejects_changed_buffer(make_memory):
+    mem = make_memory(None)
+    add_turns(mem, 2)
+    stale = [{"role": "user", "content": "otra"}]
+    assert not mem.fold("s1", "p1", stale, "resumen")
+    assert len(mem.get("s1", "p1")) == 4
+
+
+def test_reset_when_person_changes(make_memory):
+    mem = make_memory(None)
+    add_turns(mem, 2)
+    mem.reset_if_person_changed("s1", "p2")
+    assert mem.get("s1", "p1") == []
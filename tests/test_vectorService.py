@@ -0,0 +1,62 @@
+import pytest
+
+import src.vectorService as vector_service
+from src.vectorService import ShardCache, search_shards, tenant_namespace
+
+
+SHARD_HITS = {
+    "ns_a": [{"_id": "a1", "_score": 0.9}, {"_id": "a2", "_score": 0.4}],
+    "ns_b": [{"_id": "b1", "_score": 0.7}, {"_id": "b2", "_score": 0.6}],
+}
+
+
+@pytest.fixture
+def fake_search(monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    def search_similar(text, top_k, namespace, *args, **kwargs):
+        calls.append((namespace, top_k))
+        return SHARD_HITS.get(namespace, [])[:top_k]
+
+    monkeypatch.setattr(vector_service, "search_similar", search_similar)
+    return calls
+
+
+@pytest.mark.parametrize("backend", ["local", "pinecone"])
+def test_search_shards_merges_by_score(monkeypatch: pytest.MonkeyPatch, fake_search, backend: str):
+    monkeypatch.setattr(vector_service, "VECTOR_BACKEND", backend)
+    merged = search_shards("spark", ["ns_a", "ns_b"], top_k=3)
+    assert [(ns, h["_id"]) for ns, h in merged] == [("ns_a", "a1"), ("ns_b", "b1"), ("ns_b", "b2")]
+    assert sorted(fake_search) == [("ns_a", 3), ("ns_b", 3)]
+
+
+def test_search_shards_single_shard_and_duplicates(fake_search):
+    merged = search_shards("spark", ["ns_a", "ns_a"], top_k=5)
+    assert [h["_id"] for _, h in merged] == ["a1", "a2"]
+    assert fake_search == [("ns_a", 5)]
+
+
+def test_shard_cache_invalidates_only_its_shard():
+    cache = ShardCache(max_entries=2, ttl=60)
+    cache.put("cv", "ns_a", "q", [{"_id": "a1"}])
+    cache.put("cv", "ns_b", "q", [{"_id": "b1"}])
+    cache.invalidate("cv", "ns_a")
+    assert cache.get("cv", "ns_a", "q") is None
+    assert cache.get("cv", "ns_b", "q") == [{"_id": "b1"}]
+
+
+def test_shard_cache_lru_per_shard():
+    cache = ShardCache(max_entries=1, ttl=60)
+    cache.put("cv", "ns_a", "q1", [])
+    cache.put("cv", "ns_a", "q2", [])
+    cache.put("cv", "ns_b", "q1", [])
+    assert cache.get("cv", "ns_a", "q1") is None
+    assert cache.get("cv", "ns_a", "q2") == []
+    assert cache.get("cv", "ns_b", "q1") == []
+
+
+def test_tenant_namespace():
+    assert tenant_namespace("") == vector_service.PINECONE_NAMESPACE
+    assert tenant_namespace("acme") == f"{vector_service.PINECONE_NAMESPACE}__acme"
+    with pytest.raises(ValueError):
+        tenant_namespace("acme/../x")
@@ -1,12 +1,21 @@
+import uuid
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, Input, Output, State, callback_context
+from dash import dcc, html, Input, Output, State, Patch, callback_context, no_update
+from dash.exceptions import PreventUpdate
+from flask import jsonify
 
-from src.agent import init_app  # LangGraph app
+from src.agent import init_app, invoke_turn, continue_disambiguation  # LangGraph app
+from src.jobQueue import JobQueue, QueueFullError
+from src.serving import health
+from src.config.settings import UI_JOB_QUEUE, UI_POLL_INTERVAL_MS
 AGENT = init_app()
-SESSION_ID = "dash-ui"
 
 CHAT_TITLE = "Asistente para análisis de Curriculums - CEIA NLP II - TP3"
+GREETING = (
+    "¡Hola! Soy tu asistente para consultas sobre el CV. "
+    "Podés preguntarme sobre experiencia, habilidades o educación."
+)
 EXAMPLE_MESSAGES = [
     "¿Cuales son los datos personales de Valentina?",
     "¿Y sus ultimas 2 experiencias laborales?",
@@ -14,13 +23,11 @@ EXAMPLE_MESSAGES = [
 ]
 
 # ================= Helpers =================
-def graph_invoke(query: str, disamb_choice: str | None = None, candidates=None):
-    payload = {"session_id": SESSION_ID, "query": query}
+def graph_invoke(session_id: str, query: str, disamb_choice: str | None = None, candidates=None):
     if disamb_choice:
-        payload["disambiguation_choice"] = disamb_choice
-    if candidates:
-        payload["candidates"] = candidates
-    s = AGENT.invoke(payload)
+        s = continue_disambiguation(session_id, disamb_choice, candidates)
+    else:
+        s = invoke_turn(session_id, query)
     return (
         s.get("answer", ""),
         s.get("trace", {}) or {},
@@ -28,95 +35,181 @@ def graph_invoke(query: str, disamb_choice: str | None = None, candidates=None):
         s.get("chunks", []) or [],
     )
 
+def run_turn(job: dict) -> dict:
+    """Corre un turno del grafo (en un worker de la cola o inline)."""
+    answer, trace, candidates, _chunks = graph_invoke(
+        job["session_id"],
+        query=job["query"],
+        disamb_choice=job.get("disambiguation_choice"),
+        candidates=job.get("candidates"),
+    )
+    return {"answer": answer, "trace": trace, "candidates": candidates}
+
+JOBS = JobQueue(run_turn)
+
+def user_card(text: str):
+    return dbc.Card([
+        dbc.CardBody([
+            html.Strong("Tú: ", className="text-primary"),
+            dcc.Markdown(text)
+        ])
+    ], className="mb-2 border-primary")
+
+def assistant_card(text: str):
+    return dbc.Card([
+        dbc.CardBody([
+            html.Strong("Asistente: ", className="text-success"),
+            dcc.Markdown(text)
+        ])
+    ], className="mb-2 border-success")
+
+def error_card(text: str):
+    return dbc.Card([
+        dbc.CardBody([
+            html.Strong("Error: ", className="text-danger"),
+            dcc.Markdown(text)
+        ])
+    ], className="mb-2 border-danger")
+
+def loading_card():
+    return dbc.Card([
+        dbc.CardBody([
+            html.Strong("Asistente: ", className="text-success"),
+            html.Div([
+                dbc.Spinner(size="sm", color="primary"),
+                html.Span(" Generando respuesta...", className="ms-2")
+            ], className="d-flex align-items-center")
+        ])
+    ], className="mb-2 border-success", id="loading-message")
+
+# El historial nunca vuelve al server: los callbacks mandan solo el turno nuevo
+# como Patch (append, o reemplazo de la card de espera por índice).
+CARDS = {"user": user_card, "assistant": assistant_card, "error": error_card}
+
+def append_messages(store: dict, *messages: tuple) -> tuple[Patch, dict]:
+    """Patch de 'chat-history' que agrega (role, text) al final, y el store con el nuevo largo."""
+    history = Patch()
+    for role, text in messages:
+        history.append(loading_card() if role == "loading" else CARDS[role](text))
+    return history, {**store, "messages": store["messages"] + len(messages)}
+
+def replace_loading(store: dict, role: str, text: str) -> Patch:
+    """Patch que reemplaza la card de espera (en store['loading_index']) por la respuesta."""
+    history = Patch()
+    history[store["loading_index"]] = CARDS[role](text)
+    return history
+
+def render_result(result: dict, store: dict) -> tuple[str, dict]:
+    """Texto del asistente + nuevo estado del store a partir del resultado de un turno."""
+    answer, trace, candidates = result["answer"], result["trace"], result["candidates"]
+    base = {**store, "job_id": None, "loading_index": None}
+    if store.get("awaiting_choice") or not trace.get("need_user_input"):
+        return answer, {**base, "awaiting_choice": False, "candidates": []}
+
+    # Mostrar repregunta + opciones (texto), y pedir número
+    options = "\n".join(
+        [f"{i+1}. {c['name']}  (id={c['persona_id']})" for i, c in enumerate(candidates)]
+    )
+    text = f"{answer}\n\n{options}\n\n*Escribe el número elegido y presiona Enviar.*"
+    # Guardar candidatos y esperar número
+    return text, {**base, "awaiting_choice": True, "candidates": candidates}
+
 # ================= Dash App =================
 app = dash.Dash(
     __name__,
     external_stylesheets=[dbc.themes.BOOTSTRAP],
     suppress_callback_exceptions=True,
 )
+server = app.server  # entry point WSGI del modo serve (gunicorn ui:server)
 
-app.layout = dbc.Container([
-    # Estado mínimo para desambiguación
-    dcc.Store(id="graph-store", data={"awaiting_choice": False, "candidates": []}),
-
-    dbc.Row([
-        dbc.Col([
-            html.H1(CHAT_TITLE, className="text-center mb-4"),
-            html.Hr(),
-
-            # Historial
-            html.H5("Historial de conversación:", className="mb-3"),
-            html.Div(
-                id="chat-history",
-                children=[
-                    dbc.Card([
-                        dbc.CardBody([
-                            html.Strong("Asistente: ", className="text-success"),
-                            dcc.Markdown(
-                                "¡Hola! Soy tu asistente para consultas sobre el CV. "
-                                "Podés preguntarme sobre experiencia, habilidades o educación."
-                            )
-                        ])
-                    ], className="mb-2 border-success")
-                ],
-                style={
-                    "height": "400px",
-                    "overflow-y": "auto",
-                    "border": "1px solid #dee2e6",
-                    "border-radius": "0.375rem",
-                    "padding": "1rem",
-                    "background-color": "#f8f9fa",
-                    "margin-bottom": "2rem",
-                }
-            ),
-
-            # Loading indicator
-            dcc.Loading(
-                id="chat-loading",
-                type="circle",
-                color="#007bff",
-                children=html.Div(id="chat-loading-output"),
-                style={"margin": "1rem 0"},
-            ),
-
-            # Ejemplos
-            html.H5("Ejemplos de preguntas:", className="mb-3"),
-            html.Div([
-                dbc.Button(
-                    example,
-                    id=f"example-btn-{i}",
-                    color="outline-primary",
-                    size="sm",
-                    className="me-2 mb-2",
-                    n_clicks=0
-                ) for i, example in enumerate(EXAMPLE_MESSAGES)
-            ], className="mb-4"),
-
-            html.Hr(),
-
-            # Input + Enviar
-            dbc.InputGroup([
-                dbc.Input(
-                    id="chat-input",
-                    placeholder="Escribe tu pregunta aquí...",
-                    type="text",
-                    value="",
-                    disabled=False
+@server.route("/health")
+def health_check():
+    return jsonify({**health(), "jobs": JOBS.stats() if UI_JOB_QUEUE else None})
+
+def serve_layout():
+    # una sesión del agente por carga de página
+    return dbc.Container([
+        # Estado mínimo para desambiguación + job en curso + largo del historial
+        dcc.Store(id="graph-store", data={
+            "session_id": f"dash-ui-{uuid.uuid4()}",
+            "awaiting_choice": False,
+            "candidates": [],
+            "job_id": None,
+            "messages": 1,
+            "loading_index": None,
+        }),
+        dcc.Interval(id="job-poll", interval=UI_POLL_INTERVAL_MS, disabled=True),
+
+        dbc.Row([
+            dbc.Col([
+                html.H1(CHAT_TITLE, className="text-center mb-4"),
+                html.Hr(),
+
+                # Historial
+                html.H5("Historial de conversación:", className="mb-3"),
+                html.Div(
+                    id="chat-history",
+                    children=[assistant_card(GREETING)],
+                    style={
+                        "height": "400px",
+                        "overflow-y": "auto",
+                        "border": "1px solid #dee2e6",
+                        "border-radius": "0.375rem",
+                        "padding": "1rem",
+                        "background-color": "#f8f9fa",
+                        "margin-bottom": "2rem",
+                    }
+                ),
+
+                # Loading indicator
+                dcc.Loading(
+                    id="chat-loading",
+                    type="circle",
+                    color="#007bff",
+                    children=html.Div(id="chat-loading-output"),
+                    style={"margin": "1rem 0"},
                 ),
-                dbc.Button(
-                    "Enviar",
-                    id="send-button",
-                    color="primary",
-                    n_clicks=0,
-                    disabled=False
-                )
-            ], className="mb-4"),
-
-            # Loading general
-            dcc.Loading(id="loading", type="default", children=html.Div(id="loading-output")),
-        ], width=8, className="mx-auto")
-    ])
-], fluid=True, style={"maxWidth": "none"})
+
+                # Ejemplos
+                html.H5("Ejemplos de preguntas:", className="mb-3"),
+                html.Div([
+                    dbc.Button(
+                        example,
+                        id=f"example-btn-{i}",
+                        color="outline-primary",
+                        size="sm",
+                        className="me-2 mb-2",
+                        n_clicks=0
+                    ) for i, example in enumerate(EXAMPLE_MESSAGES)
+                ], className="mb-4"),
+
+                html.Hr(),
+
+                # Input + Enviar
+                dbc.InputGroup([
+                    dbc.Input(
+                        id="chat-input",
+                        placeholder="Escribe tu pregunta aquí...",
+                        type="text",
+                        value="",
+                        disabled=False
+                    ),
+                    dbc.Button(
+                        "Enviar",
+                        id="send-button",
+                        color="primary",
+                        n_clicks=0,
+                        disabled=False
+                    )
+                ], className="mb-4"),
+
+                # Loading general
+                dcc.Loading(id="loading", type="default", children=html.Div(id="loading-output")),
+            ], width=8, className="mx-auto")
+        ])
+    ], fluid=True, style={"maxWidth": "none"})
+
+app.layout = serve_layout
 
 # Auto‑scroll
 app.clientside_callback(
@@ -149,120 +242,90 @@ def update_input_from_examples(*clicks):
         return EXAMPLE_MESSAGES[idx]
     return ""
 
-# Chat (único callback)
+# Chat: encola el turno (o lo corre inline si UI_JOB_QUEUE=False)
 @app.callback(
     [Output("chat-history", "children"),
      Output("chat-input", "value", allow_duplicate=True),
      Output("send-button", "disabled"),
      Output("chat-input", "disabled"),
-     Output("graph-store", "data")],
+     Output("graph-store", "data"),
+     Output("job-poll", "disabled")],
     [Input("send-button", "n_clicks"),
      Input("chat-input", "n_submit")],
     [State("chat-input", "value"),
-     State("chat-history", "children"),
      State("graph-store", "data")],
     prevent_initial_call=True
 )
-def update_chat(send_clicks, input_submit, user_message, current_history, store):
+def update_chat(send_clicks, input_submit, user_message, store):
+    if store.get("job_id"):
+        # ya hay un turno en curso para esta sesión
+        raise PreventUpdate
     if not user_message or user_message.strip() == "":
-        return current_history, "", False, False, store
+        return no_update, "", False, False, no_update, True
 
     user_message = user_message.strip()
-    new_history = current_history.copy()
-
-    # Card del usuario
-    new_history.append(
-        dbc.Card([
-            dbc.CardBody([
-                html.Strong("Tú: ", className="text-primary"),
-                dcc.Markdown(user_message)
-            ])
-        ], className="mb-2 border-primary")
-    )
 
-    new_history.append(
-        dbc.Card([
-            dbc.CardBody([
-                html.Strong("Asistente: ", className="text-success"),
-                html.Div([
-                    dbc.Spinner(size="sm", color="primary"),
-                    html.Span(" Generando respuesta...", className="ms-2")
-                ], className="d-flex align-items-center")
-            ])
-        ], className="mb-2 border-success", id="loading-message")
-    )
+    job = {"session_id": store["session_id"], "query": user_message}
+    # === Segunda vuelta (desambiguación) ===
+    if store.get("awaiting_choice"):
+        job["disambiguation_choice"] = user_message  # número que escribió el user
+        job["candidates"] = store.get("candidates", [])
 
-    try:
-        # === Segunda vuelta (desambiguación) ===
-        if store.get("awaiting_choice"):
-            choice = user_message  # número que escribió el user
-            answer, trace, _cands, _chunks = graph_invoke(
-                query=choice,
-                disamb_choice=choice,
-                candidates=store.get("candidates", [])
+    if UI_JOB_QUEUE:
+        try:
+            job_id = JOBS.submit(job)
+        except QueueFullError:
+            # back-pressure: no se encola, el usuario puede reintentar
+            history, new_store = append_messages(
+                store, ("user", user_message), ("error", "El servidor está ocupado, intentá de nuevo en unos segundos.")
             )
+            return history, user_message, False, False, new_store, True
 
-            # Quitar loading
-            new_history = [msg for msg in new_history if not (hasattr(msg, 'id') and msg.id == "loading-message")]
-
-            # Card del asistente
-            new_history.append(
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Strong("Asistente: ", className="text-success"),
-                        dcc.Markdown(answer)
-                    ])
-                ], className="mb-2 border-success")
-            )
+        # Card de espera hasta que el worker termine (la reemplaza poll_job)
+        history, new_store = append_messages(store, ("user", user_message), ("loading", ""))
+        new_store.update(job_id=job_id, loading_index=new_store["messages"] - 1)
+        return history, "", True, True, new_store, False
 
-            # limpiar estado y re‑habilitar input
-            return new_history, "", False, False, {"awaiting_choice": False, "candidates": []}
+    try:
+        text, new_store = render_result(run_turn(job), store)
+        history, new_store = append_messages(new_store, ("user", user_message), ("assistant", text))
+    except Exception as e:
+        history, new_store = append_messages(store, ("user", user_message), ("error", f"Ocurrió un error: `{e}`"))
+    return history, "", False, False, new_store, True
 
-        # === Primera vuelta normal ===
-        answer, trace, candidates, _chunks = graph_invoke(user_message)
+# Polling del job en curso → reemplaza la card de espera por la respuesta
+@app.callback(
+    [Output("chat-history", "children", allow_duplicate=True),
+     Output("send-button", "disabled", allow_duplicate=True),
+     Output("chat-input", "disabled", allow_duplicate=True),
+     Output("graph-store", "data", allow_duplicate=True),
+     Output("job-poll", "disabled", allow_duplicate=True)],
+    Input("job-poll", "n_intervals"),
+    State("graph-store", "data"),
+    prevent_initial_call=True
+)
+def poll_job(_n, store):
+    job_id = store.get("job_id")
+    if not job_id:
+        return no_update, False, False, no_update, True
 
-        # Quitar loading
-        new_history = [msg for msg in new_history if not (hasattr(msg, 'id') and msg.id == "loading-message")]
+    status = JOBS.status(job_id)
+    done = {**store, "job_id": None, "loading_index": None}
+    if status is None:
+        # el job se perdió (p.ej. expiró): liberar la UI
+        history = replace_loading(store, "error", "La respuesta expiró, volvé a enviar la pregunta.")
+        return history, False, False, done, True
+    if status["status"] not in ("done", "error"):
+        return no_update, no_update, no_update, no_update, False
 
-        if trace.get("need_user_input"):
-            # Mostrar repregunta + opciones (texto), y pedir número
-            options = "\n".join(
-                [f"{i+1}. {c['name']}  (id={c['persona_id']})" for i, c in enumerate(candidates)]
-            )
-            new_history.append(
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Strong("Asistente: ", className="text-success"),
-                        dcc.Markdown(f"{answer}\n\n{options}\n\n*Escribe el número elegido y presiona Enviar.*")
-                    ])
-                ], className="mb-2 border-success")
-            )
-            # Guardar candidatos y esperar número
-            return new_history, "", False, False, {"awaiting_choice": True, "candidates": candidates}
-
-        # Respuesta directa
-        new_history.append(
-            dbc.Card([
-                dbc.CardBody([
-                    html.Strong("Asistente: ", className="text-success"),
-                    dcc.Markdown(answer)
-                ])
-            ], className="mb-2 border-success")
-        )
-        return new_history, "", False, False, {"awaiting_choice": False, "candidates": []}
+    job = JOBS.pop(job_id)
+    if job["status"] == "error":
+        history = replace_loading(store, "error", f"Ocurrió un error: `{job['error']}`")
+        return history, False, False, done, True
 
-    except Exception as e:
-        # Quitar loading y mostrar error
-        new_history = [msg for msg in new_history if not (hasattr(msg, 'id') and msg.id == "loading-message")]
-        new_history.append(
-            dbc.Card([
-                dbc.CardBody([
-                    html.Strong("Error: ", className="text-danger"),
-                    dcc.Markdown(f"Ocurrió un error: `{e}`")
-                ])
-            ], className="mb-2 border-danger")
-        )
-        return new_history, "", False, False, store
+    text, new_store = render_result(job["result"], store)
+    history = replace_loading(store, "assistant", text)
+    return history, False, False, new_store, True
 
 # Normaliza Enter
 @app.callback(